@@ -0,0 +1,89 @@
+"""Runs the offline benchmark suite and writes the results as a single JSON document, to be compared across versions.
+
+The suite uses the fake backends in :mod:`benchmarks.fakes`, so it needs no API keys or network access.
+Model and embedding latency are zero by default, so that the numbers are loopgpt's own overhead.
+
+Usage:
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --quick
+"""
+
+import os
+
+# The benchmarks never call OpenAI, but importing loopgpt asks for a key interactively if none is set.
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks import bench_agent, bench_memory, bench_summarizer
+
+import loopgpt
+
+import argparse
+import platform
+import json
+import time
+import sys
+
+SIZES = {
+    "full": {
+        "chat_steps": 50,
+        "prompt_history": [10, 100, 1000],
+        "memory_sizes": [10_000, 100_000],
+        "summarizer_paragraphs": [100, 1000],
+        "save_load_history": 1000,
+        "save_load_memory": [10_000, 100_000],
+    },
+    "quick": {
+        "chat_steps": 5,
+        "prompt_history": [10, 100],
+        "memory_sizes": [1000],
+        "summarizer_paragraphs": [50],
+        "save_load_history": 100,
+        "save_load_memory": [1000],
+    },
+}
+
+
+def run(quick=False, latency=0.0):
+    """Runs all benchmarks and returns the results, along with the loopgpt version and platform they were measured on."""
+    sizes = SIZES["quick" if quick else "full"]
+    results = [bench_agent.bench_chat(sizes["chat_steps"], latency)]
+    results += [bench_agent.bench_prompt(n) for n in sizes["prompt_history"]]
+    results += [bench_memory.bench(n, 256) for n in sizes["memory_sizes"]]
+    results += [
+        bench_summarizer.bench(n, latency) for n in sizes["summarizer_paragraphs"]
+    ]
+    results += [
+        bench_agent.bench_save_load(sizes["save_load_history"], n, binary)
+        for n in sizes["save_load_memory"]
+        for binary in (False, True)
+    ]
+    return {
+        "loopgpt_version": loopgpt.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", help="File to write to. Defaults to stdout.")
+    parser.add_argument("--quick", action="store_true", help="Use small sizes.")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Fake model latency in seconds."
+    )
+    args = parser.parse_args()
+    report = run(args.quick, args.latency)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
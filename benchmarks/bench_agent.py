@@ -0,0 +1,172 @@
+"""Overhead of :class:`~loopgpt.agent.Agent` steps, prompt assembly and persistence, measured with fake backends.
+
+``chat`` times full agent steps (prompt assembly, model call, JSON parsing and running the staged command) and reports
+the time not spent waiting for the model. ``prompt`` times :meth:`~loopgpt.agent.Agent.get_full_prompt` as the
+history grows. ``save_load`` times :meth:`~loopgpt.agent.Agent.save` and :meth:`~loopgpt.agent.Agent.load` with large
+histories and memories, with the memory inlined as JSON and in binary form.
+
+Usage:
+
+    python -m benchmarks.bench_agent chat --steps 50 --latency 0.01
+    python -m benchmarks.bench_agent prompt --history 10 100 1000
+    python -m benchmarks.bench_agent save_load --history 1000 --memory 10000 100000
+"""
+
+import os
+
+# The benchmarks never call OpenAI, but importing loopgpt asks for a key interactively if none is set.
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.fakes import FakeModel, FakeEmbeddingProvider
+from loopgpt import Agent
+
+import numpy as np
+import argparse
+import tempfile
+import json
+import time
+
+
+def make_agent(
+    history=0, memory=0, latency=0.0, completion_tokens=200, token_limit=4000, dim=256
+):
+    """Returns an agent with fake backends, ``history`` messages of previous steps and ``memory`` documents."""
+    model = FakeModel(
+        latency=latency, completion_tokens=completion_tokens, token_limit=token_limit
+    )
+    agent = Agent(model=model, embedding_provider=FakeEmbeddingProvider(dim))
+    agent.goals = [f"Complete step {i} of the task." for i in range(5)]
+    for i in range(history // 3):
+        agent.history += [
+            {"role": "user", "content": agent.next_prompt},
+            {"role": "assistant", "content": model._response()},
+            {
+                "role": "system",
+                "content": f'Command "evaluate_math" with args {{"expression": "{i} * 7"}} returned:\n"{i * 7}"',
+            },
+        ]
+    if memory:
+        agent.memory.add_many(
+            [f"Fact number {i} about the task." for i in range(memory)]
+        )
+    return agent
+
+
+def _ms(seconds):
+    return round(1000 * seconds, 4)
+
+
+def bench_chat(steps=50, latency=0.0, completion_tokens=200, memory=1000):
+    agent = make_agent(
+        memory=memory, latency=latency, completion_tokens=completion_tokens
+    )
+    model = agent.model
+    times = []
+    for i in range(steps):
+        start = time.perf_counter()
+        agent.chat(run_tool=i > 0)
+        times.append(time.perf_counter() - start)
+    model_time = model.calls * (latency + model.token_latency * completion_tokens)
+    return {
+        "benchmark": "agent_chat",
+        "steps": steps,
+        "latency_ms": _ms(latency),
+        "completion_tokens": completion_tokens,
+        "memory": memory,
+        "llm_calls_per_step": model.calls / steps,
+        "step_ms": _ms(np.mean(times)),
+        "step_p50_ms": _ms(np.percentile(times, 50)),
+        "step_p95_ms": _ms(np.percentile(times, 95)),
+        "overhead_ms": _ms((sum(times) - model_time) / steps),
+    }
+
+
+def bench_prompt(history, memory=1000, repeat=20):
+    agent = make_agent(history=history, memory=memory)
+    message = agent.get_full_message(None)
+    # The first call summarizes the history. Later calls reuse the summary, like consecutive agent steps do.
+    start = time.perf_counter()
+    agent.get_full_prompt(message)
+    cold = time.perf_counter() - start
+    calls = agent.model.calls
+    start = time.perf_counter()
+    for _ in range(repeat):
+        msgs, ntokens = agent.get_full_prompt(message)
+    warm = (time.perf_counter() - start) / repeat
+    return {
+        "benchmark": "agent_prompt",
+        "history": history,
+        "memory": memory,
+        "prompt_messages": len(msgs),
+        "prompt_tokens": ntokens,
+        "cold_ms": _ms(cold),
+        "warm_ms": _ms(warm),
+        "warm_llm_calls": (agent.model.calls - calls) / repeat,
+    }
+
+
+def bench_save_load(history, memory, binary=False, dim=256):
+    agent = make_agent(history=history, memory=memory, dim=dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "agent.json")
+        memory_path = os.path.join(tmp, "memory") if binary else None
+        start = time.perf_counter()
+        agent.save(path, memory_path=memory_path)
+        save_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+        if binary:
+            size += sum(
+                os.path.getsize(os.path.join(memory_path, f))
+                for f in os.listdir(memory_path)
+            )
+        start = time.perf_counter()
+        loaded = Agent.load(path)
+        load_time = time.perf_counter() - start
+        assert len(loaded.memory) == memory
+        del loaded
+    return {
+        "benchmark": "agent_save_load",
+        "history": history,
+        "memory": memory,
+        "dim": dim,
+        "binary_memory": binary,
+        "save_ms": _ms(save_time),
+        "load_ms": _ms(load_time),
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    chat = subparsers.add_parser("chat")
+    chat.add_argument("--steps", type=int, default=50)
+    chat.add_argument("--latency", type=float, default=0.0)
+    chat.add_argument("--completion-tokens", type=int, default=200)
+    chat.add_argument("--memory", type=int, default=1000)
+    prompt = subparsers.add_parser("prompt")
+    prompt.add_argument("--history", type=int, nargs="+", default=[10, 100, 1000])
+    prompt.add_argument("--memory", type=int, default=1000)
+    save_load = subparsers.add_parser("save_load")
+    save_load.add_argument("--history", type=int, default=1000)
+    save_load.add_argument("--memory", type=int, nargs="+", default=[10_000, 100_000])
+    save_load.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+    if args.benchmark == "chat":
+        results = [
+            bench_chat(args.steps, args.latency, args.completion_tokens, args.memory)
+        ]
+    elif args.benchmark == "prompt":
+        results = [bench_prompt(n, args.memory) for n in args.history]
+    else:
+        results = [
+            bench_save_load(args.history, n, binary, args.dim)
+            for n in args.memory
+            for binary in (False, True)
+        ]
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Time to first token of :class:`~loopgpt.models.hf.HuggingFaceModel` with and without prefix caching.
+
+Simulates agent turns: a long system header followed by a growing history, so that each prompt extends the previous one.
+
+Usage:
+
+    python -m benchmarks.bench_hf_prefix_cache --model HuggingFaceTB/SmolLM2-135M-Instruct --turns 5
+"""
+
+import os
+
+# The benchmarks never call OpenAI, but importing loopgpt asks for a key interactively if none is set.
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from loopgpt.models import HuggingFaceModel
+
+import argparse
+import json
+import time
+
+HEADER = (
+    "You are Agent, an autonomous assistant.\n"
+    + "GOALS:\n"
+    + "".join(f"{i}. Complete step {i} of the task.\n" for i in range(1, 6))
+    + "TOOLS:\n"
+    + "".join(
+        f"tool_{i}: Does thing number {i}. Args: {{'query': 'string'}}\n"
+        for i in range(30)
+    )
+)
+
+
+def time_to_first_token(model, messages, max_tokens):
+    start = time.perf_counter()
+    stream = model.stream_chat(messages, max_tokens=max_tokens)
+    next(stream, None)
+    ttft = time.perf_counter() - start
+    # Finish generation, so that the cache holds the full turn.
+    for _ in stream:
+        pass
+    return ttft
+
+
+def bench(model, turns, max_tokens):
+    results = {}
+    for prefix_cache in (False, True):
+        model.prefix_cache = prefix_cache
+        model.clear_prefix_cache()
+        messages = [{"role": "system", "content": HEADER}]
+        ttfts = []
+        for turn in range(turns):
+            messages.append({"role": "user", "content": f"Observation {turn}."})
+            ttfts.append(time_to_first_token(model, messages, max_tokens))
+            messages.append({"role": "assistant", "content": f"Thought {turn}."})
+        results[prefix_cache] = ttfts
+    for turn in range(turns):
+        print(
+            json.dumps(
+                {
+                    "turn": turn,
+                    "ttft_ms": 1000 * results[False][turn],
+                    "ttft_prefix_cache_ms": 1000 * results[True][turn],
+                }
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-135M-Instruct")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=16)
+    args = parser.parse_args()
+    model = HuggingFaceModel(args.model, model_max_length=2048)
+    bench(model, args.turns, args.max_tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Insert and query throughput of :class:`~loopgpt.memory.LocalMemory`.
+
+Usage:
+
+    python -m benchmarks.bench_memory --sizes 10000 100000 1000000 --dim 256
+"""
+
+import os
+
+# The benchmarks never call OpenAI, but importing loopgpt asks for a key interactively if none is set.
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.fakes import FakeEmbeddingProvider
+from loopgpt.memory import LocalMemory
+
+import argparse
+import json
+import time
+
+
+def bench(size, dim, num_queries=100, k=10):
+    memory = LocalMemory(FakeEmbeddingProvider(dim))
+    docs = [f"doc {i}" for i in range(size)]
+
+    start = time.perf_counter()
+    for doc in docs:
+        memory.add(doc)
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(num_queries):
+        memory.get(f"query {i}", k)
+    query_time = time.perf_counter() - start
+
+    return {
+        "benchmark": "memory",
+        "size": size,
+        "dim": dim,
+        "insert_per_sec": size / insert_time,
+        "query_per_sec": num_queries / query_time,
+        "query_ms": 1000 * query_time / num_queries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+    for size in args.sizes:
+        print(json.dumps(bench(size, args.dim, args.queries)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Chunking and map-reduce overhead of :class:`~loopgpt.summarizer.Summarizer`, measured with fake backends.
+
+Usage:
+
+    python -m benchmarks.bench_summarizer --paragraphs 100 1000 10000 --latency 0.01
+"""
+
+import os
+
+# The benchmarks never call OpenAI, but importing loopgpt asks for a key interactively if none is set.
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.fakes import FakeModel, FakeEmbeddingProvider
+from loopgpt.summarizer import Summarizer
+from loopgpt import Agent
+
+import argparse
+import json
+import time
+
+
+def make_text(paragraphs, words=60):
+    return "\n".join(
+        " ".join(f"word{(i * words + j) % 997}" for j in range(words))
+        for i in range(paragraphs)
+    )
+
+
+def bench(paragraphs, latency=0.0, max_workers=4):
+    model = FakeModel(latency=latency, completion_tokens=100)
+    agent = Agent(model=model, embedding_provider=FakeEmbeddingProvider())
+    summarizer = Summarizer(model=model, max_workers=max_workers)
+    summarizer.agent = agent
+    text = make_text(paragraphs)
+
+    start = time.perf_counter()
+    chunks = list(summarizer._chunk_text(text))
+    chunk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summarizer.summarize(text, "summary")
+    summarize_time = time.perf_counter() - start
+
+    return {
+        "benchmark": "summarizer",
+        "paragraphs": paragraphs,
+        "chars": len(text),
+        "chunks": len(chunks),
+        "latency_ms": 1000 * latency,
+        "max_workers": max_workers,
+        "llm_calls": model.calls,
+        "chunk_ms": 1000 * chunk_time,
+        "summarize_ms": 1000 * summarize_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--paragraphs", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--max-workers", type=int, default=4)
+    args = parser.parse_args()
+    for paragraphs in args.paragraphs:
+        print(json.dumps(bench(paragraphs, args.latency, args.max_workers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Deterministic stand-ins for model and embedding backends, so that benchmarks measure loopgpt's own overhead offline.
+
+:class:`FakeModel` answers every request with a well formed agent response (a JSON command) of a configurable size,
+after a configurable delay, and counts tokens with a cheap character based estimate. :class:`FakeEmbeddingProvider`
+returns rows of a fixed random matrix.
+"""
+
+from typing import Dict, List, Optional
+from loopgpt.embeddings import BaseEmbeddingProvider, register_embedding_provider_type
+from loopgpt.models import BaseModel, register_model_type
+
+import numpy as np
+import itertools
+import hashlib
+import json
+import time
+
+DEFAULT_COMMANDS = [{"name": "evaluate_math", "args": {"expression": "6 * 7"}}]
+
+
+class FakeModel(BaseModel):
+    """Model that returns JSON command responses without calling any backend.
+
+    :param latency: Seconds to wait before each response, as time to first token. Defaults to 0.
+    :type latency: float, optional
+    :param token_latency: Seconds to wait per completion token. Defaults to 0.
+    :type token_latency: float, optional
+    :param completion_tokens: Approximate size of each response in tokens. Defaults to 200.
+    :type completion_tokens: int, optional
+    :param commands: Commands to respond with, in turn. Defaults to evaluating a math expression.
+    :type commands: List[Dict], optional
+    :param token_limit: Context window size reported to the agent. Defaults to 4000.
+    :type token_limit: int, optional
+    :param chars_per_token: Characters per token used to estimate token counts. Defaults to 4.
+    :type chars_per_token: int, optional
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        token_latency: float = 0.0,
+        completion_tokens: int = 200,
+        commands: Optional[List[Dict]] = None,
+        token_limit: int = 4000,
+        chars_per_token: int = 4,
+    ):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.completion_tokens = completion_tokens
+        self.commands = commands or DEFAULT_COMMANDS
+        self.token_limit = token_limit
+        self.chars_per_token = chars_per_token
+        self.calls = 0
+        self._commands = itertools.cycle(self.commands)
+
+    def _response(self) -> str:
+        resp = {
+            "thoughts": {
+                "text": "Working on the next step.",
+                "reasoning": "",
+                "progress": "- Step done",
+                "plan": "- Next step\n- Step after that",
+                "speak": "Working on it.",
+            },
+            "command": next(self._commands),
+        }
+        padding = self.completion_tokens * self.chars_per_token - len(
+            json.dumps(resp, indent=4)
+        )
+        resp["thoughts"]["reasoning"] = "x" * max(padding, 0)
+        return json.dumps(resp, indent=4)
+
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> str:
+        self.calls += 1
+        time.sleep(self.latency + self.token_latency * self.completion_tokens)
+        return self._response()
+
+    def count_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(map(self.count_message_tokens, messages)) + 3
+
+    def count_message_tokens(self, message: Dict[str, str]) -> int:
+        return 4 + len(message.get("content", "")) // self.chars_per_token
+
+    def get_token_limit(self) -> int:
+        return self.token_limit
+
+    def config(self):
+        cfg = super().config()
+        cfg.update(
+            {
+                "latency": self.latency,
+                "token_latency": self.token_latency,
+                "completion_tokens": self.completion_tokens,
+                "commands": self.commands,
+                "token_limit": self.token_limit,
+                "chars_per_token": self.chars_per_token,
+            }
+        )
+        return cfg
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("latency", 0.0),
+            config.get("token_latency", 0.0),
+            config.get("completion_tokens", 200),
+            config.get("commands"),
+            config.get("token_limit", 4000),
+            config.get("chars_per_token", 4),
+        )
+
+
+class FakeEmbeddingProvider(BaseEmbeddingProvider):
+    """Returns rows of a fixed random matrix, so that embedding cost does not dominate the measurements.
+
+    :param dim: Embedding size. Defaults to 256.
+    :type dim: int, optional
+    :param latency: Seconds to wait per call. Defaults to 0.
+    :type latency: float, optional
+    :param pool: Number of distinct embeddings. Defaults to 4096.
+    :type pool: int, optional
+    :param seed: Seed of the random matrix. Defaults to 0.
+    :type seed: int, optional
+    """
+
+    def __init__(
+        self, dim: int = 256, latency: float = 0.0, pool: int = 4096, seed: int = 0
+    ):
+        self.dim = dim
+        self.latency = latency
+        self.pool = pool
+        self.seed = seed
+        self.vectors = np.random.default_rng(seed).standard_normal(
+            (pool, dim), dtype=np.float32
+        )
+
+    def _row(self, text: str) -> int:
+        # Stable across processes, unlike hash().
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.pool
+
+    def get(self, text: str) -> np.ndarray:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.vectors[self._row(text)]
+
+    def get_batch(self, texts: List[str]) -> np.ndarray:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.vectors[[self._row(text) for text in texts]]
+
+    def config(self):
+        cfg = super().config()
+        cfg.update(
+            {
+                "dim": self.dim,
+                "latency": self.latency,
+                "pool": self.pool,
+                "seed": self.seed,
+            }
+        )
+        return cfg
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("dim", 256),
+            config.get("latency", 0.0),
+            config.get("pool", 4096),
+            config.get("seed", 0),
+        )
+
+
+register_model_type(FakeModel)
+register_embedding_provider_type(FakeEmbeddingProvider)
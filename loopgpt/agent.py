@@ -5,6 +5,9 @@ from loopgpt.constants import (
     DEFAULT_AGENT_DESCRIPTION,
     NEXT_PROMPT,
     DEFAULT_PROMPT_TEMPLATE,
+    MULTI_COMMAND_RESPONSE_FORMAT_,
+    INIT_PROMPT_MULTI_COMMAND,
+    NEXT_PROMPT_MULTI_COMMAND,
     AgentStates,
 )
 from loopgpt.memory import from_config as memory_from_config
@@ -16,28 +19,87 @@ from loopgpt.models import (
 from loopgpt.tools import builtin_tools, from_config as tool_from_config
 from loopgpt.tools.code import ai_function
 from loopgpt.memory.local_memory import LocalMemory
+from loopgpt.memory.base_memory import _search_kwargs
 from loopgpt.embeddings import (
     OpenAIEmbeddingProvider,
     AzureOpenAIEmbeddingProvider,
     from_config as embedding_provider_from_config,
 )
 from loopgpt.utils.spinner import spinner
+from loopgpt.utils.tracing import Tracer
+from loopgpt.utils.json_parser import parse_json, IncrementalJSONParser
 from loopgpt.loops import cli
 
 
 from typing import *
 from itertools import repeat
+from collections import Counter
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 
+import contextvars
+import threading
+import asyncio
+import hashlib
 import json
 import time
-import ast
 import re
 import os
 
 ACTIVE_AGENT = None
 
 
+class ChatStream:
+    """Iterable over the pieces of an agent's response, returned by ``Agent.chat(stream=True)``.
+
+    Top level members of the response, such as the ``command``, can be read from :attr:`parser`
+    as soon as they are complete, before the rest of the response is generated.
+
+    Example:
+
+        >>> stream = agent.chat("Hello!", stream=True)
+        >>> for text in stream:
+        ...     print(text, end="", flush=True)
+        ...     if stream.command:
+        ...         ...  # command is known before the response ends
+        ...
+        >>> resp = stream.response    # processed response, same as returned by agent.chat()
+    """
+
+    def __init__(self, generator, context=None):
+        self._generator = generator
+        # Context the generator runs in, so that spans it keeps open between chunks do not leak to the caller.
+        self._context = context
+        self.parser = IncrementalJSONParser()
+        self.response = None
+        self.done = False
+
+    @property
+    def command(self):
+        return self.parser.get("command")
+
+    def _run(self, func):
+        if self._context is None:
+            return func()
+        return self._context.run(func)
+
+    def __iter__(self):
+        generator = self._generator
+        try:
+            while True:
+                text = self._run(generator.__next__)
+                self.parser.feed(text)
+                yield text
+        except StopIteration as e:
+            self.response = e.value
+            self.done = True
+        finally:
+            if not self.done:
+                # Abandoned before the end: close the generator, and its spans, in its own context.
+                self._run(generator.close)
+
+
 class Agent:
     """Creates a new LoopGPT agent.
 
@@ -57,6 +119,36 @@ class Agent:
     :type embedding_provider: :class:`~loopgpt.embeddings.base.BaseEmbeddingProvider`, optional
     :param temperature: The temperature to use for agent's chat completion. Defaults to 0.8.
     :type temperature: float, optional
+    :param max_completion_tokens: Number of tokens reserved for the agent's response. The prompt is trimmed to fit
+        in the rest of the model's context window. Defaults to 1000.
+    :type max_completion_tokens: int, optional
+    :param parallel_commands: Ask the model for a list of independent ``commands`` per response instead of a single
+        ``command``. Staged commands are run concurrently and their results reported in one system message,
+        which saves model calls on goals that need many independent commands (searches, browsing). Commands for
+        the same tool run one after another, unless the tool sets ``concurrent_safe``. Defaults to False.
+    :type parallel_commands: bool, optional
+    :param command_timeout: Seconds to wait for each of several concurrently run commands. Tools can override it with
+        their ``timeout`` attribute. A command waiting for an earlier command for the same tool gets that command's
+        timeout on top of its own. A command that times out is reported as such, but its thread is not interrupted.
+        Defaults to 120.
+    :type command_timeout: float, optional
+    :param max_parallel_commands: Maximum number of commands run at the same time. Further commands wait for a
+        free thread, and the wait counts towards their timeout. Defaults to 8.
+    :type max_parallel_commands: int, optional
+    :param memory_min_score: Memories less similar than this to the current context are left out of the prompt.
+        Defaults to the embedding provider's ``min_score`` (0.75 for text-embedding-ada-002), if it has one.
+    :type memory_min_score: float, optional
+    :param memory_mmr_lambda: If set, relevant memories are re-ranked with maximal marginal relevance, trading
+        relevance (1) for diversity (0). Defaults to None.
+    :type memory_mmr_lambda: float, optional
+
+    ``json_parse_stats`` counts how each response was parsed: ``"json"``, ``"repair"`` (fixed locally),
+    ``"literal_eval"``, ``"llm"`` (the model was asked to fix its response) or ``"failed"``.
+
+    ``tracer`` is a :class:`~loopgpt.utils.tracing.Tracer`. Once a sink is added to it, every :meth:`chat` emits a
+    ``"chat"`` span with child spans for history summarization, memory retrieval, prompt assembly, the model call,
+    JSON parsing and tools. LLM calls and prompt and completion tokens are totalled on every span, and cache hits
+    are recorded on the ``"chat"`` span.
     """
 
     def __init__(
@@ -68,6 +160,12 @@ class Agent:
         embedding_provider=None,
         temperature=0.8,
         tools=None,
+        max_completion_tokens=1000,
+        parallel_commands=False,
+        command_timeout=120,
+        max_parallel_commands=8,
+        memory_min_score=None,
+        memory_mmr_lambda=None,
     ):
         if model is None:
             model = OpenAIModel("gpt-3.5-turbo")
@@ -83,6 +181,7 @@ class Agent:
         self.model = model
         self.embedding_provider = embedding_provider
         self.temperature = temperature
+        self.max_completion_tokens = max_completion_tokens
         self.sub_agents = {}
         self.memory = LocalMemory(embedding_provider=embedding_provider)
         self.history = []
@@ -99,12 +198,51 @@ class Agent:
         self.init_prompt = INIT_PROMPT
         self.next_prompt = NEXT_PROMPT
         self.prompt_template = DEFAULT_PROMPT_TEMPLATE
+        self.parallel_commands = parallel_commands
+        self.command_timeout = command_timeout
+        self.max_parallel_commands = max_parallel_commands
+        if memory_min_score is None:
+            memory_min_score = getattr(embedding_provider, "min_score", None)
+        self.memory_min_score = memory_min_score
+        self.memory_mmr_lambda = memory_mmr_lambda
         self.progress = []
         self.plan = []
         self.constraints = []
         self.state = AgentStates.START
         self.memory_query = None
         self.additional_history = None
+        self.history_summary = None
+        self.json_parse_stats = Counter()
+        self._header_cache = {}
+        self.tracer = Tracer()
+
+    @property
+    def parallel_commands(self) -> bool:
+        return self._parallel_commands
+
+    @parallel_commands.setter
+    def parallel_commands(self, value: bool):
+        # Switch the default prompts to the matching response format. Custom prompts are left as they are.
+        self._parallel_commands = value
+        if value:
+            init_prompt, next_prompt = (
+                INIT_PROMPT_MULTI_COMMAND,
+                NEXT_PROMPT_MULTI_COMMAND,
+            )
+        else:
+            init_prompt, next_prompt = INIT_PROMPT, NEXT_PROMPT
+        if self.init_prompt in (INIT_PROMPT, INIT_PROMPT_MULTI_COMMAND):
+            self.init_prompt = init_prompt
+        if self.next_prompt in (NEXT_PROMPT, NEXT_PROMPT_MULTI_COMMAND):
+            self.next_prompt = next_prompt
+        if self.prompts:
+            self.prompts = [self.init_prompt, self.next_prompt]
+
+    @property
+    def response_format(self) -> Dict[str, Any]:
+        if self.parallel_commands:
+            return MULTI_COMMAND_RESPONSE_FORMAT_
+        return DEFAULT_RESPONSE_FORMAT_
 
     def _get_non_user_messages(self, n):
         msgs = [
@@ -115,25 +253,66 @@ class Agent:
         ]
         return msgs[-n - 1 :]
 
-    def _get_relevant_memory(self, user_input, n):
+    def _memory_query(self, user_input, n):
         if self.memory_query:
-            memory_query = self.memory_query
-        else:
-            mem_source = self._get_non_user_messages(n)
-            memory_query = "\n".join(
-                [hist["content"] for hist in mem_source]
-                + ([user_input] if user_input else [])
+            return self.memory_query
+        mem_source = self._get_non_user_messages(n)
+        return "\n".join(
+            [hist["content"] for hist in mem_source]
+            + ([user_input] if user_input else [])
+        )
+
+    def _get_relevant_memory(self, user_input, n):
+        with self.tracer.span("memory") as span:
+            docs = self.memory.get(
+                self._memory_query(user_input, n),
+                10,
+                **_search_kwargs(self.memory_min_score, self.memory_mmr_lambda),
+            )
+            span.set("docs", len(docs))
+        return docs
+
+    async def _aget_relevant_memory(self, user_input, n):
+        with self.tracer.span("memory") as span:
+            docs = await self.memory.aget(
+                self._memory_query(user_input, n),
+                10,
+                **_search_kwargs(self.memory_min_score, self.memory_mmr_lambda),
             )
-        # print(memory_query)
-        # print(self.memory.docs)
-        return self.memory.get(memory_query, 10)
+            span.set("docs", len(docs))
+        return docs
 
     def get_full_prompt(self, user_input: str = ""):
+        with self.tracer.span("prompt") as span:
+            msgs, ntokens = self._get_full_prompt(user_input)
+            span.set("prompt_tokens", ntokens)
+            span.set("messages", len(msgs))
+        return msgs, ntokens
+
+    async def aget_full_prompt(self, user_input: str = ""):
+        """Asynchronous version of :meth:`get_full_prompt`. The history summary and memory retrieval are awaited."""
+        with self.tracer.span("prompt") as span:
+            history = await self._aget_compressed_history()
+            relevant_memory = None
+            for section in re.findall(r"<(.*)>", self.prompt_template):
+                if section.startswith("MEMORY"):
+                    n = int(section.split(":")[1]) if ":" in section else None
+                    relevant_memory = await self._aget_relevant_memory(user_input, n)
+            msgs, ntokens = self._get_full_prompt(user_input, history, relevant_memory)
+            span.set("prompt_tokens", ntokens)
+            span.set("messages", len(msgs))
+        return msgs, ntokens
+
+    def _get_full_prompt(
+        self, user_input: str = "", history=None, relevant_memory=None
+    ):
+        # ``history`` and ``relevant_memory`` are fetched here unless they were fetched asynchronously.
         sections = re.findall(r"<(.*)>", self.prompt_template)
         user_prompt = [{"role": "user", "content": user_input}]
         # history = self.history[:]
-        history = self._get_compressed_history()
-        relevant_memory = []
+        if history is None:
+            history = self._get_compressed_history()
+        fetched_memory, relevant_memory = relevant_memory, []
         for section in sections:
             if section == "HEADER":
                 header = {"role": "system", "content": self.header_prompt()}
@@ -147,9 +326,12 @@ class Agent:
                     n = int(n)
                 else:
                     n = None
-                relevant_memory = self._get_relevant_memory(user_input, n)
+                if fetched_memory is None:
+                    relevant_memory = self._get_relevant_memory(user_input, n)
+                else:
+                    relevant_memory = fetched_memory
 
-        def _msgs():
+        def _msgs(history, relevant_memory):
             updated_msgs = []
             for section in sections:
                 if section == "HEADER":
@@ -173,19 +355,29 @@ class Agent:
                     updated_msgs += user_prompt
             return updated_msgs
 
-        maxtokens = self.model.get_token_limit() - 1000
-        while True:
-            msgs = _msgs()
-            ntokens = self.model.count_tokens(msgs)
-            if ntokens < maxtokens:
-                break
-            else:
-                if len(history) > 1:
-                    history = history[1:]
-                elif relevant_memory:
-                    relevant_memory = relevant_memory[1:]
-                else:
-                    break
+        def _fits(n_history, n_memory):
+            msgs = _msgs(
+                history[len(history) - n_history :], relevant_memory[:n_memory]
+            )
+            return self.model.count_tokens(msgs) < maxtokens
+
+        # Keep the most recent history and the most relevant memory that fit.
+        # At least one history message is kept, as long as there is one.
+        maxtokens = self.model.get_token_limit() - self.max_completion_tokens
+        n_history = len(history)
+        n_memory = len(relevant_memory)
+        if not _fits(n_history, n_memory):
+            min_history = min(1, n_history)
+            n_history = _bisect_largest(
+                min_history, n_history - 1, lambda n: _fits(n, n_memory)
+            )
+            if n_history is None:
+                n_history = min_history
+                n_memory = (
+                    _bisect_largest(0, n_memory - 1, lambda n: _fits(n_history, n)) or 0
+                )
+        msgs = _msgs(history[len(history) - n_history :], relevant_memory[:n_memory])
+        ntokens = self.model.count_tokens(msgs)
         return msgs, ntokens
 
     # def _get_compressed_history(self):
@@ -219,34 +411,92 @@ class Agent:
     #         ]
     #     return hist
 
-    def _get_compressed_history(self):
-        history = self._get_non_user_messages(30)
+    def _history_digest(self, messages):
+        h = hashlib.sha256()
+        for msg in messages:
+            h.update(json.dumps(msg, sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def _summarize_history(self, history, summary=None):
+        if summary:
+            intro = (
+                f"Here is a summary of the conversation so far:\n{summary}\n\n"
+                + f"Please update this summary with the following new messages:\n{history}\n\n"
+            )
+        else:
+            intro = f"Please summarize this conversation for me:\n{history}\n\n"
+        return [
+            {
+                "role": "user",
+                "content": (
+                    intro
+                    + "Important Details and Results:"
+                    + "\n- Include key findings from the research and data collection phases.\n- Highlight important commands"
+                    + "executed and their results.\n\nKey Highlights:\n- Summarize the main points of the conversation in bullet points."
+                    + "\n- Focus on relevant information and filter out redundant exchanges.\n\nAdditional Context:\n- Provide any relevant links"
+                    + " or references mentioned during the conversation.\n\nPlease ensure the summary accurately captures the essential aspects of"
+                    + " the task and includes details that are crucial for understanding the context and progress.\n\nThank you!"
+                ),
+            }
+        ]
+
+    def _history_summary_request(self):
+        # Returns the current summary, and the messages to update it with if there are new messages.
+        msgs = self._get_non_user_messages(len(self.history))
+        cache = self.history_summary
+        if (
+            cache
+            and cache["count"] <= len(msgs)
+            and cache["digest"] == self._history_digest(msgs[: cache["count"]])
+        ):
+            # Only fold messages added since the last summary.
+            summary = cache["summary"]
+            history = msgs[cache["count"] :]
+        else:
+            # History was edited or cleared, start over.
+            summary = None
+            history = msgs[-31:]
+
+        if not history:
+            return summary, None
         maxtokens = self.model.get_token_limit()
         while True:
-            message = [
-                {
-                    "role": "user",
-                    "content": (
-                        f"Please summarize this conversation for me:\n{history}\n\nImportant Details and Results:"
-                        + "\n- Include key findings from the research and data collection phases.\n- Highlight important commands"
-                        + "executed and their results.\n\nKey Highlights:\n- Summarize the main points of the conversation in bullet points."
-                        + "\n- Focus on relevant information and filter out redundant exchanges.\n\nAdditional Context:\n- Provide any relevant links"
-                        + " or references mentioned during the conversation.\n\nPlease ensure the summary accurately captures the essential aspects of"
-                        + " the task and includes details that are crucial for understanding the context and progress.\n\nThank you!"
-                    ),
-                }
-            ]
+            message = self._summarize_history(history, summary)
             ntokens = self.model.count_tokens(message)
-            if ntokens < maxtokens:
+            if ntokens < maxtokens or len(history) == 1:
                 break
             else:
                 history.pop(0)
+        return summary, (message, msgs)
 
-        if len(history) == 0:
-            history = []
+    def _update_history_summary(self, summary, msgs):
+        self.history_summary = {
+            "summary": summary,
+            "count": len(msgs),
+            "digest": self._history_digest(msgs),
+        }
+
+    def _get_compressed_history(self):
+        summary, request = self._history_summary_request()
+        if request:
+            message, msgs = request
+            summary = self._model_chat("history_summary", message)
+            self._update_history_summary(summary, msgs)
+        return self._compressed_history(summary)
+
+    async def _aget_compressed_history(self):
+        summary, request = self._history_summary_request()
+        if request:
+            message, msgs = request
+            summary = await self._amodel_chat("history_summary", message)
+            self._update_history_summary(summary, msgs)
+        return self._compressed_history(summary)
+
+    def _compressed_history(self, summary):
+        if summary:
+            history = [{"role": "system", "content": summary}]
         else:
-            history_summary = self.model.chat(message)
-            history = [{"role": "system", "content": history_summary}]
+            history = []
         if self.additional_history:
             history += [
                 {
@@ -263,13 +513,23 @@ class Agent:
         return self.next_prompt + "\n\n" + (message or "")
 
     def _default_response_callback(self, resp):
+        return self._handle_response(self.evaluate(resp))
+
+    def _handle_response(self, resp):
+        # Stages the command of a parsed response and records its progress and plan.
         try:
-            resp = self.evaluate(resp)
             plan = resp.get("plan")
             if isinstance(resp, dict):
                 if "name" in resp:
                     resp = {"command": resp}
-                if "command" in resp:
+                commands = resp.get("commands")
+                if isinstance(commands, list) and commands:
+                    # A single command is staged as usual, several as a list.
+                    self.staging_tool = commands[0] if len(commands) == 1 else commands
+                    self.exec_history += commands
+                    self.staging_response = resp
+                    self.state = AgentStates.TOOL_STAGED
+                elif "command" in resp:
                     self.staging_tool = resp["command"]
                     self.exec_history.append(resp["command"])
                     self.staging_response = resp
@@ -295,11 +555,19 @@ class Agent:
         except:
             raise
 
-    def _chat(self, message: Optional[str] = None):
+    def _chat_args(self, message: Optional[str] = None):
         message = self.get_full_message(message)
         full_prompt, token_count = self.get_full_prompt(message)
+        return full_prompt, self._max_tokens(full_prompt, token_count)
+
+    async def _achat_args(self, message: Optional[str] = None):
+        message = self.get_full_message(message)
+        full_prompt, token_count = await self.aget_full_prompt(message)
+        return full_prompt, self._max_tokens(full_prompt, token_count)
+
+    def _max_tokens(self, full_prompt, token_count):
         token_limit = self.model.get_token_limit()
-        max_tokens = min(1000, max(token_limit - token_count, 0))
+        max_tokens = min(self.max_completion_tokens, max(token_limit - token_count, 0))
         try:
             assert max_tokens
         except:
@@ -308,70 +576,258 @@ class Agent:
             [print(msg["role"], "::", msg["content"]) for msg in full_prompt]
             print("================================")
             raise
-        return self.model.chat(
+        return max_tokens
+
+    def _record_llm_call(self, span, messages, resp):
+        if self.tracer.enabled:
+            span.add("llm_calls")
+            span.add("prompt_tokens", self.model.count_tokens(messages))
+            span.add(
+                "completion_tokens",
+                self.model.count_tokens([{"role": "assistant", "content": resp}]),
+            )
+
+    def _model_chat(self, name, messages, **kwargs):
+        with self.tracer.span(name) as span:
+            resp = self.model.chat(messages, **kwargs)
+            self._record_llm_call(span, messages, resp)
+        return resp
+
+    async def _amodel_chat(self, name, messages, **kwargs):
+        with self.tracer.span(name) as span:
+            resp = await self.model.achat(messages, **kwargs)
+            self._record_llm_call(span, messages, resp)
+        return resp
+
+    def _chat(self, message: Optional[str] = None):
+        full_prompt, max_tokens = self._chat_args(message)
+        return self._model_chat(
+            "llm",
             full_prompt,
             max_tokens=max_tokens,
             temperature=self.temperature,
         )
 
+    def _stream_chat(self, message, response_callback):
+        full_prompt, max_tokens = self._chat_args(message)
+        chunks = []
+        with self.tracer.span("llm", stream=True) as span:
+            for chunk in self.model.stream_chat(
+                full_prompt,
+                max_tokens=max_tokens,
+                temperature=self.temperature,
+            ):
+                chunks.append(chunk)
+                yield chunk
+            resp = "".join(chunks)
+            self._record_llm_call(span, full_prompt, resp)
+        return self._process_response(message, resp, response_callback)
+
+    def _process_response(self, message, resp, response_callback):
+        # user message
+        self.history.append({"role": "user", "content": message})
+        # assistant message
+        self.history.append({"role": "assistant", "content": resp})
+
+        # process response
+        if response_callback:
+            resp = response_callback(resp)
+
+        if self.state == AgentStates.START:
+            self.state = AgentStates.IDLE
+        return resp
+
     @spinner
     def chat(
-        self, message: Optional[str] = None, run_tool=False, response_callback=-1
-    ) -> Optional[Union[str, Dict]]:
-        if response_callback == -1:
-            response_callback = self._default_response_callback
+        self,
+        message: Optional[str] = None,
+        run_tool=False,
+        response_callback=-1,
+        stream=False,
+    ) -> Optional[Union[str, Dict, "ChatStream"]]:
+        """Sends a message to the agent and returns its processed response.
+
+        :param message: The message to send. Defaults to ``None``.
+        :type message: str, optional
+        :param run_tool: Whether to run the staged command before sending the message. Defaults to ``False``.
+        :type run_tool: bool, optional
+        :param response_callback: Function applied to the raw response. Defaults to parsing the response as JSON.
+            Pass ``None`` to get the raw response.
+        :type response_callback: callable, optional
+        :param stream: If ``True``, a :class:`ChatStream` is returned instead, which yields the raw response in
+            pieces as the model generates it. The processed response is available as ``ChatStream.response``
+            once the stream is exhausted, which is also when the ``"chat"`` span of the :attr:`tracer` ends.
+            Defaults to ``False``.
+        :type stream: bool, optional
+        """
+        if stream and self.tracer.enabled:
+            # The chat span stays open until the stream is exhausted. The stream runs in its own context so
+            # that the span is current for its child spans but not for the caller's code between chunks.
+            context = contextvars.copy_context()
+            generator = self._traced_stream(message, run_tool, response_callback)
+            context.run(next, generator)
+            return ChatStream(generator, context)
+        with self.tracer.span("chat", agent=self.name, stream=stream) as span:
+            if not self.tracer.enabled:
+                return self._chat_turn(message, run_tool, response_callback, stream)
+            hits = self._cache_hits()
+            resp = self._chat_turn(message, run_tool, response_callback, stream)
+            self._set_cache_hits(span, hits)
+            return resp
+
+    def _traced_stream(self, message, run_tool, response_callback):
+        # Yields None once the staged command has run, then the chunks of the response.
+        with self.tracer.span("chat", agent=self.name, stream=True) as span:
+            hits = self._cache_hits()
+            stream = self._chat_turn(message, run_tool, response_callback, True)
+            yield
+            resp = yield from stream._generator
+            self._set_cache_hits(span, hits)
+        return resp
+
+    def _set_cache_hits(self, span, hits):
+        for key, n in self._cache_hits().items():
+            span.set(key, n - hits.get(key, 0))
+
+    def _cache_hits(self):
+        hits = {}
+        token_count_cache = getattr(self.model, "_token_count_cache", None)
+        if token_count_cache is not None:
+            hits["token_count_cache_hits"] = token_count_cache.hits
+        if hasattr(self.model, "hits"):
+            hits["model_cache_hits"] = self.model.hits
+        if hasattr(self.embedding_provider, "hits"):
+            hits["embedding_cache_hits"] = self.embedding_provider.hits
+        return hits
+
+    def _check_not_stopped(self):
         if self.state == AgentStates.STOP:
             raise ValueError(
                 "This agent has completed its tasks. It will not accept any more messages."
                 " You can do `agent.clear_state()` to start over with the same goals."
             )
+
+    def _chat_turn(self, message, run_tool, response_callback, stream):
+        if response_callback == -1:
+            response_callback = self._default_response_callback
+        self._check_not_stopped()
         if self.staging_tool:
-            tool = self.staging_tool
-            if run_tool:
-                output = self.run_staging_tool()
-                self.tool_response = output
-                if tool.get("name") == "task_complete":
-                    self.history.append(
-                        {
-                            "role": "system",
-                            "content": "Completed all user specified tasks.",
-                        }
-                    )
-                    self.state = AgentStates.STOP
-                    return
-                if tool.get("name") != "do_nothing":
-                    pass
-                    # TODO We dont have enough space for this in gpt3
-                    # self.memory.add(
-                    #     f"Command \"{tool['name']}\" with args {tool['args']} returned :\n {output}"
-                    # )
+            output = self.run_staging_tool() if run_tool else None
+            if self._finish_staged_tool(run_tool, output):
+                return ChatStream(iter(())) if stream else None
+
+        if stream:
+            return ChatStream(self._stream_chat(message, response_callback))
+        resp = self._chat(message)
+        return self._process_response(message, resp, response_callback)
+
+    async def achat(
+        self,
+        message: Optional[str] = None,
+        run_tool=False,
+        response_callback=-1,
+    ) -> Optional[Union[str, Dict]]:
+        """Asynchronous version of :meth:`chat`. Model, embedding and tool calls are awaited, and no spinner is shown,
+        so many agents can run in one event loop.
+
+        :param message: The message to send. Defaults to ``None``.
+        :type message: str, optional
+        :param run_tool: Whether to run the staged command before sending the message. Defaults to ``False``.
+        :type run_tool: bool, optional
+        :param response_callback: Function applied to the raw response. Defaults to parsing the response as JSON.
+            Pass ``None`` to get the raw response.
+        :type response_callback: callable, optional
+        """
+        with self.tracer.span("chat", agent=self.name, stream=False) as span:
+            if not self.tracer.enabled:
+                return await self._achat_turn(message, run_tool, response_callback)
+            hits = self._cache_hits()
+            resp = await self._achat_turn(message, run_tool, response_callback)
+            self._set_cache_hits(span, hits)
+            return resp
+
+    async def _achat_turn(self, message, run_tool, response_callback):
+        if response_callback == -1:
+            response_callback = self._default_response_callback
+        self._check_not_stopped()
+        if self.staging_tool:
+            output = await self.arun_staging_tool() if run_tool else None
+            if self._finish_staged_tool(run_tool, output):
+                return None
+        full_prompt, max_tokens = await self._achat_args(message)
+        resp = await self._amodel_chat(
+            "llm", full_prompt, max_tokens=max_tokens, temperature=self.temperature
+        )
+        if (
+            getattr(response_callback, "__func__", None)
+            is Agent._default_response_callback
+        ):
+            # Same parsing as evaluate(), but only the model repairing a malformed response, which is synchronous,
+            # runs in a thread. A response that cannot be parsed raises once it is recorded, like in chat().
+            try:
+                parsed = await self._aload_json(resp)
+            except ValueError as e:
+                error = e
+
+                def response_callback(resp):
+                    raise error
+
             else:
+                response_callback = lambda resp: self._handle_response(parsed)
+        return self._process_response(message, resp, response_callback)
+
+    async def run_until_complete(
+        self, goal: Optional[Union[str, List[str]]] = None, max_steps: int = 30
+    ) -> bool:
+        """Runs the agent without user interaction, approving every command, until it completes its task or
+        ``max_steps`` steps are taken. Returns whether the task was completed.
+
+        :param goal: Goal or list of goals that replaces the agent's goals. The agent's goals are kept if not specified.
+        :type goal: str, List[str], optional
+        :param max_steps: Maximum number of steps. Defaults to 30.
+        :type max_steps: int, optional
+        """
+        if goal is not None:
+            self.goals = [goal] if isinstance(goal, str) else list(goal)
+        for _ in range(max_steps):
+            if self.state == AgentStates.STOP:
+                break
+            await self.achat(run_tool=True)
+        return self.state == AgentStates.STOP
+
+    def _finish_staged_tool(self, run_tool, output):
+        # Records the outcome of the staged command and unstages it. Returns True if the agent completed its task.
+        names = self.staging_tool_names()
+        if run_tool:
+            self.tool_response = output
+            if "task_complete" in names:
                 self.history.append(
                     {
                         "role": "system",
-                        "content": f"User did not approve running {tool.get('name', tool)}.",
+                        "content": "Completed all user specified tasks.",
                     }
                 )
+                self.state = AgentStates.STOP
+                return True
+            if names != ["do_nothing"]:
+                pass
+                # TODO We dont have enough space for this in gpt3
                 # self.memory.add(
-                #     f"User disapproved running command \"{tool['name']}\" with args {tool['args']} with following feedback\n: {message}"
+                #     f"Command \"{tool['name']}\" with args {tool['args']} returned :\n {output}"
                 # )
-            self.staging_tool = None
-            self.staging_response = None
-
-        resp = self._chat(message)
-
-        # user message
-        self.history.append({"role": "user", "content": message})
-        # assistant message
-        self.history.append({"role": "assistant", "content": resp})
-
-        # process response
-        if response_callback:
-            resp = response_callback(resp)
-
-        if self.state == AgentStates.START:
-            self.state = AgentStates.IDLE
-        return resp
+        else:
+            self.history.append(
+                {
+                    "role": "system",
+                    "content": f"User did not approve running {', '.join(map(str, names))}.",
+                }
+            )
+            # self.memory.add(
+            #     f"User disapproved running command \"{tool['name']}\" with args {tool['args']} with following feedback\n: {message}"
+            # )
+        self.staging_tool = None
+        self.staging_response = None
+        return False
 
     def evaluate(self, resp):
         resp = self._load_json(resp)
@@ -379,35 +835,58 @@ class Agent:
 
     def _extract_json_with_gpt(self, s):
         func = "def convert_to_json(response: str) -> str:"
-        desc = f"""Convert the given string to a JSON string of the form \n{json.dumps(DEFAULT_RESPONSE_FORMAT_, indent=4)}\nEnsure the result can be parsed by Python json.loads."""
-        res = ai_function(func, desc, [s], self.model)
+        desc = f"""Convert the given string to a JSON string of the form \n{json.dumps(self.response_format, indent=4)}\nEnsure the result can be parsed by Python json.loads."""
+        with self.tracer.span("json_repair_llm") as span:
+            res = ai_function(func, desc, [s], self.model)
+            span.add("llm_calls")
         return res
 
     def _load_json(self, s, try_gpt=True):
+        with self.tracer.span("json_parse") as span:
+            resp, method = self._parse_json(s, try_gpt)
+            span.set("method", method)
+        return resp
+
+    async def _aload_json(self, s):
+        with self.tracer.span("json_parse") as span:
+            try:
+                resp, method = parse_json(self._strip_result(s))
+            except ValueError:
+                # The model is asked to repair the response, synchronously, so this is done in a thread.
+                loop = asyncio.get_running_loop()
+                resp = await loop.run_in_executor(
+                    None,
+                    partial(contextvars.copy_context().run, self._repair_json, s),
+                )
+                method = "llm"
+            self.json_parse_stats[method] += 1
+            span.set("method", method)
+        return resp
+
+    def _strip_result(self, s):
         if "Result: {" in s:
             s = s.split("Result: ", 1)[0]
+        return s
+
+    def _repair_json(self, s):
         try:
-            return json.loads(s)
-        except Exception:
-            s = s[s.find("{") : s.rfind("}") + 1]
-            try:
-                return json.loads(s)
-            except Exception:
-                try:
-                    s = s.replace("\n", " ")
-                    return ast.literal_eval(s)
-                except Exception:
-                    try:
-                        return ast.literal_eval(s + "}")
-                    except:
-                        if try_gpt:
-                            s = self._extract_json_with_gpt(s)
-                            try:
-                                s = ast.literal_eval(s)
-                                return s
-                            except:
-                                return self._load_json(s, try_gpt=False)
-                        raise
+            resp, _ = parse_json(self._extract_json_with_gpt(self._strip_result(s)))
+        except ValueError:
+            self.json_parse_stats["failed"] += 1
+            raise
+        return resp
+
+    def _parse_json(self, s, try_gpt):
+        try:
+            resp, method = parse_json(self._strip_result(s))
+        except ValueError:
+            if not try_gpt:
+                self.json_parse_stats["failed"] += 1
+                raise
+            resp = self._repair_json(s)
+            method = "llm"
+        self.json_parse_stats[method] += 1
+        return resp, method
 
     def last_user_input(self) -> str:
         for msg in self.history[::-1]:
@@ -421,60 +900,200 @@ class Agent:
                 return msg["content"]
         return ""
 
+    def staging_tool_names(self) -> List[str]:
+        """Returns the names of the staged commands."""
+        if self.staging_tool is None:
+            return []
+        commands = self.staging_tool
+        if not isinstance(commands, list):
+            commands = [commands]
+        return [
+            command.get("name", command) if isinstance(command, dict) else command
+            for command in commands
+        ]
+
     def run_staging_tool(self):
-        if "name" not in self.staging_tool:
-            resp = "Command name not provided. Make sure to follow the specified response format."
-            self.history.append(
-                {
-                    "role": "system",
-                    "content": resp,
-                }
-            )
-            return resp
-        tool_id = self.staging_tool["name"]
-        args = self.staging_tool.get("args", {})
+        """Runs the staged command and reports its output in a system message. If several commands are staged,
+        they are run concurrently and a list of their outputs is returned.
+        """
+        if isinstance(self.staging_tool, list):
+            return self._run_commands(self.staging_tool)
+        resp, message = self._run_command(self.staging_tool)
+        self.history.append({"role": "system", "content": message})
+        return resp
+
+    async def arun_staging_tool(self):
+        """Asynchronous version of :meth:`run_staging_tool`. Tools are awaited with
+        :meth:`~loopgpt.tools.base_tool.BaseTool.arun`.
+        """
+        if isinstance(self.staging_tool, list):
+            return await self._arun_commands(self.staging_tool)
+        resp, message = await self._arun_command(self.staging_tool)
+        self.history.append({"role": "system", "content": message})
+        return resp
+
+    def _command_error(self, command):
+        # Returns why the command cannot be run, if it cannot.
+        if not isinstance(command, dict) or "name" not in command:
+            return "Command name not provided. Make sure to follow the specified response format."
+        tool_id = command["name"]
+        if tool_id in ("task_complete", "do_nothing"):
+            return None
+        if "args" not in command:
+            return "Command args not provided. Make sure to follow the specified response format."
+        if tool_id not in self.tools:
+            return f'Command "{tool_id}" does not exist.'
+        return None
+
+    def _command_message(self, command, resp):
+        args = command.get("args", {})
+        return f'Command "{command["name"]}" with args {json.dumps(args)} returned:\n{json.dumps(resp)}'
+
+    def _run_command(self, command):
+        # Returns the output of the command and the system message reporting it.
+        error = self._command_error(command)
+        if error:
+            return error, error
+        tool_id = command["name"]
         if tool_id == "task_complete":
             resp = {"success": True}
         elif tool_id == "do_nothing":
             resp = {"response": "Nothing Done."}
         else:
-            if "args" not in self.staging_tool:
-                resp = "Command args not provided. Make sure to follow the specified response format."
-                self.history.append(
-                    {
-                        "role": "system",
-                        "content": resp,
-                    }
-                )
-                return resp
-            kwargs = self.staging_tool["args"]
-            found = False
-            for k, tool in self.tools.items():
-                if k == tool_id:
-                    found = True
-                    break
-            if not found:
-                resp = f'Command "{tool_id}" does not exist.'
-                self.history.append({"role": "system", "content": resp})
-                return resp
+            tool = self.tools[tool_id]
+            tool.agent = self
             try:
-                resp = tool.run(**kwargs)
+                with self.tracer.span("tool", tool=tool_id):
+                    resp = tool.run(**command["args"])
             except Exception as e:
                 resp = f'Command "{tool_id}" failed with error: {e}'
-                self.history.append(
-                    {
-                        "role": "system",
-                        "content": resp,
-                    }
-                )
-                return resp
-        self.history.append(
-            {
-                "role": "system",
-                "content": f'Command "{tool_id}" with args {json.dumps(args)} returned:\n{json.dumps(resp)}',
-            }
+                return resp, resp
+        return resp, self._command_message(command, resp)
+
+    async def _arun_command(self, command):
+        error = self._command_error(command)
+        if error:
+            return error, error
+        tool_id = command["name"]
+        if tool_id == "task_complete":
+            resp = {"success": True}
+        elif tool_id == "do_nothing":
+            resp = {"response": "Nothing Done."}
+        else:
+            tool = self.tools[tool_id]
+            tool.agent = self
+            try:
+                with self.tracer.span("tool", tool=tool_id):
+                    resp = await tool.arun(**command["args"])
+            except Exception as e:
+                resp = f'Command "{tool_id}" failed with error: {e}'
+                return resp, resp
+        return resp, self._command_message(command, resp)
+
+    def _command_timeout(self, command):
+        tool = isinstance(command, dict) and self.tools.get(command.get("name"))
+        timeout = getattr(tool, "timeout", None)
+        return self.command_timeout if timeout is None else timeout
+
+    def _timeout_message(self, command):
+        name = command.get("name") if isinstance(command, dict) else command
+        return f'Command "{name}" timed out after {self._command_timeout(command)} seconds.'
+
+    def _serialized_commands(self, commands, new_lock):
+        # Commands for the same tool run one at a time, unless the tool is concurrent_safe. Returns the key of the
+        # tool, its lock (None if the command need not wait for it) and the timeout of each command. A command
+        # waiting for its tool gets the timeouts of the commands queued before it on top of its own.
+        locks, queued, serialized = {}, {}, []
+        for command in commands:
+            timeout = self._command_timeout(command)
+            tool = isinstance(command, dict) and self.tools.get(command.get("name"))
+            if not tool or tool.concurrent_safe:
+                serialized.append((None, None, timeout))
+                continue
+            key = command["name"]
+            if key not in locks:
+                locks[key] = new_lock()
+            if timeout is not None:
+                timeout = queued[key] = queued.get(key, 0) + timeout
+            serialized.append((key, locks[key], timeout))
+        return serialized
+
+    def _run_commands(self, commands):
+        finished = threading.Event()
+
+        def run(command, lock):
+            if lock is None:
+                return self._run_command(command)
+            with lock:
+                # Not run if it was reported as timed out while waiting for its tool.
+                if finished.is_set():
+                    message = self._timeout_message(command)
+                    return message, message
+                return self._run_command(command)
+
+        # Threads do not inherit context variables, so each command runs in a copy of the
+        # current context to keep its tool span nested in the current chat span.
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, min(len(commands), self.max_parallel_commands))
         )
-        return resp
+        serialized = self._serialized_commands(commands, threading.Lock)
+        futures = [
+            pool.submit(contextvars.copy_context().run, run, command, lock)
+            for command, (_, lock, _) in zip(commands, serialized)
+        ]
+        start = time.monotonic()
+        resps, messages = [], []
+        for command, future, (_, _, timeout) in zip(commands, futures, serialized):
+            if timeout is not None:
+                timeout = max(0, start + timeout - time.monotonic())
+            wait([future], timeout=timeout)
+            if future.done():
+                resp, message = future.result()
+            else:
+                resp = message = self._timeout_message(command)
+            resps.append(resp)
+            messages.append(message)
+        finished.set()
+        # Commands that timed out keep running in the background.
+        pool.shutdown(wait=False, cancel_futures=True)
+        self.history.append({"role": "system", "content": "\n\n".join(messages)})
+        return resps
+
+    async def _arun_commands(self, commands):
+        semaphore = asyncio.Semaphore(max(1, self.max_parallel_commands))
+        timed_out = set()
+
+        async def run_locked(command, key, lock):
+            if lock is None:
+                return await self._arun_command(command)
+            async with lock:
+                # A tool run in a thread keeps running after a timeout, so later commands for it are not run.
+                if key in timed_out:
+                    message = self._timeout_message(command)
+                    return message, message
+                try:
+                    return await self._arun_command(command)
+                except asyncio.CancelledError:
+                    timed_out.add(key)
+                    raise
+
+        async def run(command, key, lock, timeout):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(
+                        run_locked(command, key, lock), timeout
+                    )
+                except asyncio.TimeoutError:
+                    message = self._timeout_message(command)
+                    return message, message
+
+        serialized = self._serialized_commands(commands, asyncio.Lock)
+        results = await asyncio.gather(
+            *(run(command, *args) for command, args in zip(commands, serialized))
+        )
+        messages = [message for _, message in results]
+        self.history.append({"role": "system", "content": "\n\n".join(messages)})
+        return [resp for resp, _ in results]
 
     def clear_state(self):
         self.staging_tool = None
@@ -483,24 +1102,47 @@ class Agent:
         self.progress = []
         self.state = AgentStates.START
         self.history.clear()
+        self.history_summary = None
         self.sub_agents.clear()
         self.memory.clear()
         self.plan.clear()
 
+    def _cached_section(self, name, key, build):
+        # Sections are rebuilt only when their inputs change, so that the header is
+        # cheap to get every turn and byte for byte identical while nothing changes.
+        cached = self._header_cache.get(name)
+        if cached is None or cached[0] != key:
+            cached = self._header_cache[name] = (key, build())
+        return cached[1]
+
     def header_prompt(self):
-        prompt = []
-        prompt.append(self.persona_prompt())
+        """Returns the header: persona, tools, goals, constraints, plan and progress.
+        Each section is memoized and only rebuilt when the attributes it is made from change.
+        """
+        sections = [("persona", (self.name, self.description), self.persona_prompt)]
         if self.tools:
-            prompt.append(self.tools_prompt())
+            sections.append(("tools", tuple(self.tools.items()), self.tools_prompt))
         if self.goals:
-            prompt.append(self.goals_prompt())
+            sections.append(("goals", tuple(self.goals), self.goals_prompt))
         if self.constraints:
-            prompt.append(self.constraints_prompt())
+            sections.append(
+                ("constraints", tuple(self.constraints), self.constraints_prompt)
+            )
         if self.plan:
-            prompt.append(self.plan_prompt())
+            sections.append(("plan", tuple(self.plan), self.plan_prompt))
         if self.progress:
-            prompt.append(self.progress_prompt())
-        return "\n".join(prompt) + "\n"
+            sections.append(("progress", tuple(self.progress), self.progress_prompt))
+
+        def build():
+            prompt = [
+                self._cached_section(name, key, section_prompt)
+                for name, key, section_prompt in sections
+            ]
+            return "\n".join(prompt) + "\n"
+
+        return self._cached_section(
+            "header", tuple((name, key) for name, key, _ in sections), build
+        )
 
     def persona_prompt(self):
         return f"You are {self.name}, {self.description}."
@@ -558,6 +1200,10 @@ class Agent:
         return "\n".join(prompt) + "\n"
 
     def config(self, include_state=True):
+        return self._config(include_state)
+
+    def _config(self, include_state=True, memory=None):
+        # ``memory`` is used instead of the inlined memory config if given.
         cfg = {
             "class": self.__class__.__name__,
             "type": "agent",
@@ -569,6 +1215,12 @@ class Agent:
             "model": self.model.config(),
             "embedding_provider": self.embedding_provider.config(),
             "temperature": self.temperature,
+            "max_completion_tokens": self.max_completion_tokens,
+            "parallel_commands": self.parallel_commands,
+            "command_timeout": self.command_timeout,
+            "max_parallel_commands": self.max_parallel_commands,
+            "memory_min_score": self.memory_min_score,
+            "memory_mmr_lambda": self.memory_mmr_lambda,
             "tools": [tool.config() for tool in self.tools.values()],
         }
         if include_state:
@@ -580,7 +1232,8 @@ class Agent:
                         k: (v[0].config(), v[1]) for k, v in self.sub_agents.items()
                     },
                     "history": self.history[:],
-                    "memory": self.memory.config(),
+                    "history_summary": self.history_summary,
+                    "memory": memory or self.memory.config(),
                     "staging_tool": self.staging_tool,
                     "staging_response": self.staging_response,
                     "tool_response": self.tool_response,
@@ -601,6 +1254,12 @@ class Agent:
         agent.constraints = config["constraints"][:]
         agent.state = config["state"]
         agent.temperature = config["temperature"]
+        agent.max_completion_tokens = config.get("max_completion_tokens", 1000)
+        agent.parallel_commands = config.get("parallel_commands", False)
+        agent.command_timeout = config.get("command_timeout", 120)
+        agent.max_parallel_commands = config.get("max_parallel_commands", 8)
+        agent.memory_min_score = config.get("memory_min_score", agent.memory_min_score)
+        agent.memory_mmr_lambda = config.get("memory_mmr_lambda")
         agent.tools = {tool.id: tool for tool in map(tool_from_config, config["tools"])}
         agent.progress = config.get("progress", [])
         agent.plan = config.get("plan", [])
@@ -609,6 +1268,7 @@ class Agent:
             for k, v in config.get("sub_agents", {}).items()
         }
         agent.history = config.get("history", [])
+        agent.history_summary = config.get("history_summary")
         memory = config.get("memory")
         if memory:
             agent.memory = memory_from_config(memory)
@@ -617,8 +1277,26 @@ class Agent:
         agent.tool_response = config.get("tool_response")
         return agent
 
-    def save(self, file, include_state=True):
-        cfg = self.config(include_state=include_state)
+    def save(self, file, include_state=True, memory_path=None):
+        """Saves the agent's config to a JSON file.
+
+        :param file: Path or file like object to write to.
+        :type file: str, file
+        :param include_state: Whether to include the agent's state (history, memory, etc.). Defaults to ``True``.
+        :type include_state: bool, optional
+        :param memory_path: If specified, the memory is written in binary form to this directory instead of
+            being inlined as JSON. Loading such an agent memory-maps the files, which is much faster for large memories.
+            The directory is referenced relative to ``file`` if it is a path, so both can be moved together.
+        :type memory_path: str, optional
+        """
+        memory = None
+        if include_state and memory_path:
+            memory = self.memory.save(memory_path)
+            if isinstance(file, str):
+                memory["path"] = os.path.relpath(
+                    memory["path"], os.path.dirname(os.path.abspath(file))
+                )
+        cfg = self._config(include_state, memory)
         if hasattr(file, "write"):
             json.dump(cfg, file)
         elif isinstance(file, str):
@@ -635,6 +1313,12 @@ class Agent:
         elif isinstance(file, str):
             with open(file, "r") as f:
                 cfg = json.load(f)
+            # Memory directories are saved relative to the agent file.
+            memory = cfg.get("memory") or {}
+            if memory.get("path") and not os.path.isabs(memory["path"]):
+                memory["path"] = os.path.join(
+                    os.path.dirname(os.path.abspath(file)), memory["path"]
+                )
         else:
             raise TypeError(f"Expected str or file like object. Received {type(f)}.")
         return cls.from_config(cfg)
@@ -713,6 +1397,21 @@ class Agent:
             self.additional_history = cached
 
 
+def _bisect_largest(lo, hi, pred):
+    """Returns the largest ``n`` in ``[lo, hi]`` for which ``pred(n)`` is true, or ``None``.
+    ``pred`` must be monotonic (true up to some ``n`` and false after it).
+    """
+    found = None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if pred(mid):
+            found = mid
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return found
+
+
 def empty_agent(**agent_kwargs):
     """Create an empty agent. Always use this function to create a new agent for use in conjunction with AI functions.
     Creating agents with the :class:`Agent` class directly is reserved for CLI applications.
@@ -39,6 +39,15 @@ def get_args_prompt(sig, args, kwargs):
     return f"Arguments:\n\n{args_str}\n\n{kwargs_str}"
 
 
+RETURN_VALUE_PROMPT = "Respond only with your return value. Your response is to be directly parsed, strictly do not include any other text in your response."
+
+
+def _get_args_str(sig, args, kwargs):
+    if len(args) == 0 and len(kwargs) == 0:
+        return "Arguments:\n\nThis function does not take any arguments."
+    return get_args_prompt(sig, args, kwargs)
+
+
 def main_response_callback(resp, return_annotation):
     if return_annotation == str:
         resp = resp.strip('"""').strip('"')
@@ -140,6 +149,11 @@ class aifunc:
     .. note::
         Always create agents using :func:`loopgpt.empty_agent <loopgpt.agent.empty_agent>` when using them in conjunction with AI functions.
 
+    Several calls can be answered together with ``batch``, which sends them to the model in a single
+    :meth:`~loopgpt.models.base.BaseModel.chat_batch` call:
+
+        >>> shakespearify.batch(["Hey man", "See you later"])
+
     Examples:
 
         >>> @loopgpt.aifunc()
@@ -217,10 +231,10 @@ class aifunc:
         self.tools = tools
 
     def __call__(self, func):
+        sig = inspect.signature(func)
+
         @wraps(func)
         def inner(*args, model=None, embedding_provider=None, **kwargs):
-            sig = inspect.signature(func)
-
             agent_kwargs = {
                 "model": model or aifunc.model,
                 "embedding_provider": embedding_provider or aifunc.embedding_provider,
@@ -233,11 +247,7 @@ class aifunc:
             agent.name = func.__name__
             func_prompt = get_func_prompt(func, sig)
             agent.description = func_prompt
-
-            if len(args) == 0 and len(kwargs) == 0:
-                args_str = "Arguments:\n\nThis function does not take any arguments."
-            else:
-                args_str = get_args_prompt(sig, args, kwargs)
+            args_str = _get_args_str(sig, args, kwargs)
 
             if self.tools:
                 analyzer = create_analyzer_agent(
@@ -288,14 +298,76 @@ class aifunc:
                                 response_callback=collector_response_callback
                             )
 
-            resp = agent.chat(
-                args_str
-                + "Respond only with your return value. Your response is to be directly parsed, strictly do not include any other text in your response.",
-                response_callback=None,
-            )
+            resp = agent.chat(args_str + RETURN_VALUE_PROMPT, response_callback=None)
             resp = main_response_callback(resp, sig.return_annotation)
             return resp
 
+        def batch(calls: List, model=None, embedding_provider=None) -> List:
+            """Calls the function once for each item of ``calls`` and returns the results in order.
+            An item is a tuple of positional arguments, a dict of keyword arguments or a single argument.
+
+            Functions without tools are answered with one :meth:`~loopgpt.models.base.BaseModel.chat_batch`
+            call, so that local models generate all results in a few padded batches.
+            Each call gets its own agent, sharing the memory of the active agent, if any.
+            """
+            calls = [
+                (
+                    ((), call)
+                    if isinstance(call, dict)
+                    else (call if isinstance(call, tuple) else (call,), {})
+                )
+                for call in calls
+            ]
+            if self.tools:
+                return [
+                    inner(
+                        *args,
+                        model=model,
+                        embedding_provider=embedding_provider,
+                        **kwargs,
+                    )
+                    for args, kwargs in calls
+                ]
+            active_agent = loopgpt.agent.ACTIVE_AGENT
+            if active_agent:
+                model = model or active_agent.model
+                embedding_provider = (
+                    embedding_provider or active_agent.embedding_provider
+                )
+            agent_kwargs = {
+                "model": model or aifunc.model,
+                "embedding_provider": embedding_provider or aifunc.embedding_provider,
+            }
+            agents = []
+            messages = []
+            prompts = []
+            max_tokens = None
+            for args, kwargs in calls:
+                agent = empty_agent(**agent_kwargs)
+                if active_agent:
+                    agent.memory = active_agent.memory
+                agent.name = func.__name__
+                agent.description = get_func_prompt(func, sig)
+                message = _get_args_str(sig, args, kwargs) + RETURN_VALUE_PROMPT
+                full_prompt, tokens = agent._chat_args(message)
+                max_tokens = tokens if max_tokens is None else min(max_tokens, tokens)
+                agents.append(agent)
+                messages.append(message)
+                prompts.append(full_prompt)
+            if not agents:
+                return []
+            resps = agents[0].model.chat_batch(
+                prompts, max_tokens=max_tokens, temperature=agents[0].temperature
+            )
+            return [
+                main_response_callback(
+                    agent._process_response(message, resp, None),
+                    sig.return_annotation,
+                )
+                for agent, message, resp in zip(agents, messages, resps)
+            ]
+
+        inner.batch = batch
         return inner
 
 
@@ -51,6 +51,37 @@ INIT_PROMPT = (
     + "\n"
 )
 
+# Opt-in response format with a list of independent commands, which the agent runs concurrently.
+MULTI_COMMAND_RESPONSE_FORMAT_ = {
+    "thoughts": DEFAULT_RESPONSE_FORMAT_["thoughts"],
+    "commands": [
+        {"name": "next command in your plan", "args": {"arg name": "value"}},
+        {
+            "name": "another command that does not need the output of the others",
+            "args": {"arg name": "value"},
+        },
+    ],
+}
+
+
+NEXT_PROMPT_MULTI_COMMAND = (
+    NEXT_PROMPT.split("12 - ")[0]
+    + "12 - You can execute several commands at once. They run at the same time, so only list commands that do not depend on each other's output.\n"
+    + "13 - ONLY RESPOND IN THE FOLLOWING FORMAT: (MAKE SURE THAT IT CAN BE DECODED WITH PYTHON JSON.LOADS())\n"
+    + json.dumps(MULTI_COMMAND_RESPONSE_FORMAT_, indent=4)
+    + "\n"
+)
+
+
+INIT_PROMPT_MULTI_COMMAND = (
+    "Do the following:\n"
+    + "1 - Execute the next best commands to achieve the goals. They run at the same time, so only list commands that do not depend on each other's output.\n"
+    + '2 - Execute the "do_nothing" command if there is no other command to execute.\n'
+    + "3 - ONLY RESPOND IN THE FOLLOWING FORMAT: (MAKE SURE THAT IT CAN BE DECODED WITH PYTHON JSON.LOADS())\n"
+    + json.dumps(MULTI_COMMAND_RESPONSE_FORMAT_, indent=4)
+    + "\n"
+)
+
 DEFAULT_PROMPT_TEMPLATE = """
     <HEADER>
     <HISTORY>
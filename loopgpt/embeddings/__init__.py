@@ -2,6 +2,7 @@ from loopgpt.embeddings.base import BaseEmbeddingProvider
 from loopgpt.embeddings.openai_ import OpenAIEmbeddingProvider
 from loopgpt.embeddings.azure_openai import AzureOpenAIEmbeddingProvider
 from loopgpt.embeddings.hf import HuggingFaceEmbeddingProvider
+from loopgpt.embeddings.cached import CachedEmbeddingProvider
 
 user_providers = {}
 
@@ -3,7 +3,7 @@ from loopgpt.embeddings.openai_ import OpenAIEmbeddingProvider
 from typing import Optional
 
 from loopgpt.utils.openai_key import get_openai_key
-from openai import AzureOpenAI
+from loopgpt.utils.openai_client import get_client, get_async_client
 
 
 class AzureOpenAIEmbeddingProvider(OpenAIEmbeddingProvider):
@@ -19,6 +19,9 @@ class AzureOpenAIEmbeddingProvider(OpenAIEmbeddingProvider):
         See :class:`AzureOpenAIModel <loopgpt.models.azure_openai.AzureOpenAIModel>` also.
     """
 
+    # Older Azure API versions accept at most 16 inputs per embeddings request.
+    max_batch_size = 16
+
     def __init__(
         self,
         model: str,
@@ -30,16 +33,15 @@ class AzureOpenAIEmbeddingProvider(OpenAIEmbeddingProvider):
         self.api_key = get_openai_key(api_key)
         self.api_version = api_version
         self.azure_endpoint = azure_endpoint
-        self.client = AzureOpenAI(
-            api_key=self.api_key, api_version=api_version, azure_endpoint=azure_endpoint
+
+    def _shared_client(self):
+        return get_client(
+            self.api_key, self.azure_endpoint, self.api_version, self.max_retries
         )
 
-    def get(self, text: str):
-        return np.array(
-            self.client.embeddings.create(input=[text], model=self.model)
-            .data[0]
-            .embedding,
-            dtype=np.float32,
+    def _get_async_client(self):
+        return get_async_client(
+            self.api_key, self.azure_endpoint, self.api_version, self.max_retries
         )
 
     def config(self):
@@ -1,12 +1,33 @@
+from typing import List, Optional
+from functools import partial
+
 import numpy as np
+import asyncio
 
 
 class BaseEmbeddingProvider:
     """Base class for all embedding providers."""
 
+    # Similarity to a query below which documents are usually unrelated to it. Agents use it as their default
+    # memory cutoff. None if the provider does not know.
+    min_score: Optional[float] = None
+
     def get(self, text: str) -> np.ndarray:
         raise NotImplementedError()
 
+    def get_batch(self, texts: List[str]) -> np.ndarray:
+        """Returns the embeddings of a list of texts as a 2D array, one row per text.
+        Providers that can embed several texts in one call should override this.
+        """
+        return np.stack([self.get(text) for text in texts])
+
+    async def aget(self, text: str) -> np.ndarray:
+        """Asynchronous version of :meth:`get`. Providers without a native async implementation run :meth:`get`
+        in the event loop's default thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.get, text))
+
     def __call__(self, text: str):
         return self.get(text)
 
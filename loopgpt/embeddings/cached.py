@@ -0,0 +1,177 @@
+from typing import List, Optional
+from loopgpt.embeddings.base import BaseEmbeddingProvider
+
+import numpy as np
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "loopgpt", "embeddings.sqlite"
+)
+
+
+class CachedEmbeddingProvider(BaseEmbeddingProvider):
+    """Wraps an embedding provider with a persistent SQLite cache, so that the same text is embedded only once
+    across agent restarts.
+
+    Entries are keyed by the wrapped provider's class, its configuration (excluding API keys) and a hash of the text.
+    When the cache grows beyond ``max_entries``, the least recently used entries are evicted.
+
+    :param provider: The embedding provider to wrap.
+    :type provider: :class:`~loopgpt.embeddings.base.BaseEmbeddingProvider`
+    :param path: Path to the SQLite database. Defaults to ``~/.cache/loopgpt/embeddings.sqlite``.
+        Use ``":memory:"`` for a cache that lives only as long as the process.
+    :type path: str, optional
+    :param max_entries: Maximum number of embeddings to keep. Defaults to 100000.
+    :type max_entries: int, optional
+
+    Example:
+
+    .. code-block:: python
+
+        from loopgpt.embeddings import OpenAIEmbeddingProvider, CachedEmbeddingProvider
+
+        embedding_provider = CachedEmbeddingProvider(OpenAIEmbeddingProvider())
+        agent = loopgpt.Agent(embedding_provider=embedding_provider)
+        ...
+        print(embedding_provider.hits, embedding_provider.misses)
+    """
+
+    def __init__(
+        self,
+        provider: BaseEmbeddingProvider,
+        path: Optional[str] = None,
+        max_entries: int = 100000,
+    ):
+        self.provider = provider
+        self.path = path or DEFAULT_CACHE_PATH
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, emb BLOB, dtype TEXT, last_used REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+        provider_config = {k: v for k, v in provider.config().items() if k != "api_key"}
+        self._namespace = hashlib.sha256(
+            json.dumps(provider_config, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @property
+    def min_score(self) -> Optional[float]:
+        return self.provider.min_score
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.provider.__class__.__name__}:{self._namespace}:{digest}"
+
+    def _lookup(self, keys: List[str]):
+        found = {}
+        with self._lock, self._conn:
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                rows = self._conn.execute(
+                    "SELECT key, emb, dtype FROM embeddings WHERE key IN (%s)"
+                    % ",".join("?" * len(batch)),
+                    batch,
+                ).fetchall()
+                for key, emb, dtype in rows:
+                    found[key] = np.frombuffer(emb, dtype=dtype)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+        return found
+
+    def _store(self, items):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                [
+                    (key, np.ascontiguousarray(emb).tobytes(), emb.dtype.name, now)
+                    for key, emb in items
+                ],
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def get(self, text: str) -> np.ndarray:
+        return self.get_batch([text])[0]
+
+    async def aget(self, text: str) -> np.ndarray:
+        key = self._key(text)
+        found = self._lookup([key])
+        if key in found:
+            self.hits += 1
+            return found[key]
+        self.misses += 1
+        emb = np.asarray(await self.provider.aget(text))
+        self._store([(key, emb)])
+        return emb
+
+    def get_batch(self, texts: List[str]) -> np.ndarray:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            if len(missing) == 1:
+                embs = [self.provider.get(next(iter(missing.values())))]
+            else:
+                embs = self.provider.get_batch(list(missing.values()))
+            new = [(key, np.asarray(emb)) for key, emb in zip(missing, embs)]
+            self._store(new)
+            found.update(new)
+        return np.stack([found[key] for key in keys])
+
+    def clear(self):
+        """Removes all cached embeddings and resets the hit and miss counters."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+        self.hits = 0
+        self.misses = 0
+
+    def config(self):
+        cfg = super().config()
+        cfg.update(
+            {
+                "provider": self.provider.config(),
+                "path": self.path,
+                "max_entries": self.max_entries,
+            }
+        )
+        return cfg
+
+    @classmethod
+    def from_config(cls, config):
+        from loopgpt.embeddings import from_config as embedding_provider_from_config
+
+        return cls(
+            embedding_provider_from_config(config["provider"]),
+            config.get("path"),
+            config.get("max_entries", 100000),
+        )
@@ -1,3 +1,4 @@
+from typing import List
 from loopgpt.embeddings.base import BaseEmbeddingProvider
 
 
@@ -24,3 +25,6 @@ class HuggingFaceEmbeddingProvider(BaseEmbeddingProvider):
 
     def get(self, text: str):
         return self.model.encode(text)
+
+    def get_batch(self, texts: List[str], batch_size: int = 32):
+        return self.model.encode(texts, batch_size=batch_size)
@@ -1,19 +1,48 @@
-from typing import Optional
+from typing import List, Optional
 from loopgpt.embeddings.base import BaseEmbeddingProvider
+from loopgpt.models.tokenizers import get_tiktoken_encoding
 from loopgpt.utils.openai_key import get_openai_key
-from openai import OpenAI
+from loopgpt.utils.openai_client import get_client, get_async_client
 import numpy as np
 
 
 class OpenAIEmbeddingProvider(BaseEmbeddingProvider):
+    # Per request and per input limits of the embeddings endpoint.
+    max_batch_size = 2048
+    max_batch_tokens = 300000
+    max_input_tokens = 8191
+    # Similarity below which documents are usually unrelated to a query, by model.
+    min_scores = {"text-embedding-ada-002": 0.75}
+    # Embedding requests are not rate limited by loopgpt, so the client retries them itself.
+    max_retries = 2
+
     def __init__(
         self, model: str = "text-embedding-ada-002", api_key: Optional[str] = None
     ):
         self.model = model
         self.api_key = get_openai_key(api_key)
-        self.client = OpenAI(api_key=self.api_key)
+
+    @property
+    def client(self):
+        """The shared client for this provider's credentials (see :mod:`loopgpt.utils.openai_client`), unless
+        another client was assigned to this provider."""
+        return getattr(self, "_client", None) or self._shared_client()
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _shared_client(self):
+        return get_client(self.api_key, max_retries=self.max_retries)
+
+    @property
+    def min_score(self) -> Optional[float]:
+        return self.min_scores.get(self.model)
 
     def get(self, text: str):
+        if len(text) > self.max_input_tokens:
+            # May exceed the per input limit, see get_batch.
+            return self.get_batch([text])[0]
         return np.array(
             self.client.embeddings.create(
                 input=[text],
@@ -24,6 +53,83 @@ class OpenAIEmbeddingProvider(BaseEmbeddingProvider):
             dtype=np.float32,
         )
 
+    def _get_async_client(self):
+        return get_async_client(self.api_key, max_retries=self.max_retries)
+
+    async def aget(self, text: str):
+        if len(text) > self.max_input_tokens:
+            return await super().aget(text)
+        resp = await self._get_async_client().embeddings.create(
+            input=[text], model=self.model
+        )
+        return np.array(resp.data[0].embedding, dtype=np.float32)
+
+    def _encoding(self):
+        # Without an encoding (e.g. tiktoken data cannot be downloaded), the number of characters is used as an
+        # estimate. It is an upper bound on the number of tokens for almost any text.
+        try:
+            return get_tiktoken_encoding(self.model)
+        except Exception:
+            return None
+
+    def _split(self, text: str, enc):
+        # Returns the pieces of a text that fit in one input each, with their token counts.
+        if enc is None:
+            size = self.max_input_tokens
+            pieces = [text[i : i + size] for i in range(0, len(text), size)] or [text]
+            return [(piece, len(piece)) for piece in pieces]
+        if len(text) <= self.max_input_tokens:
+            return [(text, len(enc.encode(text)))]
+        tokens = enc.encode(text)
+        size = self.max_input_tokens
+        return [
+            (enc.decode(tokens[i : i + size]), len(tokens[i : i + size]))
+            for i in range(0, len(tokens), size)
+        ]
+
+    def _batches(self, pieces):
+        batch = []
+        batch_tokens = 0
+        for text, ntokens in pieces:
+            if batch and (
+                len(batch) == self.max_batch_size
+                or batch_tokens + ntokens > self.max_batch_tokens
+            ):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += ntokens
+        if batch:
+            yield batch
+
+    def get_batch(self, texts: List[str]):
+        """Returns the embeddings of a list of texts. Texts longer than the per input token limit are split, and
+        the embeddings of their pieces averaged, weighted by the number of tokens of each piece.
+        """
+        enc = self._encoding()
+        split = [self._split(text, enc) for text in texts]
+        pieces = [piece for text_pieces in split for piece in text_pieces]
+        embs = []
+        for batch in self._batches(pieces):
+            data = self.client.embeddings.create(input=batch, model=self.model).data
+            embs += [d.embedding for d in sorted(data, key=lambda d: d.index)]
+        embs = np.array(embs, dtype=np.float32)
+        if len(pieces) == len(texts):
+            return embs
+        combined = []
+        start = 0
+        for text_pieces in split:
+            piece_embs = embs[start : start + len(text_pieces)]
+            start += len(text_pieces)
+            if len(text_pieces) == 1:
+                combined.append(piece_embs[0])
+                continue
+            weights = [max(ntokens, 1) for _, ntokens in text_pieces]
+            emb = np.average(piece_embs, axis=0, weights=weights)
+            combined.append(emb / np.linalg.norm(emb))
+        return np.array(combined, dtype=np.float32)
+
     def config(self):
         cfg = super().config()
         cfg.update({"model": self.model, "api_key": self.api_key})
@@ -0,0 +1,207 @@
+"""Headless execution of many agents at once.
+
+Each line of a goals file is a JSON object describing one agent:
+
+.. code-block:: json
+
+    {"id": "report-1", "name": "Researcher", "description": "...", "goals": ["..."], "model": "gpt-4", "max_steps": 20}
+
+Only ``goals`` is required. ``model`` and ``embedding_provider`` can also be configs as returned by their ``config()``
+methods. Agents run in continuous mode on a bounded thread pool. OpenAI models with the same
+credentials share one HTTP client and rate limiter (see :mod:`loopgpt.utils.openai_client` and
+:mod:`loopgpt.utils.rate_limiter`), so the agents back off together when rate limited.
+
+Usage:
+
+    loopgpt batch goals.jsonl --workers 16 --max-steps 30 --checkpoint-dir runs/ --results results.jsonl
+"""
+
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from loopgpt.constants import AgentStates
+from loopgpt.logger import logger
+from loopgpt.agent import Agent
+from loopgpt.models import from_config as model_from_config
+from loopgpt.embeddings import from_config as embedding_provider_from_config
+
+import loopgpt.utils.spinner
+import threading
+import json
+import time
+import os
+
+
+def load_specs(path: str) -> List[Dict[str, Any]]:
+    """Reads agent descriptions from a JSON lines file. Blank lines are skipped."""
+    specs = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                specs.append(json.loads(line))
+    return specs
+
+
+def create_agent(spec: Dict[str, Any], model=None):
+    """Creates an agent from a line of a goals file.
+
+    :param spec: Agent description. ``goals`` can be a list or a single string.
+    :type spec: dict
+    :param model: Model used if the spec does not specify one.
+    :type model: str, :class:`~loopgpt.models.base.BaseModel`, optional
+    """
+    kwargs = {}
+    for key in ("name", "description", "temperature", "parallel_commands"):
+        if key in spec:
+            kwargs[key] = spec[key]
+    model = spec.get("model", model)
+    if isinstance(model, dict):
+        model = model_from_config(model)
+    embedding_provider = spec.get("embedding_provider")
+    if isinstance(embedding_provider, dict):
+        embedding_provider = embedding_provider_from_config(embedding_provider)
+    goals = spec["goals"]
+    if isinstance(goals, str):
+        goals = [goals]
+    agent = Agent(
+        goals=goals, model=model, embedding_provider=embedding_provider, **kwargs
+    )
+    agent.constraints = list(spec.get("constraints", []))
+    return agent
+
+
+def run_agent(
+    agent,
+    max_steps: Optional[int] = None,
+    time_budget: Optional[float] = None,
+    checkpoint: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Runs an agent without user interaction until it completes its task or runs out of budget.
+
+    :param agent: The agent to run.
+    :type agent: :class:`~loopgpt.agent.Agent`
+    :param max_steps: Maximum number of agent steps. Unlimited if not specified.
+    :type max_steps: int, optional
+    :param time_budget: Maximum run time in seconds. It is checked between steps, so a step in progress is not cut short.
+    :type time_budget: float, optional
+    :param checkpoint: Path to save the agent to after every step.
+    :type checkpoint: str, optional
+    :return: Status (``"completed"``, ``"max_steps"``, ``"timeout"`` or ``"error"``), number of steps and run time.
+    :rtype: dict
+    """
+    start = time.monotonic()
+    steps = 0
+    status = None
+    error = None
+    try:
+        while agent.state != AgentStates.STOP:
+            if max_steps is not None and steps >= max_steps:
+                status = "max_steps"
+                break
+            if time_budget is not None and time.monotonic() - start >= time_budget:
+                status = "timeout"
+                break
+            # Staged commands are always approved. Without one, the agent is asked for its next step.
+            agent.chat(run_tool=True)
+            steps += 1
+            if checkpoint:
+                agent.save(checkpoint)
+        status = status or "completed"
+    except Exception as e:
+        logger.exception(f"Agent {agent.name} failed.")
+        status = "error"
+        error = f"{type(e).__name__}: {e}"
+        if checkpoint:
+            try:
+                agent.save(checkpoint)
+            except Exception:
+                pass
+    result = {
+        "status": status,
+        "steps": steps,
+        "elapsed": time.monotonic() - start,
+        "last_response": agent.last_agent_response(),
+    }
+    if error:
+        result["error"] = error
+    if checkpoint:
+        result["checkpoint"] = checkpoint
+    return result
+
+
+def run_batch(
+    specs: List[Dict[str, Any]],
+    workers: int = 8,
+    model=None,
+    max_steps: Optional[int] = 30,
+    time_budget: Optional[float] = None,
+    checkpoint_dir: Optional[str] = None,
+    results_path: Optional[str] = None,
+    resume: bool = False,
+) -> List[Dict[str, Any]]:
+    """Runs many agents concurrently and returns a result per agent, in the order of ``specs``.
+
+    :param specs: Agent descriptions, see :func:`create_agent`. ``max_steps`` and ``time_budget`` in a spec
+        override the arguments of the same name.
+    :type specs: List[dict]
+    :param workers: Number of agents run at the same time. Defaults to 8.
+    :type workers: int, optional
+    :param model: Model used by agents whose spec does not name one. Defaults to gpt-3.5-turbo.
+    :type model: str, optional
+    :param max_steps: Maximum number of steps per agent. Defaults to 30.
+    :type max_steps: int, optional
+    :param time_budget: Maximum run time per agent in seconds. Unlimited if not specified.
+    :type time_budget: float, optional
+    :param checkpoint_dir: Directory where each agent is saved as ``<id>.json`` after every step.
+    :type checkpoint_dir: str, optional
+    :param results_path: JSON lines file to append each result to as soon as its agent finishes.
+    :type results_path: str, optional
+    :param resume: Continue agents from their checkpoints, if there are any, instead of starting over. Defaults to False.
+    :type resume: bool, optional
+    """
+    lock = threading.Lock()
+    results_file = open(results_path, "a") if results_path else None
+    # The spinner swaps sys.stdout, which agents running in parallel would do concurrently.
+    spinner_enabled = loopgpt.utils.spinner.SPINNER_ENABLED
+    loopgpt.utils.spinner.SPINNER_ENABLED = False
+
+    def run(i, spec):
+        agent_id = str(spec.get("id", i))
+        checkpoint = None
+        if checkpoint_dir:
+            checkpoint = os.path.join(checkpoint_dir, f"{agent_id}.json")
+        try:
+            if resume and checkpoint and os.path.exists(checkpoint):
+                agent = Agent.load(checkpoint)
+            else:
+                agent = create_agent(spec, model)
+        except Exception as e:
+            result = {"status": "error", "steps": 0, "elapsed": 0.0}
+            result["error"] = f"{type(e).__name__}: {e}"
+        else:
+            result = run_agent(
+                agent,
+                spec.get("max_steps", max_steps),
+                spec.get("time_budget", time_budget),
+                checkpoint,
+            )
+        result = {"id": agent_id, **result}
+        if results_file:
+            with lock:
+                results_file.write(json.dumps(result) + "\n")
+                results_file.flush()
+        logger.info(
+            f"Agent {agent_id}: {result['status']} after {result['steps']} steps."
+        )
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run, i, spec): i for i, spec in enumerate(specs)}
+            results = [None] * len(specs)
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    finally:
+        loopgpt.utils.spinner.SPINNER_ENABLED = spinner_enabled
+        if results_file:
+            results_file.close()
+    return results
@@ -1,4 +1,9 @@
 from loopgpt.agent import Agent
+from loopgpt.models import OpenAIModel
+from loopgpt.loops.batch import load_specs, run_batch
+from loopgpt.utils.openai_client import configure_pool
+
+from collections import Counter
 
 import argparse
 import json
@@ -9,10 +14,16 @@ def main():
 
     parser.add_argument(
         "action",
-        choices=["run"],
-        help="Action to perform. If no file is specified, a new agent is created.",
+        choices=["run", "batch"],
+        help="Action to perform. `run`: chat with an agent. If no file is specified, a new agent is created. "
+        "`batch`: run the agents described in a JSON lines file in continuous mode.",
+    )
+    parser.add_argument(
+        "filename",
+        nargs="?",
+        help="Agent state JSON, or goals JSONL for `batch`.",
+        default=None,
     )
-    parser.add_argument("filename", nargs="?", help="Agent state JSON.", default=None)
     parser.add_argument(
         "--model", help="Model to use, uses gpt-3.5-turbo by default.", default=None
     )
@@ -36,8 +47,33 @@ def main():
         action="store_true",
     )
 
+    batch = parser.add_argument_group("batch options")
+    batch.add_argument(
+        "--workers", type=int, default=8, help="Agents run at the same time."
+    )
+    batch.add_argument(
+        "--max-steps", type=int, default=30, help="Maximum steps per agent."
+    )
+    batch.add_argument(
+        "--time-budget", type=float, help="Maximum run time per agent in seconds."
+    )
+    batch.add_argument(
+        "--checkpoint-dir", help="Directory to save each agent to after every step."
+    )
+    batch.add_argument(
+        "--results", default="results.jsonl", help="JSON lines file for results."
+    )
+    batch.add_argument(
+        "--resume", action="store_true", help="Continue agents from checkpoints."
+    )
+    batch.add_argument("--rpm", type=float, help="Requests per minute limit.")
+    batch.add_argument("--tpm", type=float, help="Tokens per minute limit.")
+
     args = parser.parse_args()
 
+    if args.action == "batch":
+        return batch_main(args)
+
     filename = args.filename
 
     if filename is not None:
@@ -64,3 +100,33 @@ def main():
             if args.save:
                 with open(args.save, "w") as f:
                     json.dump(agent.config(), f)
+
+
+def batch_main(args):
+    if args.filename is None:
+        raise SystemExit("Please specify a goals JSONL file.")
+    specs = load_specs(args.filename)
+    # Let every agent keep a connection open.
+    configure_pool(max_connections=max(100, 2 * args.workers))
+    if args.rpm or args.tpm:
+        models = {
+            spec.get("model", args.model)
+            for spec in specs
+            if not isinstance(spec.get("model"), dict)
+        }
+        for model in models:
+            OpenAIModel(model or "gpt-3.5-turbo").rate_limiter.set_limits(
+                args.rpm, args.tpm
+            )
+    results = run_batch(
+        specs,
+        workers=args.workers,
+        model=args.model,
+        max_steps=args.max_steps,
+        time_budget=args.time_budget,
+        checkpoint_dir=args.checkpoint_dir,
+        results_path=args.results,
+        resume=args.resume,
+    )
+    statuses = Counter(result["status"] for result in results)
+    print(json.dumps(dict(statuses)))
@@ -83,6 +83,17 @@ def write_divider(big=False, default_columns=80):
     print(char * columns)
 
 
+def print_stream(stream):
+    """Prints the raw response of the agent as it is generated, then returns the processed response."""
+    print(Style.DIM, end="", flush=True)
+    try:
+        for text in stream:
+            print(text, end="", flush=True)
+    finally:
+        print(Style.RESET_ALL + "\n")
+    return stream.response
+
+
 def check_agent_config(agent):
     if agent.name is None or agent.name == DEFAULT_AGENT_NAME:
         name = prompt("loopgpt", "Enter the name of your AI agent: ")
@@ -113,7 +124,7 @@ def cli(agent, continuous=False):
     if res == -1:
         return
     write_divider(big=True)
-    resp = agent.chat()
+    resp = print_stream(agent.chat(stream=True))
     n = 1
     while True:
         if isinstance(resp, str):
@@ -138,48 +149,53 @@ def cli(agent, continuous=False):
                     msgs["speak"] = "(voice) " + thoughts["speak"]
                 for kind, msg in msgs.items():
                     print_line(kind, msg, end="\n\n")
-            if "command" in resp:
-                command = resp["command"]
-                if isinstance(command, dict) and "name" in command:
+            commands = resp.get("commands")
+            if not isinstance(commands, list):
+                commands = [resp.get("command")]
+            commands = [c for c in commands if isinstance(c, dict) and "name" in c]
+            if commands:
+                for command in commands:
                     if command["name"]:
                         print_line(
                             "command",
                             f"{command['name']}, Args: {command.get('args') or {}}",
                             end="\n\n",
                         )
-                    while True:
-                        if continuous or n > 1:
-                            yn = "y"
-                            n -= 1
-                        else:
-                            inp = input(
-                                f"Execute? (Y/N/Y:n to execute n steps continuously): "
-                            )
-                            yn, n = inp.split(":") if ":" in inp else (inp, 1)
-                            n = int(n)
-                            yn = yn.lower().strip()
-                            if yn == "exit":
-                                return
-                        if yn in ("y", "n"):
-                            break
-                    if yn == "y":
-                        cmd = agent.staging_tool.get("name", agent.staging_tool)
-                        if cmd == "task_complete":
-                            return
-                        print_line("system", f"Executing command: {cmd}")
-                        resp = agent.chat(run_tool=True)
-                        print_line("system", f"{cmd} output: {agent.tool_response}")
-                    elif yn == "n":
-                        feedback = input(
-                            "Enter feedback (Why not execute the command?): "
+                while True:
+                    if continuous or n > 1:
+                        yn = "y"
+                        n -= 1
+                    else:
+                        inp = input(
+                            f"Execute? (Y/N/Y:n to execute n steps continuously): "
                         )
-                        if feedback.lower().strip() == "exit":
+                        yn, n = inp.split(":") if ":" in inp else (inp, 1)
+                        n = int(n)
+                        yn = yn.lower().strip()
+                        if yn == "exit":
                             return
-                        resp = agent.chat(feedback, False)
-                    write_divider()
-                    continue
+                    if yn in ("y", "n"):
+                        break
+                if yn == "y":
+                    names = agent.staging_tool_names()
+                    if names == ["task_complete"]:
+                        return
+                    cmd = ", ".join(map(str, names))
+                    print_line("system", f"Executing command: {cmd}")
+                    stream = agent.chat(run_tool=True, stream=True)
+                    print_line("system", f"{cmd} output: {agent.tool_response}")
+                    resp = print_stream(stream)
+                    if "task_complete" in names:
+                        return
+                elif yn == "n":
+                    feedback = input("Enter feedback (Why not execute the command?): ")
+                    if feedback.lower().strip() == "exit":
+                        return
+                    resp = print_stream(agent.chat(feedback, False, stream=True))
+                write_divider()
+                continue
         write_divider()
         inp = input(INPUT_PROMPT)
         if inp.lower().strip() == "exit":
             return
-        resp = agent.chat(inp)
+        resp = print_stream(agent.chat(inp, stream=True))
@@ -18,6 +18,11 @@ if "last_response" not in st.session_state:
 if "wait_for_yn" not in st.session_state:
     st.session_state["wait_for_yn"] = False
 
+# Arguments of the agent.chat() call to make on this run. Input callbacks run before the page is drawn, so the call
+# is made from the page itself, where its response can be streamed below the history.
+if "pending_chat" not in st.session_state:
+    st.session_state["pending_chat"] = None
+
 
 def process_response(resp, voice_only=True):
     if resp:
@@ -53,8 +58,6 @@ def process_response(resp, voice_only=True):
 
 def submit():
     inp = st.session_state.input
-    agent = st.session_state.agent
-    resp = ""
     if inp:
         if st.session_state.wait_for_yn:
             yn = inp.lower().strip()
@@ -62,24 +65,44 @@ def submit():
                 st.session_state.history.append(("user", yn))
                 st.session_state.wait_for_yn = False
                 if yn == "y":
-                    resp = agent.chat(PROCEED_INPUT, True)
+                    st.session_state.pending_chat = (PROCEED_INPUT, True)
                 elif yn == "n":
                     feedback = "Enter feedback (Why not execute the command?): "
                     st.session_state.history.append(("loopGPT", feedback))
         else:
-            resp = agent.chat(inp, run_tool=False)
+            st.session_state.pending_chat = (inp, False)
             st.session_state.history.append(("user", inp))
 
         st.session_state.last_user_input = inp
         st.session_state.input = ""
-        process_response(resp)
+
+
+def run_pending_chat():
+    """Makes the pending agent.chat() call, showing the raw response as it is generated."""
+    if st.session_state.pending_chat is None:
+        return
+    message, run_tool = st.session_state.pending_chat
+    st.session_state.pending_chat = None
+    placeholder = st.empty()
+    stream = st.session_state.agent.chat(message, run_tool, stream=True)
+    text = ""
+    for chunk in stream:
+        text += chunk
+        placeholder.code(text, language="json")
+    placeholder.empty()
+    st.session_state.last_response = stream.response
+    process_response(stream.response)
 
 
 if __name__ == "__main__":
     st.title("LoopGPT")
 
-    if st.session_state.history:
-        for i, msg in enumerate(st.session_state.history):
-            message(msg[1], is_user=msg[0] == "user", key=str(i))
+    shown = len(st.session_state.history)
+    for i, msg in enumerate(st.session_state.history):
+        message(msg[1], is_user=msg[0] == "user", key=str(i))
+
+    run_pending_chat()
+    for i, msg in enumerate(st.session_state.history[shown:], shown):
+        message(msg[1], is_user=msg[0] == "user", key=str(i))
 
     st.text_input("Chat with LoopGPT", key="input", on_change=submit)
@@ -1,16 +1,62 @@
 from typing import *
+from functools import partial
+
+import asyncio
+
+
+def _search_kwargs(
+    min_score: Optional[float] = None, mmr_lambda: Optional[float] = None
+) -> Dict[str, float]:
+    # Only the options that are set, so that memories whose get() predates them keep working.
+    kwargs = {}
+    if min_score is not None:
+        kwargs["min_score"] = min_score
+    if mmr_lambda is not None:
+        kwargs["mmr_lambda"] = mmr_lambda
+    return kwargs
 
 
 class BaseMemory:
     def add(doc: str, key: Optional[str] = None):
         raise NotImplementedError()
 
-    def get(query: str, k: int) -> List[str]:
+    def add_many(self, docs: List[str], keys: Optional[List[str]] = None):
+        keys = keys or [None] * len(docs)
+        for doc, key in zip(docs, keys):
+            self.add(doc, key)
+
+    def get(
+        self,
+        query: str,
+        k: int,
+        min_score: Optional[float] = None,
+        mmr_lambda: Optional[float] = None,
+    ) -> List[str]:
         raise NotImplementedError()
 
+    async def aget(
+        self,
+        query: str,
+        k: int,
+        min_score: Optional[float] = None,
+        mmr_lambda: Optional[float] = None,
+    ) -> List[str]:
+        """Asynchronous version of :meth:`get`. Memories without a native async implementation run :meth:`get`
+        in the event loop's default thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        kwargs = _search_kwargs(min_score, mmr_lambda)
+        return await loop.run_in_executor(None, partial(self.get, query, k, **kwargs))
+
     def config(self):
         return {"class": self.__class__.__name__, "type": "memory"}
 
+    def save(self, path: str):
+        """Writes the memory contents to the directory ``path`` in a binary format and returns a config that
+        references it. Memories that do not support this return their regular config.
+        """
+        return self.config()
+
     @classmethod
     def from_config(cls, config):
         raise cls()
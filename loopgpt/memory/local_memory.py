@@ -1,61 +1,300 @@
 from loopgpt.memory.base_memory import BaseMemory
 from loopgpt.embeddings import from_config as embedding_provider_from_config
+from collections.abc import Sequence
+from functools import partial
 import numpy as np
+import asyncio
+import threading
+import mmap
+import os
 from typing import *
 
 
+def _normalize(embs: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embs, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return embs / norms
+
+
+def _atomic_write(path: str, write: Callable):
+    # Write to a temporary file first, so that a memory map of the old file stays valid.
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class MappedDocs(Sequence):
+    """Read only sequence of documents backed by a memory mapped blob of utf-8 strings and an array of offsets."""
+
+    def __init__(self, blob_path: str, offsets_path: str):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        if self.offsets[-1]:
+            with open(blob_path, "rb") as f:
+                self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.blob = b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("document index out of range")
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].decode("utf-8")
+
+
+def _mmr(query_scores: np.ndarray, embs: np.ndarray, k: int, mmr_lambda: float):
+    # Greedily picks the candidate that is most similar to the query and least similar to the ones already picked.
+    sims = embs.dot(embs.T)
+    max_sims = np.full(len(query_scores), -np.inf, dtype=np.float32)
+    available = np.ones(len(query_scores), dtype=bool)
+    selected = []
+    for _ in range(k):
+        redundancy = np.where(np.isinf(max_sims), 0, max_sims)
+        mmr = mmr_lambda * query_scores - (1 - mmr_lambda) * redundancy
+        mmr[~available] = -np.inf
+        i = int(np.argmax(mmr))
+        selected.append(i)
+        available[i] = False
+        max_sims = np.maximum(max_sims, sims[i])
+    return selected
+
+
 class LocalMemory(BaseMemory):
-    def __init__(self, embedding_provider: callable):
+    """In-process vector memory. Embeddings are L2 normalized and kept in a preallocated float32 buffer
+    that doubles in capacity when full, so adding a document is amortized O(1) and a query is a single
+    matrix-vector product.
+
+    :param embedding_provider: Embedding provider used for documents and queries.
+    :type embedding_provider: :class:`~loopgpt.embeddings.base.BaseEmbeddingProvider`
+    :param min_score: Documents with a cosine similarity to the query below this are never returned by :meth:`get`.
+        Defaults to ``None`` (no cutoff).
+    :type min_score: float, optional
+    :param mmr_lambda: If specified, :meth:`get` re-ranks results with maximal marginal relevance, trading relevance
+        (1.0) against diversity (0.0), so that near duplicate documents do not crowd out others. Defaults to ``None``.
+    :type mmr_lambda: float, optional
+    """
+
+    initial_capacity = 64
+
+    def __init__(
+        self,
+        embedding_provider: callable,
+        min_score: Optional[float] = None,
+        mmr_lambda: Optional[float] = None,
+    ):
         super(BaseMemory, self).__init__()
         self.docs: List[str] = []
-        self.embs: Optional[np.ndarray] = None
+        self._embs: Optional[np.ndarray] = None
         self.embedding_provider = embedding_provider
+        self.min_score = min_score
+        self.mmr_lambda = mmr_lambda
+        # Tools run concurrently may add documents at the same time.
+        self._lock = threading.Lock()
 
     def __len__(self):
         return len(self.docs)
 
+    @property
+    def embs(self) -> Optional[np.ndarray]:
+        if self._embs is None:
+            return None
+        return self._embs[: len(self.docs)]
+
+    @embs.setter
+    def embs(self, embs: Optional[np.ndarray]):
+        if embs is None:
+            self._embs = None
+        else:
+            self._embs = _normalize(np.asarray(embs, dtype=np.float32))
+
+    def _reserve(self, n: int, dim: int):
+        if self._embs is None:
+            capacity = max(self.initial_capacity, n)
+            self._embs = np.zeros((capacity, dim), dtype=np.float32)
+        elif n > self._embs.shape[0]:
+            capacity = max(2 * self._embs.shape[0], n)
+            embs = np.zeros((capacity, dim), dtype=np.float32)
+            embs[: len(self.docs)] = self._embs[: len(self.docs)]
+            self._embs = embs
+
+    def _writable_docs(self) -> List[str]:
+        if not isinstance(self.docs, list):
+            self.docs = list(self.docs)
+        return self.docs
+
     def add(self, doc: str, key: Optional[str] = None):
         if not key:
             key = doc
-        emb = self.embedding_provider(key)
-        if self.embs is None:
-            self.embs = np.expand_dims(emb, 0)
+        emb = np.asarray(self.embedding_provider(key), dtype=np.float32)
+        with self._lock:
+            n = len(self.docs)
+            self._reserve(n + 1, emb.shape[-1])
+            self._embs[n] = _normalize(emb)
+            self._writable_docs().append(doc)
+
+    def add_many(self, docs: List[str], keys: Optional[List[str]] = None):
+        """Adds several documents, embedding them with a single batched call to the embedding provider."""
+        if not docs:
+            return
+        if keys is None:
+            keys = docs
+        keys = [key or doc for doc, key in zip(docs, keys)]
+        get_batch = getattr(self.embedding_provider, "get_batch", None)
+        if get_batch:
+            embs = get_batch(keys)
         else:
-            self.embs = np.concatenate([self.embs, [emb]], 0)
-        self.docs.append(doc)
+            embs = np.stack([self.embedding_provider(key) for key in keys])
+        embs = np.asarray(embs, dtype=np.float32)
+        with self._lock:
+            n = len(self.docs)
+            self._reserve(n + len(docs), embs.shape[-1])
+            self._embs[n : n + len(docs)] = _normalize(embs)
+            self._writable_docs().extend(docs)
+
+    def get(
+        self,
+        query: str,
+        k: int,
+        min_score: Optional[float] = None,
+        mmr_lambda: Optional[float] = None,
+    ):
+        """Returns up to ``k`` documents most similar to ``query``, most similar first.
+
+        :param query: The query text.
+        :type query: str
+        :param k: Maximum number of documents to return.
+        :type k: int
+        :param min_score: Overrides :attr:`min_score` for this query.
+        :type min_score: float, optional
+        :param mmr_lambda: Overrides :attr:`mmr_lambda` for this query.
+        :type mmr_lambda: float, optional
+        """
+        if not self.docs:
+            return []
+        return self._search(self.embedding_provider(query), k, min_score, mmr_lambda)
 
-    def get(self, query: str, k: int):
-        if self.embs is None:
+    async def aget(
+        self,
+        query: str,
+        k: int,
+        min_score: Optional[float] = None,
+        mmr_lambda: Optional[float] = None,
+    ):
+        """Asynchronous version of :meth:`get`. Only the query embedding is awaited, the search itself is fast."""
+        if not self.docs:
             return []
-        emb = self.embedding_provider(query)
+        aget = getattr(self.embedding_provider, "aget", None)
+        if aget:
+            emb = await aget(query)
+        else:
+            loop = asyncio.get_running_loop()
+            emb = await loop.run_in_executor(
+                None, partial(self.embedding_provider, query)
+            )
+        return self._search(emb, k, min_score, mmr_lambda)
+
+    def _search(self, emb, k, min_score, mmr_lambda):
+        if min_score is None:
+            min_score = self.min_score
+        if mmr_lambda is None:
+            mmr_lambda = self.mmr_lambda
+        emb = _normalize(np.asarray(emb, dtype=np.float32))
         scores = self.embs.dot(emb)
-        idxs = np.argsort(scores)[-k:][::-1]
-        return [self.docs[i] for i in idxs]
+        # MMR picks from a larger pool of candidates.
+        n = min(k if mmr_lambda is None else max(4 * k, 20), len(scores))
+        if k <= 0 or n <= 0:
+            return []
+        if n < len(scores):
+            idxs = np.argpartition(-scores, n - 1)[:n]
+        else:
+            idxs = np.arange(len(scores))
+        idxs = idxs[np.argsort(-scores[idxs], kind="stable")]
+        if min_score is not None:
+            idxs = idxs[scores[idxs] >= min_score]
+        if mmr_lambda is not None and len(idxs) > 1:
+            selected = _mmr(
+                scores[idxs], self.embs[idxs], min(k, len(idxs)), mmr_lambda
+            )
+            idxs = idxs[selected]
+        return [self.docs[i] for i in idxs[:k]]
 
     def _serialize_embs(self):
-        if self.embs is None:
+        embs = self.embs
+        if embs is None:
             return None
         return {
-            "dtype": self.embs.dtype.name,
-            "data": self.embs.tolist(),
-            "shape": self.embs.shape,
+            "dtype": embs.dtype.name,
+            "data": embs.tolist(),
+            "shape": embs.shape,
         }
 
     def config(self):
         cfg = super().config()
         cfg.update(
             {
-                "docs": self.docs,
+                "docs": list(self.docs),
                 "embs": self._serialize_embs(),
                 "embedding_provider": self.embedding_provider.config(),
+                "min_score": self.min_score,
+                "mmr_lambda": self.mmr_lambda,
+            }
+        )
+        return cfg
+
+    def save(self, path: str):
+        """Writes the embeddings to ``embs.npy`` and the documents to ``docs.bin`` (with offsets in ``docs_offsets.npy``)
+        inside the directory ``path``, and returns a config that references them instead of inlining them.
+        Memories loaded from such a config memory-map the files lazily. The config holds the absolute path of the
+        directory, so that it can be loaded from any working directory.
+        """
+        path = os.path.abspath(path)
+        os.makedirs(path, exist_ok=True)
+        docs = [doc.encode("utf-8") for doc in self.docs]
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum([len(doc) for doc in docs], out=offsets[1:])
+        embs = self.embs
+        if embs is None:
+            embs = np.zeros((0, 0), dtype=np.float32)
+        _atomic_write(os.path.join(path, "embs.npy"), lambda f: np.save(f, embs))
+        _atomic_write(
+            os.path.join(path, "docs_offsets.npy"), lambda f: np.save(f, offsets)
+        )
+        _atomic_write(os.path.join(path, "docs.bin"), lambda f: f.writelines(docs))
+        cfg = BaseMemory.config(self)
+        cfg.update(
+            {
+                "path": path,
+                "embedding_provider": self.embedding_provider.config(),
+                "min_score": self.min_score,
+                "mmr_lambda": self.mmr_lambda,
             }
         )
         return cfg
 
+    @classmethod
+    def _load(cls, obj, path):
+        obj.docs = MappedDocs(
+            os.path.join(path, "docs.bin"), os.path.join(path, "docs_offsets.npy")
+        )
+        if len(obj.docs):
+            # Saved embeddings are already normalized. Copy-on-write map: the file is only
+            # read when queried, and only copied into memory when new documents are added.
+            obj._embs = np.load(os.path.join(path, "embs.npy"), mmap_mode="c")
+        return obj
+
     @classmethod
     def from_config(cls, config):
         provider = embedding_provider_from_config(config["embedding_provider"])
-        obj = cls(provider)
+        obj = cls(provider, config.get("min_score"), config.get("mmr_lambda"))
+        if config.get("path"):
+            return cls._load(obj, config["path"])
         obj.docs = config["docs"]
         embs = config["embs"]
         if embs is not None:
@@ -65,5 +304,5 @@ class LocalMemory(BaseMemory):
         return obj
 
     def clear(self):
-        self.docs.clear()
-        self.embs = None
+        self.docs = []
+        self._embs = None
@@ -5,6 +5,7 @@ from loopgpt.models.azure_openai import AzureOpenAIModel
 from loopgpt.models.base import BaseModel
 from loopgpt.models.hf import HuggingFaceModel
 from loopgpt.models.llama_ import LLamaModel
+from loopgpt.models.cached import CachedModel
 
 
 user_providers = {}
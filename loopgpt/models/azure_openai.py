@@ -1,11 +1,8 @@
-from typing import List, Dict, Optional
+from typing import Any, Dict, Optional
 from loopgpt.models.openai_ import OpenAIModel
 from loopgpt.utils.openai_key import get_openai_key
-from loopgpt.logger import logger
-import time
-
-from openai import RateLimitError
-from openai import AzureOpenAI
+from loopgpt.utils.openai_client import get_client, get_async_client
+from loopgpt.utils.rate_limiter import RateLimiter, get_rate_limiter
 import requests
 
 
@@ -81,35 +78,20 @@ class AzureOpenAIModel(OpenAIModel):
             azure_endpoint, self.model_id, api_version, api_key
         )
 
-        self.client = AzureOpenAI(
-            api_key=self.api_key, api_version=api_version, azure_endpoint=azure_endpoint
-        )
+    def _shared_client(self):
+        return get_client(self.api_key, self.azure_endpoint, self.api_version)
 
-    def chat(
-        self,
-        messages: List[Dict[str, str]],
-        max_tokens: Optional[int] = None,
-        temperature: float = 0.8,
-    ) -> str:
-        num_retries = 3
-        for _ in range(num_retries):
-            try:
-                resp = (
-                    self.client.chat.completions.create(
-                        model=self.model_id,
-                        messages=messages,
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                    )
-                    .choices[0]
-                    .message.content
-                )
-                return resp
-
-            except RateLimitError:
-                logger.warn("Rate limit exceeded. Retrying after 20 seconds.")
-                time.sleep(20)
-                continue
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return get_rate_limiter((self.azure_endpoint, self.api_key, self.model_id))
+
+    def _create_kwargs(self, messages, max_tokens, temperature) -> Dict[str, Any]:
+        kwargs = super()._create_kwargs(messages, max_tokens, temperature)
+        kwargs["model"] = self.model_id
+        return kwargs
+
+    def _get_async_client(self):
+        return get_async_client(self.api_key, self.azure_endpoint, self.api_version)
 
     def config(self):
         cfg = super().config()
@@ -1,9 +1,18 @@
-from typing import Dict, List, Optional, Tuple, Any, Generic, TypeVar
+from typing import Dict, Iterator, List, Optional, Tuple, Any, Generic, TypeVar
+from loopgpt.utils.lru import LRUCache
+from functools import partial
+
+import asyncio
+import hashlib
 
 
 class BaseModel:
     """Base class for all models."""
 
+    token_count_cache_size = 4096
+    # True if chat_batch generates for several dialogs in one pass instead of one by one.
+    native_batching = False
+
     def chat(
         self,
         messages: List[Dict[str, str]],
@@ -12,9 +21,73 @@ class BaseModel:
     ) -> str:
         raise NotImplementedError()
 
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> Iterator[str]:
+        """Same as :meth:`chat`, but yields the completion in pieces as soon as they are generated.
+        Models that cannot stream yield the whole completion at once.
+        """
+        yield self.chat(messages, max_tokens=max_tokens, temperature=temperature)
+
+    def chat_batch(
+        self,
+        messages_list: List[List[Dict[str, str]]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> List[str]:
+        """Returns a completion for each list of messages in ``messages_list``, in order.
+        Local models override this to generate for all dialogs in padded batches; other models chat one dialog at a time.
+        """
+        return [
+            self.chat(messages, max_tokens=max_tokens, temperature=temperature)
+            for messages in messages_list
+        ]
+
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> str:
+        """Asynchronous version of :meth:`chat`. Models without a native async implementation run :meth:`chat`
+        in the event loop's default thread pool, so that independent requests can still overlap.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            partial(
+                self.chat, messages, max_tokens=max_tokens, temperature=temperature
+            ),
+        )
+
     def count_tokens(self, messages: List[Dict[str, str]]) -> int:
         raise NotImplementedError()
 
+    def count_message_tokens(self, message: Dict[str, str]) -> int:
+        """Returns the number of tokens used by a single message. Results are memoized in a
+        per model LRU cache keyed by the message role and a hash of its content, so that
+        counting the same header, memory and history messages again is a dictionary lookup.
+        """
+        cache = getattr(self, "_token_count_cache", None)
+        if cache is None:
+            cache = self._token_count_cache = LRUCache(self.token_count_cache_size)
+        key = (
+            message.get("role"),
+            message.get("name"),
+            hashlib.sha256(message.get("content", "").encode("utf-8")).digest(),
+        )
+        num_tokens = cache.get(key)
+        if num_tokens is None:
+            num_tokens = self._count_message_tokens(message)
+            cache.put(key, num_tokens)
+        return num_tokens
+
+    def _count_message_tokens(self, message: Dict[str, str]) -> int:
+        raise NotImplementedError()
+
     def get_token_limit(self):
         raise NotImplementedError()
 
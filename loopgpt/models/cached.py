@@ -0,0 +1,244 @@
+from typing import Dict, Iterator, List, Optional
+from loopgpt.models.base import BaseModel
+from loopgpt.utils.lru import LRUCache
+
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+
+class CachedModel(BaseModel):
+    """Wraps a model with a response cache, so that repeated identical requests are answered locally.
+
+    Responses are keyed by a hash of the wrapped model's class and configuration (excluding API keys), the messages,
+    ``max_tokens`` and ``temperature``. Lookups go to an in-memory LRU cache first and then, if ``path`` is given,
+    to a SQLite database that persists across runs. Only deterministic (``temperature=0``) requests are cached by default.
+
+    :param model: The model to wrap.
+    :type model: :class:`~loopgpt.models.base.BaseModel`
+    :param path: Path to a SQLite database for persisting responses. Responses are kept in memory only if not specified.
+        Use ``"~/.cache/loopgpt/responses.sqlite"`` to share responses across projects.
+    :type path: str, optional
+    :param memory_size: Maximum number of responses in the in-memory cache. Defaults to 1024.
+    :type memory_size: int, optional
+    :param max_entries: Maximum number of responses in the SQLite database. The least recently used are evicted. Defaults to 100000.
+    :type max_entries: int, optional
+    :param cache_all_temperatures: Cache requests with a non zero temperature too. Defaults to False.
+    :type cache_all_temperatures: bool, optional
+
+    Example:
+
+    .. code-block:: python
+
+        from loopgpt.models import OpenAIModel, CachedModel
+
+        model = CachedModel(OpenAIModel("gpt-3.5-turbo"), path="responses.sqlite")
+        agent = loopgpt.Agent(model=model)
+        ...
+        print(model.hits, model.misses)
+    """
+
+    def __init__(
+        self,
+        model: BaseModel,
+        path: Optional[str] = None,
+        memory_size: int = 1024,
+        max_entries: int = 100000,
+        cache_all_temperatures: bool = False,
+    ):
+        self.model = model
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.cache_all_temperatures = cache_all_temperatures
+        self.hits = 0
+        self.misses = 0
+        self._memory = LRUCache(memory_size)
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            path = os.path.expanduser(path)
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT, last_used REAL)"
+                )
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+                )
+        model_config = {k: v for k, v in model.config().items() if k != "api_key"}
+        self._namespace = json.dumps(model_config, sort_keys=True, default=str)
+
+    def _key(self, messages, max_tokens, temperature) -> Optional[str]:
+        if temperature != 0 and not self.cache_all_temperatures:
+            return None
+        request = json.dumps(
+            [self._namespace, messages, max_tokens, temperature],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        resp = self._memory.get(key)
+        if resp is None and self._conn is not None:
+            with self._lock, self._conn:
+                row = self._conn.execute(
+                    "SELECT response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE responses SET last_used = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+            if row:
+                resp = row[0]
+                self._memory.put(key, resp)
+        if resp is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return resp
+
+    def _store(self, key: Optional[str], resp: str):
+        if key is None or resp is None:
+            return
+        self._memory.put(key, resp)
+        if self._conn is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (key, resp, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> str:
+        key = self._key(messages, max_tokens, temperature)
+        resp = self._lookup(key)
+        if resp is None:
+            resp = self.model.chat(
+                messages, max_tokens=max_tokens, temperature=temperature
+            )
+            self._store(key, resp)
+        return resp
+
+    @property
+    def native_batching(self):
+        return self.model.native_batching
+
+    def chat_batch(
+        self,
+        messages_list: List[List[Dict[str, str]]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> List[str]:
+        keys = [self._key(msgs, max_tokens, temperature) for msgs in messages_list]
+        resps = [self._lookup(key) for key in keys]
+        missing = [i for i, resp in enumerate(resps) if resp is None]
+        if missing:
+            new = self.model.chat_batch(
+                [messages_list[i] for i in missing],
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+            for i, resp in zip(missing, new):
+                resps[i] = resp
+                self._store(keys[i], resp)
+        return resps
+
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> Iterator[str]:
+        key = self._key(messages, max_tokens, temperature)
+        resp = self._lookup(key)
+        if resp is not None:
+            yield resp
+            return
+        chunks = []
+        for chunk in self.model.stream_chat(
+            messages, max_tokens=max_tokens, temperature=temperature
+        ):
+            chunks.append(chunk)
+            yield chunk
+        self._store(key, "".join(chunks))
+
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> str:
+        key = self._key(messages, max_tokens, temperature)
+        resp = self._lookup(key)
+        if resp is None:
+            resp = await self.model.achat(
+                messages, max_tokens=max_tokens, temperature=temperature
+            )
+            self._store(key, resp)
+        return resp
+
+    def count_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return self.model.count_tokens(messages)
+
+    def count_message_tokens(self, message: Dict[str, str]) -> int:
+        return self.model.count_message_tokens(message)
+
+    def get_token_limit(self) -> int:
+        return self.model.get_token_limit()
+
+    def clear(self):
+        """Removes all cached responses and resets the hit and miss counters."""
+        self._memory.clear()
+        if self._conn is not None:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM responses")
+        self.hits = 0
+        self.misses = 0
+
+    def config(self):
+        cfg = super().config()
+        cfg.update(
+            {
+                "model": self.model.config(),
+                "path": self.path,
+                "memory_size": self.memory_size,
+                "max_entries": self.max_entries,
+                "cache_all_temperatures": self.cache_all_temperatures,
+            }
+        )
+        return cfg
+
+    @classmethod
+    def from_config(cls, config):
+        from loopgpt.models import from_config as model_from_config
+
+        return cls(
+            model_from_config(config["model"]),
+            config.get("path"),
+            config.get("memory_size", 1024),
+            config.get("max_entries", 100000),
+            config.get("cache_all_temperatures", False),
+        )
@@ -1,28 +1,57 @@
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
+from functools import partial
+from threading import Lock, Thread
 from loopgpt.models.base import BaseModel
 from loopgpt.models.llama_ import LLamaModel
+from loopgpt.models.tokenizers import get_hf_tokenizer
 
 try:
+    import torch
     from transformers import StoppingCriteria
 
     class StopOnTokens(StoppingCriteria):
-        def __call__(self, input_ids, scores, **kwargs) -> bool:
-            stop_ids = [50278, 50279, 50277, 1, 0]
-            for stop_id in stop_ids:
-                if input_ids[0][-1] == stop_id:
-                    return True
-            return False
+        def __call__(self, input_ids, scores, **kwargs):
+            # One flag per sequence, so that finished dialogs of a batch stop independently.
+            stop_ids = torch.tensor(
+                [50278, 50279, 50277, 1, 0], device=input_ids.device
+            )
+            return torch.isin(input_ids[:, -1], stop_ids)
 
 except ImportError:
     pass
 
 
+def _common_prefix_length(a, b) -> int:
+    n = min(len(a), len(b))
+    mismatches = (a[:n] != b[:n]).nonzero()
+    return int(mismatches[0]) if len(mismatches) else n
+
+
 class HuggingFaceModel(BaseModel):
+    """Runs a causal language model from the Hugging Face hub with ``transformers``.
+
+    :param model: Model name or path. Defaults to ``"stabilityai/stablelm-tuned-alpha-7b"``.
+    :type model: str, optional
+    :param load_in_8bit: Load the weights in 8 bit. Defaults to False.
+    :type load_in_8bit: bool, optional
+    :param model_max_length: Context size in tokens. Defaults to 1024.
+    :type model_max_length: int, optional
+    :param prefix_cache: Keep the attention key/value cache of the previous call and only run the model on the part
+        of the new prompt that differs from it. Consecutive agent turns share a long prefix (the header with tools,
+        goals and constraints), so this cuts time to first token. Defaults to True.
+    :type prefix_cache: bool, optional
+    """
+
+    native_batching = True
+    # Number of tokens assumed around each message when the tokenizer has no usable chat template.
+    tokens_per_message = 4
+
     def __init__(
         self,
         model="stabilityai/stablelm-tuned-alpha-7b",
         load_in_8bit=False,
         model_max_length=1024,
+        prefix_cache=True,
     ):
         import torch
 
@@ -41,9 +70,11 @@ class HuggingFaceModel(BaseModel):
         self.model_name = model
         self.load_in_8bit = load_in_8bit
         self.model_max_length = model_max_length
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            model, model_max_length=model_max_length
-        )
+        self.prefix_cache = prefix_cache
+        self._cache = None
+        self._cache_ids = None
+        self._cache_lock = Lock()
+        self.tokenizer = get_hf_tokenizer(model, model_max_length=model_max_length)
         self.model = AutoModelForCausalLM.from_pretrained(
             model,
             torch_dtype=torch.float16,
@@ -54,18 +85,27 @@ class HuggingFaceModel(BaseModel):
         # self.model.to(torch.device("cuda"))
         self.stopping_criteria = StoppingCriteriaList([StopOnTokens()])
 
-    def chat(
+    def _generate_kwargs(
         self,
-        messages: List[Dict[str, str]],
-        max_tokens: Optional[int] = None,
-        temperature: float = 0.7,
-    ) -> str:
-        for msg in messages:
-            print(msg)
-        prompt = self.encode_messages(messages)
-        encoding = self.tokenizer(
-            prompt, return_tensors="pt", return_token_type_ids=False
-        )
+        messages: Union[List[Dict[str, str]], List[List[Dict[str, str]]]],
+        max_tokens: Optional[int],
+        temperature: float,
+    ):
+        if messages and isinstance(messages[0], list):
+            # Batch of dialogs, left padded so that generation continues right after every prompt.
+            prompt = [self.encode_messages(dialog) for dialog in messages]
+            encoding = self.tokenizer(
+                prompt,
+                return_tensors="pt",
+                return_token_type_ids=False,
+                padding=True,
+                padding_side="left",
+            )
+        else:
+            prompt = self.encode_messages(messages)
+            encoding = self.tokenizer(
+                prompt, return_tensors="pt", return_token_type_ids=False
+            )
         encoding.to(self.model.device)
 
         # Sampling args
@@ -73,7 +113,7 @@ class HuggingFaceModel(BaseModel):
         top_p = 0.9
         do_sample = True
 
-        tokens = self.model.generate(
+        return dict(
             **encoding,
             max_new_tokens=max_tokens,
             temperature=temperature,
@@ -84,19 +124,149 @@ class HuggingFaceModel(BaseModel):
             stopping_criteria=self.stopping_criteria,
         )
 
-        completion_tokens = tokens[0][encoding["input_ids"].size(1) :]
+    def _generate(self, **kwargs):
+        if not self.prefix_cache:
+            return self.model.generate(**kwargs)
+        from transformers import DynamicCache
+
+        with self._cache_lock:
+            input_ids = kwargs["input_ids"][0]
+            if self._cache is not None:
+                # At least the last prompt token has to go through the model to get the next token's logits.
+                n = min(
+                    _common_prefix_length(input_ids, self._cache_ids),
+                    len(input_ids) - 1,
+                )
+                if n > 0:
+                    excess = self._cache.get_seq_length() - n
+                    if excess:
+                        self._cache.crop(-excess)
+                    kwargs["past_key_values"] = self._cache
+            self._cache = None
+            out = self.model.generate(**kwargs, return_dict_in_generate=True)
+            cache = out.past_key_values
+            if isinstance(cache, tuple):
+                cache = DynamicCache.from_legacy_cache(cache)
+            self._cache = cache
+            self._cache_ids = out.sequences[0][: cache.get_seq_length()]
+            return out.sequences
+
+    def clear_prefix_cache(self):
+        """Drops the cached keys and values of the previous call."""
+        with self._cache_lock:
+            self._cache = None
+            self._cache_ids = None
+
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+    ) -> str:
+        kwargs = self._generate_kwargs(messages, max_tokens, temperature)
+        tokens = self._generate(**kwargs)
+
+        completion_tokens = tokens[0][kwargs["input_ids"].size(1) :]
         completion = self.tokenizer.decode(completion_tokens, skip_special_tokens=True)
 
         return completion
 
+    def chat_batch(
+        self,
+        messages_list: List[List[Dict[str, str]]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+        batch_size: int = 8,
+    ) -> List[str]:
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        completions = []
+        for i in range(0, len(messages_list), batch_size):
+            kwargs = self._generate_kwargs(
+                messages_list[i : i + batch_size], max_tokens, temperature
+            )
+            # The key/value cache of a batch is not reused.
+            tokens = self.model.generate(**kwargs)
+            completions += self.tokenizer.batch_decode(
+                tokens[:, kwargs["input_ids"].size(1) :], skip_special_tokens=True
+            )
+        return completions
+
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.7,
+    ) -> Iterator[str]:
+        from transformers import TextIteratorStreamer
+
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        kwargs = self._generate_kwargs(messages, max_tokens, temperature)
+        thread = Thread(target=self._generate, kwargs=dict(kwargs, streamer=streamer))
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            thread.join()
+
     def encode_messages(self, messages: List[Dict[str, str]]) -> str:
         if self.model_name.startswith("meta-llama"):
             messages = LLamaModel._convert_to_llama_dialogs(messages)[0]
         return self.tokenizer.apply_chat_template(messages, tokenize=False)
 
     def count_tokens(self, messages: Union[List[Dict[str, str]], str]) -> int:
-        data = self.encode_messages(messages)
-        return len(self.tokenizer.encode(data))
+        if isinstance(messages, str):
+            return len(self.tokenizer.encode(messages))
+        if not messages:
+            return 0
+        prompt_tokens, _ = self._template_overhead()
+        return sum(map(self.count_message_tokens, messages)) + prompt_tokens
+
+    def _template_overhead(self):
+        """Returns the number of tokens the chat template adds once per prompt (special tokens, default system
+        prompts) and around each message, besides its role and content. A single message cannot be run through
+        templates that enforce user/assistant alternation, so both are measured once per tokenizer and template on
+        probe dialogs.
+        """
+        key = (id(self.tokenizer), getattr(self.tokenizer, "chat_template", None))
+        cached = getattr(self, "_overhead_cache", None)
+        if cached and cached[0] == key:
+            return cached[1]
+        encode = partial(self.tokenizer.encode, add_special_tokens=False)
+
+        def overhead(dialog):
+            # Tokenized the same way as the prompts in _generate_kwargs.
+            ids = self.tokenizer(self.encode_messages(dialog)).input_ids
+            return len(ids) - sum(
+                len(encode(m["role"])) + len(encode(m["content"])) for m in dialog
+            )
+
+        probe = [
+            {"role": "user", "content": "hello"},
+            {"role": "assistant", "content": "hi"},
+            {"role": "user", "content": "hello"},
+        ]
+        try:
+            one, two, three = (overhead(probe[: i + 1]) for i in range(3))
+            per_message = max(two - one, three - two, 0)
+            result = (max(one - per_message, 0), per_message)
+        except Exception:
+            result = (0, self.tokens_per_message)
+        self._overhead_cache = (key, result)
+        return result
+
+    def _count_message_tokens(self, message: Dict[str, str]) -> int:
+        encode = partial(self.tokenizer.encode, add_special_tokens=False)
+        _, per_message = self._template_overhead()
+        return (
+            len(encode(message["role"]))
+            + len(encode(message.get("content", "")))
+            + per_message
+        )
 
     def get_token_limit(self):
         return self.tokenizer.model_max_length
@@ -108,10 +278,16 @@ class HuggingFaceModel(BaseModel):
                 "model": self.model_name,
                 "load_in_8bit": self.load_in_8bit,
                 "model_max_length": self.model_max_length,
+                "prefix_cache": self.prefix_cache,
             }
         )
         return cfg
 
     @classmethod
     def from_config(cls, config):
-        return cls(**config)
+        return cls(
+            config["model"],
+            config.get("load_in_8bit", False),
+            config.get("model_max_length", 1024),
+            config.get("prefix_cache", True),
+        )
@@ -14,6 +14,8 @@ except ImportError:
 
 
 class LLamaModel(BaseModel):
+    native_batching = True
+
     def __init__(
         self,
         ckpt_dir: str,
@@ -78,76 +80,43 @@ class LLamaModel(BaseModel):
         )[0]["generation"]["content"]
         return results
 
-    def count_tokens(self, messages: List[Dict[str, str]]) -> int:
-        tokens_per_message = 1
-        tokens_per_last_message = 2
-        additional_tokens_per_system_message = 1
-        num_tokens = 0
-        n = len(messages)
-        for i, message in enumerate(messages):
-            if i == n - 1:
-                num_tokens += tokens_per_last_message
-                num_tokens += len(
-                    self.generator.tokenizer.encode(
-                        message["content"], bos=True, eos=False
-                    )
-                )
-            else:
-                num_tokens += tokens_per_message
-                num_tokens += len(
-                    self.generator.tokenizer.encode(
-                        message["content"], bos=True, eos=True
-                    )
-                )
-            if message["role"] == "system":
-                num_tokens += additional_tokens_per_system_message
-        return num_tokens
+    def chat_batch(
+        self,
+        messages_list: List[List[Dict[str, str]]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+        top_p: float = 0.9,
+    ) -> List[str]:
+        dialogs = [
+            self._convert_to_llama_dialogs(messages)[0] for messages in messages_list
+        ]
+        completions = []
+        for i in range(0, len(dialogs), self.max_batch_size):
+            results = self.generator.chat_completion(
+                dialogs[i : i + self.max_batch_size],
+                max_gen_len=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+            )
+            completions += [result["generation"]["content"] for result in results]
+        return completions
 
     def count_tokens(self, messages: List[Dict[str, str]]) -> int:
-        dialogs = self._convert_to_llama_dialogs(messages)
-        num_tokens = 0
-        for dialog in dialogs:
-            if dialog[0]["role"] == "system":
-                if len(dialog) > 1:
-                    dialog = [
-                        {
-                            "role": dialog[1]["role"],
-                            "content": B_SYS
-                            + dialog[0]["content"]
-                            + E_SYS
-                            + dialog[1]["content"],
-                        }
-                    ] + dialog[2:]
-                else:
-                    dialog = [
-                        {
-                            "role": dialog[0]["role"],
-                            "content": B_SYS + dialog[0]["content"] + E_SYS,
-                        }
-                    ]
+        # Upper bound: every message is counted as if it were wrapped in its own
+        # instruction block, which lets per message counts be cached and summed.
+        return sum(map(self.count_message_tokens, messages))
 
-            dialog_tokens: List[int] = sum(
-                [
-                    self.generator.tokenizer.encode(
-                        f"{B_INST} {(prompt['content']).strip()} {E_INST} {(answer['content']).strip()} ",
-                        bos=True,
-                        eos=True,
-                    )
-                    for prompt, answer in zip(
-                        dialog[::2],
-                        dialog[1::2],
-                    )
-                ],
-                [],
-            )
-
-            dialog_tokens += self.generator.tokenizer.encode(
-                f"{B_INST} {(dialog[-1]['content']).strip()} {E_INST}",
+    def _count_message_tokens(self, message: Dict[str, str]) -> int:
+        content = message["content"].strip()
+        if message["role"] == "system":
+            content = B_SYS + content + E_SYS
+        return len(
+            self.generator.tokenizer.encode(
+                f"{B_INST} {content} {E_INST} ",
                 bos=True,
-                eos=False,
+                eos=True,
             )
-            num_tokens += len(dialog_tokens)
-        return num_tokens
+        )
 
     def get_token_limit(self):
         return self.max_seq_len or 4096
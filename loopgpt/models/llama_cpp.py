@@ -2,8 +2,16 @@ from typing import *
 from loopgpt.logger import logger
 import tempfile
 import subprocess
+import threading
+import requests
+import socket
+import codecs
+import atexit
+import json
+import time
 
 from loopgpt.models.base import BaseModel
+from loopgpt.models.tokenizers import get_hf_tokenizer
 
 
 def llama_executable() -> Optional[str]:
@@ -19,10 +27,140 @@ def llama_executable() -> Optional[str]:
     return os.environ["LLAMA_CPP"]
 
 
+def llama_server_executable() -> Optional[str]:
+    import os
+
+    if not "LLAMA_CPP_SERVER" in os.environ:
+        logger.warning(
+            "llama.cpp server executable not found. Please set the `LLAMA_CPP_SERVER` "
+            "environment variable to the path to the `server` executable to "
+            "use the llama.cpp server backend."
+        )
+        return None
+    return os.environ["LLAMA_CPP_SERVER"]
+
+
+class LlamaCppServer:
+    """A long lived llama.cpp ``server`` process listening on a local port. The model is loaded once and stays resident
+    between requests.
+
+    :param executable: Path to the llama.cpp ``server`` executable.
+    :type executable: str
+    :param model: Path to the model weights.
+    :type model: str, optional
+    :param context_size: Context size in tokens.
+    :type context_size: int
+    :param startup_timeout: Seconds to wait for the model to load. Defaults to 600.
+    :type startup_timeout: float, optional
+    """
+
+    def __init__(
+        self,
+        executable: str,
+        model: Optional[str],
+        context_size: int,
+        startup_timeout: float = 600,
+    ):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        arguments = [
+            executable,
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(self.port),
+            "-c",
+            str(context_size),
+        ]
+        if model:
+            arguments += ["--model", model]
+        self.process = subprocess.Popen(
+            arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self._wait_ready(startup_timeout)
+
+    def _wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    f"llama.cpp server exited with code {self.process.returncode}."
+                )
+            try:
+                if requests.get(f"{self.url}/health", timeout=5).status_code == 200:
+                    return
+            except requests.RequestException:
+                # Refused connections and timeouts while the model is still loading.
+                pass
+            if time.monotonic() > deadline:
+                self.close()
+                raise TimeoutError("llama.cpp server did not start in time.")
+            time.sleep(0.1)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_llama_server(
+    executable: str, model: Optional[str], context_size: int
+) -> LlamaCppServer:
+    """Returns the server shared by all models using the same executable, weights and context size, starting it on first use."""
+    key = (executable, model, context_size)
+    with _servers_lock:
+        server = _servers.get(key)
+        if server is None or server.process.poll() is not None:
+            server = _servers[key] = LlamaCppServer(executable, model, context_size)
+        return server
+
+
+@atexit.register
+def _close_servers():
+    for server in _servers.values():
+        server.close()
+
+
 class LlamaCppModel(BaseModel):
-    def __init__(self, model: Optional[str], prompt_style: str = "alpaca"):
+    """Runs a model with llama.cpp.
+
+    :param model: Path to the model weights.
+    :type model: str, optional
+    :param prompt_style: One of ``"alpaca"``, ``"vicuna"`` or ``"openassistant"``. Defaults to ``"alpaca"``.
+    :type prompt_style: str, optional
+    :param backend: ``"cli"`` runs the ``main`` executable (``LLAMA_CPP`` environment variable) for every request,
+        reloading the weights each time. ``"server"`` starts one llama.cpp ``server`` process (``LLAMA_CPP_SERVER``
+        environment variable) that keeps the model loaded and reuses the KV cache of the prompt prefix shared
+        with the previous request. Defaults to ``"cli"``.
+    :type backend: str, optional
+    :param server_url: URL of an already running llama.cpp server. Implies ``backend="server"``.
+    :type server_url: str, optional
+    """
+
+    def __init__(
+        self,
+        model: Optional[str],
+        prompt_style: str = "alpaca",
+        backend: str = "cli",
+        server_url: Optional[str] = None,
+    ):
+        if server_url:
+            backend = "server"
+        if backend not in ("cli", "server"):
+            raise ValueError(f"Unknown llama.cpp backend: {backend}")
         self.model = model
         self.prompt_style = prompt_style
+        self.backend = backend
+        self.server_url = server_url
 
     def chat(
         self,
@@ -30,12 +168,55 @@ class LlamaCppModel(BaseModel):
         max_tokens: Optional[int] = None,
         temperature: float = 0.8,
     ) -> str:
-        llama_bin = llama_executable()
+        return "".join(self.stream_chat(messages, max_tokens, temperature))
 
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> Iterator[str]:
         if max_tokens is None:
             max_tokens = self.get_token_limit()
 
         msg = self.encode_messages(messages)
+        if self.backend == "server":
+            return self._stream_server(msg, max_tokens, temperature)
+        return self._stream_cli(msg, max_tokens, temperature)
+
+    def _get_server_url(self) -> str:
+        if self.server_url:
+            return self.server_url
+        return get_llama_server(
+            llama_server_executable(), self.model, self.get_token_limit()
+        ).url
+
+    def _stream_server(self, msg: str, max_tokens: int, temperature: float):
+        resp = requests.post(
+            f"{self._get_server_url()}/completion",
+            json={
+                "prompt": msg,
+                "n_predict": max_tokens,
+                "temperature": temperature,
+                "stream": True,
+                # Reuse the KV cache for the prefix shared with the previous prompt.
+                "cache_prompt": True,
+            },
+            stream=True,
+        )
+        with resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if not line.startswith(b"data: "):
+                    continue
+                data = json.loads(line[len(b"data: ") :].decode("utf-8"))
+                if data.get("content"):
+                    yield data["content"]
+                if data.get("stop"):
+                    break
+
+    def _stream_cli(self, msg: str, max_tokens: int, temperature: float):
+        llama_bin = llama_executable()
         with tempfile.NamedTemporaryFile(
             mode="w",
         ) as fp:
@@ -56,14 +237,34 @@ class LlamaCppModel(BaseModel):
             if self.model:
                 arguments += ["--model", self.model]
 
-            output = subprocess.check_output(arguments)
-            output = output.decode("utf-8").lstrip()
-            if output.startswith(msg.lstrip()):
-                output = output[len(msg.lstrip()) :]
-            return output
+            # llama.cpp echoes the prompt before the completion. Output is held back
+            # until it is known whether it starts with the prompt, which is then dropped.
+            prompt = msg.lstrip()
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            head = ""
+            proc = subprocess.Popen(arguments, stdout=subprocess.PIPE)
+            try:
+                while True:
+                    data = proc.stdout.read1(4096)
+                    text = decoder.decode(data, final=not data)
+                    if head is not None:
+                        head = (head + text).lstrip()
+                        if data and len(head) < len(prompt) and prompt.startswith(head):
+                            continue
+                        text = head[len(prompt) :] if head.startswith(prompt) else head
+                        head = None
+                    if text:
+                        yield text
+                    if not data:
+                        break
+            finally:
+                proc.stdout.close()
+                returncode = proc.wait()
+            if returncode:
+                raise subprocess.CalledProcessError(returncode, arguments)
 
-    def encode_messages(self, messages: List[Dict[str, str]]):
-        message_format = {
+    def _message_format(self) -> Dict[str, str]:
+        return {
             "alpaca": {
                 "system": "{0}\n",
                 "user": "### Instruction:\n{0}",
@@ -81,6 +282,9 @@ class LlamaCppModel(BaseModel):
             },
         }[self.prompt_style]
 
+    def encode_messages(self, messages: List[Dict[str, str]]):
+        message_format = self._message_format()
+
         data = []
         for message in messages:
             data.append(message_format[message["role"]].format(message["content"]))
@@ -88,16 +292,17 @@ class LlamaCppModel(BaseModel):
 
         return "".join(data)
 
+    def _tokenizer(self):
+        return get_hf_tokenizer("huggyllama/llama-7b")
+
     def count_tokens(self, messages: List[Dict[str, str]]) -> int:
-        try:
-            from transformers import AutoTokenizer
-        except ImportError as e:
-            raise ImportError(
-                "Please install transformers (pip install transformers) to use the llama.cpp backend."
-            ) from e
-        tokenizer = AutoTokenizer.from_pretrained("huggyllama/llama-7b")
-        data = self.encode_messages(messages)
-        encoding = tokenizer(data)
+        # The trailing empty assistant message accounts for the response prefix.
+        messages = messages + [{"role": "assistant", "content": ""}]
+        return sum(map(self.count_message_tokens, messages))
+
+    def _count_message_tokens(self, message: Dict[str, str]) -> int:
+        data = self._message_format()[message["role"]].format(message["content"])
+        encoding = self._tokenizer()(data)
         return len(encoding.input_ids)
 
     def get_token_limit(self) -> int:
@@ -109,10 +314,17 @@ class LlamaCppModel(BaseModel):
             {
                 "model": self.model,
                 "prompt_style": self.prompt_style,
+                "backend": self.backend,
+                "server_url": self.server_url,
             }
         )
         return cfg
 
     @classmethod
     def from_config(cls, config):
-        return cls(config.get("model", None), config["prompt_style"])
+        return cls(
+            config.get("model", None),
+            config["prompt_style"],
+            config.get("backend", "cli"),
+            config.get("server_url"),
+        )
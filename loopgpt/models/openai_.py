@@ -1,20 +1,64 @@
 from typing import *
-from loopgpt.logger import logger
 from loopgpt.models.base import BaseModel
+from loopgpt.models.tokenizers import get_tiktoken_encoding
 from loopgpt.utils.openai_key import get_openai_key
-
-import tiktoken
-import time
-
-from openai import RateLimitError
-from openai import OpenAI
+from loopgpt.utils.openai_client import get_client, get_async_client
+from loopgpt.utils.rate_limiter import RateLimiter, get_rate_limiter
 
 
 class OpenAIModel(BaseModel):
     def __init__(self, model: str = "gpt-3.5-turbo", api_key: Optional[str] = None):
         self.model = model
         self.api_key = get_openai_key(api_key)
-        self.client = OpenAI(api_key=self.api_key)
+
+    @property
+    def client(self):
+        """The shared client for this model's credentials (see :mod:`loopgpt.utils.openai_client`), unless
+        another client was assigned to this model."""
+        return getattr(self, "_client", None) or self._shared_client()
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _shared_client(self):
+        return get_client(self.api_key)
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Rate limiter shared by all models using the same credentials and model."""
+        return get_rate_limiter((None, self.api_key, self.model))
+
+    def _create_kwargs(self, messages, max_tokens, temperature) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
+    def _estimate_tokens(self, messages, max_tokens) -> int:
+        # Token limits are enforced on the prompt plus the requested completion. The estimate is only used for
+        # rate limiting, so models that count_tokens does not know (or a missing tiktoken encoding) fall back
+        # to about 4 characters per token instead of failing the request.
+        try:
+            prompt_tokens = self.count_tokens(messages)
+        except Exception:
+            prompt_tokens = sum(
+                4 + len(str(value)) // 4 for msg in messages for value in msg.values()
+            )
+        return prompt_tokens + (max_tokens or 0)
+
+    def _create(self, **kwargs):
+        limiter = self.rate_limiter
+
+        def request():
+            raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+            limiter.update_from_headers(raw.headers)
+            return raw.parse()
+
+        tokens = self._estimate_tokens(kwargs["messages"], kwargs["max_tokens"])
+        return limiter.call(request, tokens)
 
     def chat(
         self,
@@ -22,42 +66,58 @@ class OpenAIModel(BaseModel):
         max_tokens: Optional[int] = None,
         temperature: float = 0.8,
     ) -> str:
-        num_retries = 3
-        for i in range(num_retries):
-            try:
-                resp = (
-                    self.client.chat.completions.create(
-                        model=self.model,
-                        messages=messages,
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                    )
-                    .choices[0]
-                    .message.content
-                )
-                return resp
-
-            except RateLimitError:
-                logger.warn("Rate limit exceeded. Retrying after 20 seconds.")
-                time.sleep(20)
-                if i == num_retries - 1:
-                    raise
+        resp = self._create(**self._create_kwargs(messages, max_tokens, temperature))
+        return resp.choices[0].message.content
+
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> Iterator[str]:
+        stream = self._create(
+            **self._create_kwargs(messages, max_tokens, temperature), stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _get_async_client(self):
+        return get_async_client(self.api_key)
+
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+    ) -> str:
+        client = self._get_async_client()
+        limiter = self.rate_limiter
+        kwargs = self._create_kwargs(messages, max_tokens, temperature)
+
+        async def request():
+            raw = await client.chat.completions.with_raw_response.create(**kwargs)
+            limiter.update_from_headers(raw.headers)
+            return raw.parse()
+
+        resp = await limiter.acall(request, self._estimate_tokens(messages, max_tokens))
+        return resp.choices[0].message.content
 
     def count_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(map(self.count_message_tokens, messages)) + 3
+
+    def _count_message_tokens(self, message: Dict[str, str]) -> int:
         tokens_per_message, tokens_per_name = {
             "gpt-3.5-turbo": (4, -1),
             "gpt-4": (3, 1),
             "gpt-4-32k": (3, 1),
         }[self.model]
-        enc = tiktoken.encoding_for_model(self.model)
-        num_tokens = 0
-        for message in messages:
-            num_tokens += tokens_per_message
-            for key, value in message.items():
-                num_tokens += len(enc.encode(value))
-                if key == "name":
-                    num_tokens += tokens_per_name
-        num_tokens += 3
+        enc = get_tiktoken_encoding(self.model)
+        num_tokens = tokens_per_message
+        for key, value in message.items():
+            num_tokens += len(enc.encode(value))
+            if key == "name":
+                num_tokens += tokens_per_name
         return num_tokens
 
     def get_token_limit(self) -> int:
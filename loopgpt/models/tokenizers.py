@@ -0,0 +1,71 @@
+"""Process wide registry of tokenizers.
+
+Tokenizers are loaded lazily the first time they are requested and shared by all model instances afterwards,
+so that counting tokens never reloads vocabularies from disk.
+"""
+
+from typing import Any, Callable, Dict, Hashable
+
+import threading
+
+_tokenizers: Dict[Hashable, Any] = {}
+_locks: Dict[Hashable, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def get_tokenizer(key: Hashable, loader: Callable[[], Any]) -> Any:
+    """Returns the tokenizer registered under ``key``, calling ``loader`` to create it if it does not exist yet.
+    Concurrent callers asking for the same key wait for a single load.
+
+    :param key: Unique key for the tokenizer.
+    :type key: Hashable
+    :param loader: Zero argument callable that loads the tokenizer.
+    :type loader: Callable
+    """
+    try:
+        return _tokenizers[key]
+    except KeyError:
+        pass
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _tokenizers:
+            _tokenizers[key] = loader()
+    return _tokenizers[key]
+
+
+def get_tiktoken_encoding(model: str):
+    """Returns the ``tiktoken`` encoding for an OpenAI model. Models unknown to ``tiktoken``, such as Azure
+    deployment IDs, get the ``cl100k_base`` encoding."""
+
+    def load():
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+
+    return get_tokenizer(("tiktoken", model), load)
+
+
+def get_hf_tokenizer(name: str, **kwargs):
+    """Returns a Hugging Face ``AutoTokenizer`` loaded with ``AutoTokenizer.from_pretrained(name, **kwargs)``."""
+
+    def load():
+        try:
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "Please install transformers (pip install transformers) to use hugging face tokenizers."
+            ) from e
+        return AutoTokenizer.from_pretrained(name, **kwargs)
+
+    return get_tokenizer(("hf", name, tuple(sorted(kwargs.items()))), load)
+
+
+def clear_tokenizers():
+    """Removes all loaded tokenizers from the registry."""
+    with _registry_lock:
+        _tokenizers.clear()
+        _locks.clear()
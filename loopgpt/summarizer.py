@@ -3,16 +3,48 @@ Adapted from Auto-GPT (https://github.com/Significant-Gravitas/Auto-GPT)
 """
 
 import time
+import random
 from typing import *
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
+from openai import RateLimitError
 from loopgpt.models import BaseModel, OpenAIModel
+from loopgpt.logger import logger
 
 import loopgpt.utils.spinner
 
 
 class Summarizer:
-    def __init__(self, model: Optional[BaseModel] = None):
+    """Summarizes or answers queries on long texts by splitting them into chunks (map) and combining the partial results (reduce).
+
+    :param model: Model to use. Defaults to the agent's model if it is GPT-3.5-Turbo (or not an OpenAI model), else GPT-3.5-Turbo.
+    :type model: :class:`~loopgpt.models.base.BaseModel`, optional
+    :param max_workers: Maximum number of chunks processed concurrently. Defaults to 4.
+    :type max_workers: int, optional
+    :param max_retries: Number of times a chunk is retried when the model raises ``RateLimitError``. Defaults to 0,
+        because OpenAI models already wait and retry through their shared rate limiter, and retrying on top of
+        that multiplies the waits. Set it for other models that raise ``RateLimitError``.
+    :type max_retries: int, optional
+    :param backoff: Base delay in seconds of the jittered exponential backoff between retries. Defaults to 2.
+    :type backoff: float, optional
+    :param reduce_chunk_size: Partial results longer than this many tokens are reduced hierarchically,
+        chunk by chunk, instead of in a single call. Defaults to 2000.
+    :type reduce_chunk_size: int, optional
+    """
+
+    def __init__(
+        self,
+        model: Optional[BaseModel] = None,
+        max_workers: int = 4,
+        max_retries: int = 0,
+        backoff: float = 2.0,
+        reduce_chunk_size: int = 2000,
+    ):
         self._model = model
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.reduce_chunk_size = reduce_chunk_size
 
     @property
     def model(self):
@@ -23,26 +55,36 @@ class Summarizer:
                     if model.model == "gpt-3.5-turbo":
                         self._model = model
                     else:
-                        self._model = OpenAIModel("gpt-3.5-turbo")
+                        # Same credentials, so the agent's client is shared.
+                        self._model = OpenAIModel("gpt-3.5-turbo", model.api_key)
                 else:
                     self._model = model
             else:
                 self._model = OpenAIModel("gpt-3.5-turbo")
         return self._model
 
-    def qa_chunk(self, text, query):
+    def _qa_messages(self, text, query):
         prompt = f"""{text}\n\nUsing the above text, try to answer the following query: "{query}". -- if the query cannot be answered using the text, say \"NO ANSWER\"\n"""
-        resp = self.model.chat(
-            [{"role": "user", "content": prompt}], temperature=0, max_tokens=300
-        )
+        return [{"role": "user", "content": prompt}]
+
+    def _qa_answer(self, resp):
         if "NO ANSWER" in resp.upper():
             return ""  # FIXME
         return resp
 
-    def summarize_chunk(self, text, query):
+    def _summary_messages(self, text):
         prompt = f"""Summarize the following text: \n"{text}"\n"""
+        return [{"role": "user", "content": prompt}]
+
+    def qa_chunk(self, text, query):
+        resp = self.model.chat(
+            self._qa_messages(text, query), temperature=0, max_tokens=300
+        )
+        return self._qa_answer(resp)
+
+    def summarize_chunk(self, text, query):
         resp = self.model.chat(
-            [{"role": "user", "content": prompt}], temperature=0, max_tokens=300
+            self._summary_messages(text), temperature=0, max_tokens=300
         )
         return resp
 
@@ -60,29 +102,74 @@ class Summarizer:
                 "summary": resp,
             }
 
+    def _with_backoff(self, func, *args):
+        for i in range(self.max_retries + 1):
+            try:
+                return func(*args)
+            except RateLimitError:
+                if i == self.max_retries:
+                    raise
+                delay = self.backoff * 2**i * random.uniform(0.5, 1.5)
+                logger.warning(
+                    f"Rate limit exceeded. Retrying after {delay:.1f} seconds."
+                )
+                time.sleep(delay)
+
+    def _map_batch(self, func, chunks: List[str], query: str) -> List[str]:
+        # Local models generate for all chunks in a few padded batches instead of one chunk at a time.
+        if func == self.qa_chunk:
+            messages_list = [self._qa_messages(chunk, query) for chunk in chunks]
+        else:
+            messages_list = [self._summary_messages(chunk) for chunk in chunks]
+        resps = self.model.chat_batch(messages_list, temperature=0, max_tokens=300)
+        if func == self.qa_chunk:
+            resps = list(map(self._qa_answer, resps))
+        return resps
+
+    def _map(self, func, chunks: List[str], query: str, desc: str) -> List[str]:
+        if self.model.native_batching and func in (self.qa_chunk, self.summarize_chunk):
+            return self._map_batch(func, chunks, query)
+        # Results are returned in the order of the chunks, regardless of completion order.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = pool.map(
+                lambda chunk: self._with_backoff(func, chunk, query), chunks
+            )
+            return list(tqdm(results, total=len(chunks), desc=desc))
+
+    def _reduce(self, summaries: List[str], query: str) -> str:
+        summary = "\n".join(summaries)
+        if len(summaries) == 1:
+            return summary
+        num_chunks = None
+        while True:
+            chunks = list(self._chunk_text(summary, self.reduce_chunk_size))
+            if len(chunks) <= 1 or (num_chunks and len(chunks) >= num_chunks):
+                break
+            num_chunks = len(chunks)
+            summaries = self._map(
+                self.summarize_chunk, chunks, query, "Combining summaries..."
+            )
+            summary = "\n".join(summaries)
+        return self._with_backoff(self.summarize_chunk, summary, query)
+
     def summarize(self, text: str, query: str):
         spinner = loopgpt.utils.spinner.ACTIVE_SPINNER
         if spinner:
             spinner.hide()
-        if query == "summary":
-            query = ""
-        summaries = []
-        for chunk in tqdm(list(self._chunk_text(text)), desc="Summarizing text..."):
-            if not query:
-                summary = self.summarize_chunk(chunk, query)
-            else:
-                summary = self.qa_chunk(chunk, query)
-            if summary:
-                summaries.append(summary)
-                self.agent.memory.add(summary)
-        if not summaries:
-            return "NOTHING FOUND", []
-        summary = "\n".join(summaries)
-        if len(summaries) > 1:
-            summary = self.summarize_chunk(summary, query)
-        if spinner:
-            spinner.show()
-        return summary, summaries
+        try:
+            if query == "summary":
+                query = ""
+            chunks = list(self._chunk_text(text))
+            func = self.qa_chunk if query else self.summarize_chunk
+            summaries = self._map(func, chunks, query, "Summarizing text...")
+            summaries = [summary for summary in summaries if summary]
+            self.agent.memory.add_many(summaries)
+            if not summaries:
+                return "NOTHING FOUND", []
+            return self._reduce(summaries, query), summaries
+        finally:
+            if spinner:
+                spinner.show()
 
     def _count_tokens(self, text):
         return self.model.count_tokens(
@@ -1,5 +1,7 @@
 from typing import *
+from functools import partial
 import loopgpt.agent
+import asyncio
 import inspect
 import re
 
@@ -9,6 +11,14 @@ def camel_case_split(str):
 
 
 class BaseTool:
+    # Seconds an agent waits for this tool when running several commands concurrently.
+    # Defaults to the agent's ``command_timeout`` if None.
+    timeout: Optional[float] = None
+    # Whether several commands for the same instance of this tool can run at the same time. Most tools keep
+    # state (a browser session, caches), so concurrently run commands for the same tool run one at a time
+    # unless this is set.
+    concurrent_safe: bool = False
+
     def __init__(self, *args, **kwargs):
         self._agent = None
         self.is_source = False
@@ -28,6 +38,13 @@ class BaseTool:
     def run(**kwargs) -> str:
         raise NotImplementedError()
 
+    async def arun(self, **kwargs):
+        """Asynchronous version of :meth:`run`, used by :meth:`~loopgpt.agent.Agent.achat`. Tools that do I/O
+        can override it. By default, :meth:`run` is run in the event loop's default thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.run, **kwargs))
+
     def prompt(self):
         sig = inspect.signature(self.run)
         return f'def {self.id}{sig}:\n\t"""{self.__doc__}\n\t"""'.expandtabs(4)
@@ -131,8 +131,9 @@ class Browser(BaseTool):
             self.summarizer.agent = getattr(self, "agent")
             summary, chunks = self.summarizer.summarize(text, query)
             if getattr(self, "agent"):
-                for chunk in chunks:
-                    self.agent.memory.add(f"Snippet from {url}: {chunk}")
+                self.agent.memory.add_many(
+                    [f"Snippet from {url}: {chunk}" for chunk in chunks]
+                )
 
             result = (
                 summary
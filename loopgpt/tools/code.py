@@ -21,11 +21,15 @@ def ai_function(func, desc, args, model: BaseModel):
 
 
 class _BaseCodeTool(BaseTool):
+    _default_model = None
+
     @property
     def model(self):
-        if getattr(self, "agent"):
+        if getattr(self, "agent", None):
             return self.agent.model
-        return OpenAIModel("gpt-3.5-turbo")
+        if _BaseCodeTool._default_model is None:
+            _BaseCodeTool._default_model = OpenAIModel("gpt-3.5-turbo")
+        return _BaseCodeTool._default_model
 
 
 class ExecutePythonFile(_BaseCodeTool):
@@ -13,5 +13,7 @@ class EvaluateMath(BaseTool):
         str: The result of the expression.
     """
 
+    concurrent_safe = True
+
     def run(self, expression: str):
         return str(simple_eval(expression))
@@ -26,13 +26,13 @@ class ReadFromPDF(BaseTool):
             else:
                 summarizer.agent = self.agent
             reader = PdfReader(file)
+            chunks = []
             for page in tqdm(reader.pages):
                 page_text = page.extract_text()
-                chunks = list(summarizer._chunk_text(page_text, chunk_size=60))
-                for chunk in chunks:
-                    self._add_to_memory(chunk)
+                chunks += summarizer._chunk_text(page_text, chunk_size=60)
+            self._add_to_memory(chunks)
         except:
             raise
 
-    def _add_to_memory(self, text):
-        self.agent.memory.add(text)
+    def _add_to_memory(self, texts):
+        self.agent.memory.add_many(texts)
@@ -0,0 +1,226 @@
+"""Tolerant JSON parsing for model responses.
+
+Models often return almost-JSON: text before or after the object, missing closing braces, single quoted strings,
+unquoted keys, raw newlines inside strings, Python literals or trailing commas. :func:`repair_json` fixes these locally, so that
+asking the model to fix its own output is only needed as a last resort.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+import json
+import ast
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _closes_string(s: str, i: int) -> bool:
+    # A quote inside a string only ends it if it is followed by something that can follow a string.
+    for c in s[i + 1 :]:
+        if not c.isspace():
+            return c in ",:}]"
+    return True
+
+
+def _strip_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(s: str) -> str:
+    """Returns a best effort valid JSON version of the first JSON object or array in ``s``.
+
+    Brackets in leading text (e.g. ``Step [1]: {...}``) are skipped: an array is only used if the first object is inside it.
+
+    :raises ValueError: If ``s`` does not contain an object or array.
+    """
+    brace = s.find("{")
+    bracket = s.find("[")
+    if brace == -1 and bracket == -1:
+        raise ValueError("No JSON object found.")
+    if bracket == -1 or (brace != -1 and brace < bracket):
+        return _repair(s, brace)[0]
+    out, end = _repair(s, bracket)
+    if brace != -1 and end <= brace:
+        return _repair(s, brace)[0]
+    return out
+
+
+def _repair(s: str, i: int) -> Tuple[str, int]:
+    # Repairs the value starting at s[i]. Returns the repaired JSON and the index where the value ends.
+    out = []
+    stack = []
+    quote = None
+    escape = False
+    n = len(s)
+    while i < n:
+        c = s[i]
+        if quote:
+            if escape:
+                escape = False
+                if c == "'" and quote == "'":
+                    out[-1] = "'"
+                else:
+                    out.append(c)
+            elif c == "\\":
+                escape = True
+                out.append(c)
+            elif c == quote and _closes_string(s, i):
+                quote = None
+                out.append('"')
+            elif c == '"':
+                out.append('\\"')
+            else:
+                out.append(_ESCAPES.get(c, c))
+        elif c in "\"'":
+            quote = c
+            out.append('"')
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+            out.append(c)
+        elif c in "}]":
+            if c in stack:
+                _strip_trailing_comma(out)
+                while stack[-1] != c:
+                    out.append(stack.pop())
+                out.append(stack.pop())
+            if not stack:
+                # Anything after the top level value is not part of it.
+                i += 1
+                break
+        elif c.isalpha() or c == "_":
+            j = i
+            while j < n and (s[j].isalnum() or s[j] == "_"):
+                j += 1
+            word = s[i:j]
+            if s[j:].lstrip().startswith(":"):
+                # Unquoted key
+                out.append(json.dumps(word))
+            else:
+                out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(c)
+        i += 1
+    if quote:
+        if escape:
+            out.pop()
+        out.append('"')
+    while stack:
+        _strip_trailing_comma(out)
+        if out and out[-1] == ":":
+            out.append("null")
+        out.append(stack.pop())
+    return "".join(out), i
+
+
+def parse_json(s: str) -> Tuple[Any, str]:
+    """Parses ``s`` with increasingly tolerant methods.
+
+    Returns a tuple of the parsed value and the name of the method that succeeded:
+    ``"json"`` (valid JSON), ``"repair"`` (JSON after :func:`repair_json`) or ``"literal_eval"`` (a Python literal).
+
+    :raises ValueError: If none of the methods succeed.
+    """
+    try:
+        return json.loads(s), "json"
+    except Exception:
+        pass
+    try:
+        return json.loads(repair_json(s)), "repair"
+    except Exception:
+        pass
+    fragment = s[s.find("{") : s.rfind("}") + 1].replace("\n", " ")
+    for candidate in (fragment, fragment + "}"):
+        try:
+            return ast.literal_eval(candidate), "literal_eval"
+        except Exception:
+            pass
+    raise ValueError(f"Could not parse JSON from: {s}")
+
+
+class IncrementalJSONParser:
+    """Parses a JSON object as it is streamed in, making each top level member available as soon as its value is complete.
+
+    Example:
+
+        >>> parser = IncrementalJSONParser()
+        >>> parser.feed('{"thoughts": {"text": "hi"}, "command": {"name": "do_nothing", ')
+        {'thoughts': {'text': 'hi'}}
+        >>> parser.feed('"args": {}}, "extra": 1')
+        {'command': {'name': 'do_nothing', 'args': {}}}
+        >>> parser.members
+        {'thoughts': {'text': 'hi'}, 'command': {'name': 'do_nothing', 'args': {}}}
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.members: Dict[str, Any] = {}
+        self._pos = 0
+        self._depth = 0
+        self._quote = None
+        self._escape = False
+        self._string_start = None
+        self._key = None
+        self._value_start = None
+        self._expect_key = False
+
+    def _complete(self, end: int, new: Dict[str, Any]):
+        if self._key is not None and self._value_start is not None:
+            fragment = self.buffer[self._value_start : end].strip()
+            try:
+                value = parse_json(fragment)[0]
+            except ValueError:
+                value = fragment
+            self.members[self._key] = value
+            new[self._key] = value
+        self._key = None
+        self._value_start = None
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """Adds ``text`` to the buffer and returns the top level members completed by it."""
+        self.buffer += text
+        new = {}
+        s = self.buffer
+        for i in range(self._pos, len(s)):
+            c = s[i]
+            if self._quote:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == self._quote:
+                    self._quote = None
+                    if self._depth == 1 and self._expect_key:
+                        self._key = s[self._string_start + 1 : i]
+                        self._expect_key = False
+                continue
+            if self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+            if c in "\"'":
+                self._quote = c
+                self._string_start = i
+            elif c == ":" and self._depth == 1:
+                self._value_start = i + 1
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._complete(i + 1, new)
+                elif self._depth == 0:
+                    self._complete(i, new)
+            elif c == "," and self._depth == 1:
+                self._complete(i, new)
+                self._expect_key = True
+        self._pos = len(s)
+        return new
+
+    def get(self, key: str, default: Optional[Any] = None):
+        return self.members.get(key, default)
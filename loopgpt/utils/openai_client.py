@@ -0,0 +1,166 @@
+"""Shared OpenAI clients.
+
+Every model and embedding provider talking to the same endpoint with the same credentials uses one client, so that
+they share its connection pool and keep-alive connections instead of each paying for new TLS handshakes.
+
+Shared clients do not retry failed requests by default: chat models retry through their shared rate limiter
+(:mod:`loopgpt.utils.rate_limiter`), so that concurrent agents back off together. Callers without a rate limiter ask for
+a client with ``max_retries``, which shares the connection pool of the client without retries.
+"""
+
+from typing import Optional
+
+import asyncio
+import threading
+import weakref
+
+from openai import (
+    AsyncAzureOpenAI,
+    AsyncOpenAI,
+    AzureOpenAI,
+    OpenAI,
+    DEFAULT_CONNECTION_LIMITS,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+)
+
+# The ``Limits`` class of the httpx version used by the installed openai package.
+_Limits = type(DEFAULT_CONNECTION_LIMITS)
+
+pool_settings = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "http2": False,
+}
+
+_clients = {}
+# Async connections are bound to the event loop they were opened in, so async clients are kept per loop.
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def configure_pool(
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+    http2: Optional[bool] = None,
+):
+    """Sets the connection pool settings of shared clients. Call it before creating models and embedding providers.
+    Clients created before the call are dropped from the registry, so that models get new clients with the new
+    settings on their next request. The old clients are not closed, since other threads may still be using them,
+    and close their connections once they are garbage collected.
+
+    :param max_connections: Maximum number of concurrent connections per client.
+    :type max_connections: int, optional
+    :param max_keepalive_connections: Maximum number of idle connections kept alive per client.
+    :type max_keepalive_connections: int, optional
+    :param keepalive_expiry: Seconds an idle connection is kept alive.
+    :type keepalive_expiry: float, optional
+    :param http2: Whether to use HTTP/2. Requires the ``h2`` package.
+    :type http2: bool, optional
+    """
+    updates = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry,
+        "http2": http2,
+    }
+    pool_settings.update({k: v for k, v in updates.items() if v is not None})
+    with _lock:
+        _clients.clear()
+        _async_clients.clear()
+
+
+def _http_client_kwargs():
+    settings = dict(pool_settings)
+    http2 = settings.pop("http2")
+    return {"limits": _Limits(**settings), "http2": http2}
+
+
+def _create_client(api_key, azure_endpoint, api_version, is_async):
+    # Retries are left to the rate limiter, see the module docstring.
+    if is_async:
+        http_client = DefaultAsyncHttpxClient(**_http_client_kwargs())
+    else:
+        http_client = DefaultHttpxClient(**_http_client_kwargs())
+    if azure_endpoint:
+        cls = AsyncAzureOpenAI if is_async else AzureOpenAI
+        return cls(
+            api_key=api_key,
+            api_version=api_version,
+            azure_endpoint=azure_endpoint,
+            http_client=http_client,
+            max_retries=0,
+        )
+    cls = AsyncOpenAI if is_async else OpenAI
+    return cls(api_key=api_key, http_client=http_client, max_retries=0)
+
+
+def _get_client(clients, api_key, azure_endpoint, api_version, max_retries, is_async):
+    # Must be called with _lock held.
+    key = (azure_endpoint, api_key, api_version, max_retries)
+    client = clients.get(key)
+    if client is None:
+        if max_retries:
+            base = _get_client(
+                clients, api_key, azure_endpoint, api_version, 0, is_async
+            )
+            client = base.with_options(max_retries=max_retries)
+        else:
+            client = _create_client(api_key, azure_endpoint, api_version, is_async)
+        clients[key] = client
+    return client
+
+
+def get_client(
+    api_key: str,
+    azure_endpoint: Optional[str] = None,
+    api_version: Optional[str] = None,
+    max_retries: int = 0,
+):
+    """Returns the shared client for the given credentials, creating it on first use.
+    An :class:`openai.AzureOpenAI` client is returned if ``azure_endpoint`` is given, else an :class:`openai.OpenAI` client.
+
+    :param api_key: The API key.
+    :type api_key: str
+    :param azure_endpoint: The Azure OpenAI endpoint.
+    :type azure_endpoint: str, optional
+    :param api_version: The Azure OpenAI API version.
+    :type api_version: str, optional
+    :param max_retries: Number of times the client retries failed requests itself. Defaults to 0, for callers that
+        retry through a rate limiter.
+    :type max_retries: int, optional
+    """
+    with _lock:
+        return _get_client(
+            _clients, api_key, azure_endpoint, api_version, max_retries, False
+        )
+
+
+def get_async_client(
+    api_key: str,
+    azure_endpoint: Optional[str] = None,
+    api_version: Optional[str] = None,
+    max_retries: int = 0,
+):
+    """Async version of :func:`get_client`. Must be called from a running event loop;
+    clients are shared within that loop only.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        return _get_client(
+            clients, api_key, azure_endpoint, api_version, max_retries, True
+        )
+
+
+def clear_clients():
+    """Closes and forgets all shared sync clients and forgets all async clients. Only call it when no requests are
+    in flight, e.g. at shutdown."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _async_clients.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,231 @@
+"""Client side rate limiting for model backends.
+
+A :class:`RateLimiter` is a pair of token buckets, one for requests per minute and one for tokens per minute. Requests wait
+for capacity before they are sent instead of failing and sleeping blindly. The limits are learned from the ``x-ratelimit-*``
+headers of responses, and a rate limit error pauses every request sharing the limiter, so concurrent agents in one process
+back off together.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Mapping, Optional
+from loopgpt.logger import logger
+
+import asyncio
+import random
+import re
+import threading
+import time
+
+from openai import RateLimitError
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parses durations like ``"20ms"``, ``"1.5s"`` or ``"6m0s"`` (as used by ``x-ratelimit-reset-*`` headers) into seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+class _Bucket:
+    def __init__(self, per_minute: Optional[float]):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.capacity is not None:
+            self.level = min(
+                self.capacity,
+                self.level + (now - self.updated) * self.capacity / 60,
+            )
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.capacity is None:
+            return 0
+        # Requests larger than the bucket are let through when it is full.
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0
+        return (amount - self.level) * 60 / self.capacity
+
+    def consume(self, amount: float):
+        if self.capacity is not None:
+            self.level -= min(amount, self.capacity)
+
+    def update(self, limit: Optional[float], remaining: Optional[float]):
+        if limit is not None:
+            if self.capacity is None:
+                self.level = limit
+            self.capacity = limit
+        if remaining is not None and self.capacity is not None:
+            self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """Token bucket rate limiter with retries.
+
+    :param rpm: Requests per minute. Unlimited until learned from response headers if not specified.
+    :type rpm: float, optional
+    :param tpm: Tokens per minute. Unlimited until learned from response headers if not specified.
+    :type tpm: float, optional
+    :param max_retries: Number of times a rate limited request is retried. Defaults to 6.
+    :type max_retries: int, optional
+    :param backoff: Base delay in seconds of the jittered exponential backoff, used when the server does not say
+        how long to wait. Defaults to 1.
+    :type backoff: float, optional
+    :param max_backoff: Maximum delay in seconds between retries. Defaults to 60.
+    :type max_backoff: float, optional
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_retries: int = 6,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def set_limits(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        with self._lock:
+            self.requests.update(rpm, None)
+            self.tokens.update(tpm, None)
+
+    def _try_acquire(self, tokens: int) -> float:
+        # Returns 0 and takes capacity if the request can be sent now, else the time to wait before trying again.
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(
+                self._paused_until - now,
+                self.requests.wait_time(1),
+                self.tokens.wait_time(tokens),
+            )
+            if wait <= 0:
+                self.requests.consume(1)
+                self.tokens.consume(tokens)
+            return wait
+
+    def acquire(self, tokens: int = 0):
+        """Blocks until a request using ``tokens`` tokens can be sent."""
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        """Async version of :meth:`acquire`."""
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Updates the limits and remaining capacity from ``x-ratelimit-*`` response headers."""
+
+        def number(name):
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            self.requests.update(
+                number("x-ratelimit-limit-requests"),
+                number("x-ratelimit-remaining-requests"),
+            )
+            self.tokens.update(
+                number("x-ratelimit-limit-tokens"),
+                number("x-ratelimit-remaining-tokens"),
+            )
+
+    def retry_delay(self, attempt: int, headers: Optional[Mapping[str, str]] = None):
+        """Returns how long to wait before retry number ``attempt`` (starting at 0) of a rate limited request.
+        ``retry-after-ms``, ``retry-after`` and ``x-ratelimit-reset-*`` headers are used if present, else jittered exponential backoff.
+        """
+        headers = headers or {}
+        delay = None
+        if headers.get("retry-after-ms"):
+            delay = parse_duration(headers["retry-after-ms"] + "ms")
+        if delay is None and headers.get("retry-after"):
+            delay = parse_duration(headers["retry-after"])
+        if delay is None:
+            resets = [
+                parse_duration(headers[name])
+                for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+                if headers.get(name)
+            ]
+            resets = [r for r in resets if r is not None]
+            if resets:
+                delay = max(resets)
+        if delay is None:
+            delay = self.backoff * 2**attempt
+        return min(delay, self.max_backoff) * random.uniform(1.0, 1.5)
+
+    def _on_rate_limit(self, error: RateLimitError, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers is not None:
+            self.update_from_headers(headers)
+        delay = self.retry_delay(attempt, headers)
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        logger.warning(f"Rate limit exceeded. Retrying after {delay:.1f} seconds.")
+        return delay
+
+    def call(self, func: Callable[[], Any], tokens: int = 0):
+        """Calls ``func`` when capacity is available, retrying it if it raises :class:`openai.RateLimitError`."""
+        for i in range(self.max_retries + 1):
+            self.acquire(tokens)
+            try:
+                return func()
+            except RateLimitError as e:
+                if i == self.max_retries:
+                    raise
+                self._on_rate_limit(e, i)
+
+    async def acall(self, func: Callable[[], Awaitable[Any]], tokens: int = 0):
+        """Async version of :meth:`call`. ``func`` returns an awaitable."""
+        for i in range(self.max_retries + 1):
+            await self.aacquire(tokens)
+            try:
+                return await func()
+            except RateLimitError as e:
+                if i == self.max_retries:
+                    raise
+                self._on_rate_limit(e, i)
+
+
+_limiters: Dict[Hashable, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: Hashable) -> RateLimiter:
+    """Returns the rate limiter shared by all requests with the same ``key``, e.g. ``(endpoint, api_key, model)``."""
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter()
+        return limiter
@@ -0,0 +1,223 @@
+"""Tracing of agent steps.
+
+A :class:`Tracer` emits :class:`Span` objects (name, duration, attributes, parent) to pluggable sinks. Without sinks,
+:meth:`Tracer.span` returns a shared no-op span, so instrumented code costs next to nothing when tracing is disabled.
+
+Example:
+
+.. code-block:: python
+
+    from loopgpt.utils.tracing import InMemorySink, JSONLSink
+
+    sink = InMemorySink()
+    agent.tracer.add_sink(sink)
+    agent.tracer.add_sink(JSONLSink("trace.jsonl"))
+    agent.chat("Hello")
+    for span in sink.spans:
+        print(span.name, span.duration, span.attributes)
+"""
+
+from typing import Any, Dict, List, Optional
+
+import contextvars
+import threading
+import json
+import time
+import uuid
+
+_current_span = contextvars.ContextVar("loopgpt_current_span", default=None)
+
+
+class Span:
+    """A timed step. Spans opened while another span is open become its children.
+
+    :ivar name: Name of the step, e.g. ``"chat"``, ``"llm"`` or ``"tool"``.
+    :ivar trace_id: Shared by all spans of one top level step.
+    :ivar span_id: Unique id of the span.
+    :ivar parent: The enclosing span, if any.
+    :ivar start_time: Start time as a unix timestamp.
+    :ivar duration: Duration in seconds, set when the span ends.
+    :ivar attributes: Key value pairs describing the step.
+    """
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.parent: Optional[Span] = _current_span.get()
+        self.trace_id = self.parent.trace_id if self.parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = attributes
+        self.start_time = None
+        self.duration = None
+        self._start = None
+        self._token = None
+
+    def set(self, key: str, value: Any):
+        """Sets an attribute of this span."""
+        self.attributes[key] = value
+
+    def add(self, key: str, value: float = 1):
+        """Adds ``value`` to a counter attribute of this span and all enclosing spans, so that
+        e.g. the LLM calls and tokens of a step are totalled in the span of the step."""
+        span = self
+        while span is not None:
+            span.attributes[key] = span.attributes.get(key, 0) + value
+            span = span.parent
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        for sink in self.tracer.sinks:
+            sink.on_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        for sink in self.tracer.sinks:
+            sink.on_end(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, key, value):
+        pass
+
+    def add(self, key, value=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class BaseTraceSink:
+    """Receives spans from a :class:`Tracer`."""
+
+    def on_start(self, span: Span):
+        pass
+
+    def on_end(self, span: Span):
+        pass
+
+    def close(self):
+        pass
+
+
+class InMemorySink(BaseTraceSink):
+    """Keeps finished spans in :attr:`spans`, in the order they end."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def on_end(self, span: Span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans = []
+
+
+class JSONLSink(BaseTraceSink):
+    """Appends finished spans to a file as JSON lines (see :meth:`Span.to_dict`).
+
+    :param path: Path of the file.
+    :type path: str
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class OpenTelemetrySink(BaseTraceSink):
+    """Forwards spans to OpenTelemetry, keeping their nesting. Requires ``opentelemetry-api``.
+
+    :param tracer: OpenTelemetry tracer to use. Defaults to ``opentelemetry.trace.get_tracer("loopgpt")``.
+    :type tracer: opentelemetry.trace.Tracer, optional
+    """
+
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError(
+                "Please install opentelemetry-api (pip install opentelemetry-api) to use OpenTelemetrySink."
+            ) from e
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("loopgpt")
+        self._spans = {}
+
+    def on_start(self, span: Span):
+        context = None
+        parent = span.parent and self._spans.get(span.parent.span_id)
+        if parent is not None:
+            context = self._trace.set_span_in_context(parent)
+        self._spans[span.span_id] = self.tracer.start_span(
+            span.name, context=context, start_time=int(span.start_time * 1e9)
+        )
+
+    def on_end(self, span: Span):
+        otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            if not isinstance(value, (str, bool, int, float)):
+                value = str(value)
+            otel_span.set_attribute(key, value)
+        otel_span.end(end_time=int((span.start_time + span.duration) * 1e9))
+
+
+class Tracer:
+    """Creates spans and sends them to its sinks. Tracing is disabled while there are no sinks.
+
+    :param sinks: Sinks to send spans to.
+    :type sinks: List[BaseTraceSink], optional
+    """
+
+    def __init__(self, sinks: Optional[List[BaseTraceSink]] = None):
+        self.sinks = list(sinks or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def add_sink(self, sink: BaseTraceSink):
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink: BaseTraceSink):
+        self.sinks.remove(sink)
+        sink.close()
+
+    def span(self, name: str, **attributes):
+        """Returns a span to be used as a context manager."""
+        if not self.sinks:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
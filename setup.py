@@ -28,7 +28,7 @@ if __name__ == "__main__":
     setup(
         install_requires=install_requires,
         extras_require=extras_require,
-        packages=find_packages(),
+        packages=find_packages(exclude=["benchmarks*", "tests*"]),
         name=package_name,
         version="0.1.2",
         description="Modular Auto-GPT Framework",
@@ -1,4 +1,15 @@
 from loopgpt.models import BaseModel
+from dummy_embedding_provider import DummyEmbeddingProvider
+
+import loopgpt
+import json
+
+RESPONSE = json.dumps(
+    {
+        "thoughts": {"text": "hi", "plan": "- say hi"},
+        "command": {"name": "do_nothing", "args": {}},
+    }
+)
 
 
 class DummyModel(BaseModel):
@@ -17,3 +28,33 @@ class DummyModel(BaseModel):
     @classmethod
     def from_config(cls, config):
         return cls()
+
+
+class JSONModel(DummyModel):
+    """Responds with ``response`` (:data:`RESPONSE` by default) and counts words as tokens."""
+
+    def __init__(self, response=RESPONSE):
+        self.response = response
+
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        return self.response
+
+    def count_tokens(self, messages):
+        return sum(len(msg["content"].split()) for msg in messages)
+
+
+class StreamingModel(JSONModel):
+    """Streams its response in chunks of 7 characters."""
+
+    def stream_chat(self, messages, max_tokens=None, temperature=0.8):
+        for i in range(0, len(self.response), 7):
+            yield self.response[i : i + 7]
+
+
+def make_agent(model=None, **kwargs):
+    """Returns an agent with ``model`` (a :class:`JSONModel` by default) and a dummy embedding provider."""
+    return loopgpt.Agent(
+        model=model or JSONModel(),
+        embedding_provider=DummyEmbeddingProvider(),
+        **kwargs
+    )
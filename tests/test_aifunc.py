@@ -0,0 +1,45 @@
+from dummy_model import DummyModel
+from dummy_embedding_provider import DummyEmbeddingProvider
+
+import loopgpt
+
+
+class UpperModel(DummyModel):
+    native_batching = True
+
+    def __init__(self):
+        self.batches = []
+
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        args = messages[-1]["content"].split("Arguments:")[-1]
+        value = args.split("Respond only")[0].split(":", 1)[1]
+        return value.strip().strip('"').strip().upper()
+
+    def chat_batch(self, messages_list, max_tokens=None, temperature=0.8):
+        self.batches.append(len(messages_list))
+        return [self.chat(messages) for messages in messages_list]
+
+
+@loopgpt.aifunc()
+def shout(text: str) -> str:
+    """Returns the text in upper case.
+
+    Args:
+        text (str): Text to shout.
+
+    Returns:
+        str: Text in upper case.
+    """
+
+
+def test_aifunc_batch():
+    model = UpperModel()
+    emb = DummyEmbeddingProvider()
+    assert shout("hi", model=model, embedding_provider=emb) == "HI"
+    results = shout.batch(
+        ["hello", ("world",), {"text": "again"}],
+        model=model,
+        embedding_provider=emb,
+    )
+    assert results == ["HELLO", "WORLD", "AGAIN"]
+    assert model.batches == [3]
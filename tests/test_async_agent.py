@@ -0,0 +1,166 @@
+from loopgpt.constants import AgentStates
+from loopgpt.tools import BaseTool
+
+import loopgpt
+import threading
+import asyncio
+import json
+import time
+import sys
+
+from dummy_model import DummyModel, make_agent
+from dummy_embedding_provider import DummyEmbeddingProvider
+
+
+class AsyncStepsModel(DummyModel):
+    """Asks for ``steps`` lookups, then completes its task. Each response takes 0.1 seconds."""
+
+    def __init__(self, steps=2, commands=None):
+        self.steps = steps
+        self.commands = commands or [{"name": "lookup", "args": {"key": "a"}}]
+        self.calls = 0
+
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        raise AssertionError("achat should be used.")
+
+    async def achat(self, messages, max_tokens=None, temperature=0.8):
+        assert not isinstance(sys.stdout, loopgpt.utils.spinner.DummyFile)
+        await asyncio.sleep(0.1)
+        if max_tokens is None:  # History summary
+            return "Summary."
+        self.calls += 1
+        if self.calls <= self.steps:
+            resp = {"commands": self.commands}
+        else:
+            resp = {"command": {"name": "task_complete", "args": {}}}
+        return json.dumps({"thoughts": {"text": "Next."}, **resp})
+
+
+class Lookup(BaseTool):
+    """Looks up a key.
+
+    Args:
+        key (str): The key.
+    """
+
+    def run(self, key: str):
+        raise AssertionError("arun should be used.")
+
+    async def arun(self, key: str, delay: float = 0):
+        await asyncio.sleep(delay)
+        return key.upper()
+
+
+def _agent(model):
+    agent = make_agent(model, tools=[Lookup])
+    agent.memory.add("Keys are looked up in upper case.")
+    return agent
+
+
+def test_run_until_complete_concurrently():
+    agents = [_agent(AsyncStepsModel(steps=2)) for _ in range(50)]
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                agent.run_until_complete("Look things up.", max_steps=10)
+                for agent in agents
+            )
+        )
+
+    start = time.monotonic()
+    completed = asyncio.run(main())
+    # Sequentially, 50 agents with about 5 model calls of 0.1s each would take 25s.
+    assert time.monotonic() - start < 10
+    assert all(completed)
+    agent = agents[0]
+    assert agent.goals == ["Look things up."]
+    assert agent.state == AgentStates.STOP
+    assert 'Command "lookup" with args {"key": "a"} returned:\n"A"' in [
+        msg["content"] for msg in agent.history
+    ]
+
+
+def test_run_until_complete_max_steps():
+    agent = _agent(AsyncStepsModel(steps=10))
+    assert not asyncio.run(agent.run_until_complete(max_steps=3))
+    assert agent.state == AgentStates.TOOL_STAGED
+
+
+def test_achat_parallel_commands_timeout():
+    commands = [
+        {"name": "lookup", "args": {"key": "a"}},
+        {"name": "lookup", "args": {"key": "b", "delay": 5}},
+    ]
+    agent = _agent(AsyncStepsModel(steps=1, commands=commands))
+    agent.command_timeout = 0.2
+
+    async def main():
+        await agent.achat()
+        await agent.achat(run_tool=True)
+
+    asyncio.run(main())
+    a, b = agent.tool_response
+    assert a == "A"
+    assert "timed out" in b
+
+
+def test_achat_commands_for_same_tool_run_one_at_a_time():
+    running = []
+
+    class Visit(Lookup):
+        async def arun(self, key: str, delay: float = 0):
+            running.append(key)
+            assert len(running) == 1
+            await asyncio.sleep(0.05)
+            running.remove(key)
+            return key.upper()
+
+    commands = [{"name": "visit", "args": {"key": key}} for key in "abc"]
+    agent = make_agent(AsyncStepsModel(steps=1, commands=commands), tools=[Visit])
+
+    async def main():
+        await agent.achat()
+        await agent.achat(run_tool=True)
+
+    asyncio.run(main())
+    assert agent.tool_response == ["A", "B", "C"]
+
+
+class RawModel(DummyModel):
+    """Responds with text that is not JSON, and repairs it into a command when asked synchronously."""
+
+    def __init__(self):
+        self.repair_threads = []
+
+    async def achat(self, messages, max_tokens=None, temperature=0.8):
+        return "Let me look it up. Result: {"
+
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        self.repair_threads.append(threading.current_thread())
+        return json.dumps({"command": {"name": "lookup", "args": {"key": "a"}}})
+
+
+def test_achat_repairs_response_in_thread():
+    agent = _agent(RawModel())
+    asyncio.run(agent.achat())
+    assert agent.staging_tool == {"name": "lookup", "args": {"key": "a"}}
+    assert agent.json_parse_stats == {"llm": 1}
+    assert agent.model.repair_threads[0] is not threading.main_thread()
+
+
+def test_achat_raw_response_callback():
+    agent = loopgpt.empty_agent(
+        model=RawModel(), embedding_provider=DummyEmbeddingProvider()
+    )
+    threads = []
+    identity = agent._default_response_callback
+    agent._default_response_callback = lambda resp: threads.append(
+        threading.current_thread()
+    ) or identity(resp)
+    resp = asyncio.run(agent.achat("Hi"))
+    assert resp == "Let me look it up. Result: {"
+    # Not handed off to a thread.
+    assert threads == [threading.main_thread()]
+    assert agent.model.repair_threads == []
+    assert not agent.json_parse_stats
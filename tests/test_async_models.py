@@ -0,0 +1,48 @@
+from loopgpt.models import OpenAIModel
+from dummy_model import DummyModel
+from types import SimpleNamespace
+
+import asyncio
+import time
+
+
+class SlowModel(DummyModel):
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        time.sleep(0.2)
+        return messages[-1]["content"]
+
+
+def test_achat_thread_pool_fallback():
+    model = SlowModel()
+
+    async def run():
+        return await asyncio.gather(
+            *[model.achat([{"role": "user", "content": str(i)}]) for i in range(4)]
+        )
+
+    start = time.time()
+    assert asyncio.run(run()) == ["0", "1", "2", "3"]
+    assert time.time() - start < 0.6
+
+
+def test_openai_achat():
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        message = SimpleNamespace(content="hello")
+        resp = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return SimpleNamespace(headers={}, parse=lambda: resp)
+
+    raw = SimpleNamespace(create=create)
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=raw))
+    )
+    model = OpenAIModel("gpt-4", api_key="sk-test")
+    model._get_async_client = lambda: client
+    model._estimate_tokens = lambda messages, max_tokens: 10
+    msgs = [{"role": "user", "content": "hi"}]
+    assert asyncio.run(model.achat(msgs, max_tokens=5, temperature=0)) == "hello"
+    assert calls == [
+        {"model": "gpt-4", "messages": msgs, "max_tokens": 5, "temperature": 0}
+    ]
@@ -0,0 +1,89 @@
+from loopgpt.embeddings import register_embedding_provider_type
+from loopgpt.models import register_model_type
+from loopgpt.loops.batch import run_batch, load_specs
+
+import json
+import os
+
+from dummy_model import DummyModel
+from dummy_embedding_provider import DummyEmbeddingProvider
+
+
+class StepsModel(DummyModel):
+    """Evaluates ``steps`` math expressions, then completes its task."""
+
+    def __init__(self, steps=2):
+        self.steps = steps
+        self.calls = 0
+
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        if max_tokens is None:  # History summary
+            return "Summary."
+        self.calls += 1
+        if self.calls <= self.steps:
+            command = {"name": "evaluate_math", "args": {"expression": "1 + 1"}}
+        else:
+            command = {"name": "task_complete", "args": {}}
+        return json.dumps({"thoughts": {"text": "Next."}, "command": command})
+
+    def config(self):
+        return {**super().config(), "steps": self.steps}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config["steps"])
+
+
+register_model_type(StepsModel)
+register_embedding_provider_type(DummyEmbeddingProvider)
+
+
+def _spec(id, steps, **kwargs):
+    return {
+        "id": id,
+        "goals": "Add numbers.",
+        "model": StepsModel(steps).config(),
+        "embedding_provider": DummyEmbeddingProvider().config(),
+        **kwargs,
+    }
+
+
+def test_run_batch(tmp_path):
+    goals = tmp_path / "goals.jsonl"
+    goals.write_text(
+        "\n".join(
+            json.dumps(spec)
+            for spec in [_spec("a", 2), _spec("b", 10, max_steps=3), {"id": "c"}]
+        )
+    )
+    results_path = str(tmp_path / "results.jsonl")
+    results = run_batch(
+        load_specs(str(goals)),
+        workers=2,
+        checkpoint_dir=str(tmp_path / "runs"),
+        results_path=results_path,
+    )
+    a, b, c = results
+    assert a["status"] == "completed"
+    assert a["steps"] == 4  # Two commands, then task_complete is staged and run.
+    assert b["status"] == "max_steps"
+    assert b["steps"] == 3
+    assert c["status"] == "error"
+    assert os.path.exists(a["checkpoint"])
+    with open(results_path) as f:
+        assert sorted(json.loads(line)["id"] for line in f) == ["a", "b", "c"]
+
+
+def test_run_batch_resume(tmp_path):
+    runs = str(tmp_path / "runs")
+    spec = _spec("a", 10, max_steps=2)
+    (first,) = run_batch([spec], checkpoint_dir=runs)
+    spec["max_steps"] = 20
+    (second,) = run_batch([spec], checkpoint_dir=runs, resume=True)
+    assert first["status"] == "max_steps"
+    assert second["status"] == "completed"
+    # The model's call count is not saved, so the resumed agent takes 10 more commands.
+    assert second["steps"] == 12
+    with open(second["checkpoint"]) as f:
+        history = json.load(f)["history"]
+    assert sum(msg["role"] == "assistant" for msg in history) == 13
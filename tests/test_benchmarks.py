@@ -0,0 +1,28 @@
+from benchmarks.fakes import FakeModel, FakeEmbeddingProvider
+from benchmarks import bench_agent
+from loopgpt.models import from_config as model_from_config
+
+import json
+
+
+def test_fake_model_responses():
+    model = FakeModel(completion_tokens=100)
+    resp = model.chat([{"role": "user", "content": "Hi"}])
+    assert json.loads(resp)["command"]["name"] == "evaluate_math"
+    assert abs(model.count_tokens([{"role": "assistant", "content": resp}]) - 100) < 20
+    assert model_from_config(model.config()).config() == model.config()
+
+
+def test_fake_embeddings_are_deterministic():
+    emb = FakeEmbeddingProvider(dim=8)
+    assert (emb.get("a") == FakeEmbeddingProvider(dim=8).get("a")).all()
+    assert emb.get_batch(["a", "b"]).shape == (2, 8)
+
+
+def test_agent_benchmarks():
+    result = bench_agent.bench_chat(steps=3, memory=10)
+    assert result["llm_calls_per_step"] >= 1
+    result = bench_agent.bench_prompt(history=30, memory=10, repeat=2)
+    assert result["warm_llm_calls"] == 0
+    result = bench_agent.bench_save_load(history=30, memory=10, binary=True)
+    assert result["bytes"] > 0
@@ -0,0 +1,67 @@
+from loopgpt.embeddings import (
+    BaseEmbeddingProvider,
+    CachedEmbeddingProvider,
+    from_config as embedding_provider_from_config,
+)
+
+import loopgpt
+import numpy as np
+
+
+class LengthEmbeddingProvider(BaseEmbeddingProvider):
+    def __init__(self, model="len"):
+        self.model = model
+        self.calls = []
+
+    def get(self, text):
+        self.calls.append(text)
+        return np.array([len(text), 1.0], dtype=np.float32)
+
+    def config(self):
+        cfg = super().config()
+        cfg["model"] = self.model
+        return cfg
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config["model"])
+
+
+def test_embedding_cache(tmp_path):
+    loopgpt.embeddings.user_providers["LengthEmbeddingProvider"] = (
+        LengthEmbeddingProvider
+    )
+    path = str(tmp_path / "cache.sqlite")
+    provider = CachedEmbeddingProvider(LengthEmbeddingProvider(), path)
+    np.testing.assert_array_equal(provider.get("abc"), [3, 1])
+    np.testing.assert_array_equal(provider("abc"), [3, 1])
+    embs = provider.get_batch(["abc", "de", "de", "fghi"])
+    np.testing.assert_array_equal(embs[:, 0], [3, 2, 2, 4])
+    assert provider.provider.calls == ["abc", "de", "fghi"]
+    assert (provider.hits, provider.misses) == (3, 3)
+
+    # Survives a restart through the config round trip.
+    provider2 = embedding_provider_from_config(provider.config())
+    assert isinstance(provider2, CachedEmbeddingProvider)
+    provider2.get_batch(["abc", "de", "fghi"])
+    assert provider2.provider.calls == []
+    assert provider2.hits == 3
+
+    # Different provider configs do not share entries.
+    provider3 = CachedEmbeddingProvider(LengthEmbeddingProvider("other"), path)
+    provider3.get("abc")
+    assert provider3.misses == 1
+
+
+def test_embedding_cache_eviction():
+    provider = CachedEmbeddingProvider(
+        LengthEmbeddingProvider(), ":memory:", max_entries=2
+    )
+    provider.get("a")
+    provider.get("bb")
+    provider.get("a")
+    provider.get("ccc")
+    provider.provider.calls.clear()
+    provider.get("a")
+    provider.get("bb")
+    assert provider.provider.calls == ["bb"]
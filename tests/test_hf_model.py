@@ -0,0 +1,106 @@
+from loopgpt.models import HuggingFaceModel
+
+import threading
+import pytest
+
+transformers = pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+
+def tiny_model():
+    import torch
+
+    tok = tokenizers.Tokenizer(tokenizers.models.BPE(unk_token="<unk>"))
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel()
+    trainer = tokenizers.trainers.BpeTrainer(
+        vocab_size=300,
+        special_tokens=["<unk>", "<s>", "</s>"],
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tok.train_from_iterator(["the agent uses tools to reach its goals"] * 10, trainer)
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tok, bos_token="<s>", eos_token="</s>", unk_token="<unk>"
+    )
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+    )
+    # Skips loading weights from the hub.
+    model = HuggingFaceModel.__new__(HuggingFaceModel)
+    model.model_name = "tiny"
+    model.tokenizer = tokenizer
+    model.model = transformers.LlamaForCausalLM(config).eval()
+    model.prefix_cache = True
+    model._cache = None
+    model._cache_ids = None
+    model._cache_lock = threading.Lock()
+    return model
+
+
+def test_prefix_cache_matches_full_generation():
+    model = tiny_model()
+    prompt = "the agent uses tools " * 20
+    for turn in range(3):
+        ids = model.tokenizer(prompt, return_tensors="pt").input_ids
+        kwargs = dict(input_ids=ids, max_new_tokens=5, do_sample=False)
+        model.prefix_cache = False
+        expected = model._generate(**kwargs)
+        model.prefix_cache = True
+        cached = model._generate(**kwargs)
+        assert cached.tolist() == expected.tolist()
+        assert model._cache_ids.tolist() == cached[0][:-1].tolist()
+        prompt += f" goals {turn}"
+
+
+def test_chat_batch_matches_chat():
+    model = tiny_model()
+    model.prefix_cache = False
+    model.tokenizer.chat_template = (
+        "{% for m in messages %}<s>{{ m['role'] }}: {{ m['content'] }}\n{% endfor %}"
+    )
+    model.stopping_criteria = transformers.StoppingCriteriaList([])
+    dialogs = [
+        [{"role": "user", "content": "the agent" + " uses tools" * i}] for i in range(3)
+    ]
+    greedy = {"do_sample": False, "temperature": None, "top_p": None, "top_k": None}
+    generate = model.model.generate
+    model.model.generate = lambda **kwargs: generate(**dict(kwargs, **greedy))
+    expected = [model.chat(dialog, max_tokens=5) for dialog in dialogs]
+    assert model.chat_batch(dialogs, max_tokens=5, batch_size=2) == expected
+
+
+def test_count_tokens_with_alternating_chat_template():
+    model = tiny_model()
+    model.tokenizer.chat_template = (
+        "{% for m in messages %}"
+        "{% if (m['role'] == 'user') != (loop.index0 % 2 == 0) %}"
+        "{{ raise_exception('Roles must alternate user/assistant') }}"
+        "{% endif %}<s>{{ m['role'] }}: {{ m['content'] }}\n{% endfor %}"
+    )
+    system = {"role": "system", "content": "the agent uses tools"}
+    assistant = {"role": "assistant", "content": "the agent uses tools"}
+    assert model.count_tokens([system]) > 0
+    assert model.count_tokens([assistant]) > 0
+    user = {"role": "user", "content": "the agent uses tools"}
+    templated = len(model.tokenizer.encode(model.encode_messages([user, assistant])))
+    assert templated <= model.count_tokens([user, assistant]) <= templated + 8
+
+
+def test_count_tokens_is_upper_bound_of_templated_prompt():
+    model = tiny_model()
+    # Long delimiters and a default system prompt.
+    model.tokenizer.chat_template = (
+        "<s>system: the agent uses tools to reach its goals\n"
+        "{% for m in messages %}<s><s><s>{{ m['role'] }} said: {{ m['content'] }}"
+        "</s></s>\n{% endfor %}"
+    )
+    message = {"role": "user", "content": "the agent uses tools"}
+    for n in range(1, 6):
+        dialog = [dict(message, role=r) for r in ["system", "user", "assistant"]] * n
+        templated = len(model.tokenizer.encode(model.encode_messages(dialog)))
+        assert templated <= model.count_tokens(dialog) <= templated + 3 * len(dialog)
@@ -0,0 +1,69 @@
+import loopgpt
+
+from dummy_model import DummyModel, make_agent
+from dummy_embedding_provider import DummyEmbeddingProvider
+
+
+class CountingModel(DummyModel):
+    def __init__(self):
+        self.prompts = []
+
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        self.prompts.append(messages[-1]["content"])
+        return f"summary {len(self.prompts)}"
+
+
+def _agent():
+    loopgpt.models.user_providers["CountingModel"] = CountingModel
+    loopgpt.embeddings.user_providers["DummyEmbeddingProvider"] = DummyEmbeddingProvider
+    return make_agent(CountingModel())
+
+
+def test_history_summary_is_incremental():
+    agent = _agent()
+    assert agent._get_compressed_history() == []
+    assert agent.model.prompts == []
+
+    agent.history.append({"role": "system", "content": "first result"})
+    hist = agent._get_compressed_history()
+    assert hist == [{"role": "system", "content": "summary 1"}]
+
+    # No new messages, no new LLM call.
+    assert agent._get_compressed_history() == hist
+    assert len(agent.model.prompts) == 1
+
+    agent.history.append({"role": "user", "content": "ignored"})
+    agent.history.append({"role": "assistant", "content": "second response"})
+    agent._get_compressed_history()
+    assert len(agent.model.prompts) == 2
+    assert "summary 1" in agent.model.prompts[-1]
+    assert "second response" in agent.model.prompts[-1]
+    assert "first result" not in agent.model.prompts[-1]
+
+
+def test_history_summary_invalidation():
+    agent = _agent()
+    agent.history.append({"role": "system", "content": "first result"})
+    agent.history.append({"role": "assistant", "content": "second response"})
+    agent._get_compressed_history()
+
+    agent.history[0] = {"role": "system", "content": "edited result"}
+    agent._get_compressed_history()
+    assert "summary 1" not in agent.model.prompts[-1]
+    assert "edited result" in agent.model.prompts[-1]
+
+    agent.clear_state()
+    assert agent.history_summary is None
+    assert agent._get_compressed_history() == []
+
+
+def test_history_summary_serde():
+    agent = _agent()
+    agent.history.append({"role": "system", "content": "first result"})
+    agent._get_compressed_history()
+
+    agent2 = loopgpt.Agent.from_config(agent.config())
+    assert agent2._get_compressed_history() == [
+        {"role": "system", "content": "summary 1"}
+    ]
+    assert agent2.model.prompts == []
@@ -0,0 +1,82 @@
+from loopgpt.utils.json_parser import parse_json, repair_json, IncrementalJSONParser
+from dummy_model import DummyModel
+from dummy_embedding_provider import DummyEmbeddingProvider
+
+import loopgpt
+import pytest
+import json
+
+EXPECTED = {
+    "thoughts": {"text": "line 1\nline 2", "plan": "- don't stop"},
+    "command": {"name": "google_search", "args": {"query": 'say "hi"'}},
+}
+
+
+@pytest.mark.parametrize(
+    "s",
+    [
+        # trailing text
+        json.dumps(EXPECTED) + "\nI hope this helps! {}",
+        # leading text and missing closing braces
+        "Sure:\n" + json.dumps(EXPECTED)[:-2],
+        # brackets in leading text
+        "Step [1]: " + json.dumps(EXPECTED),
+        # single quotes and python literals
+        str(EXPECTED),
+        # unescaped newline and quotes, trailing commas, unquoted key
+        '{"thoughts": {"text": "line 1\nline 2", "plan": "- don\'t stop",},'
+        + ' command: {"name": "google_search", "args": {"query": "say "hi""}}}',
+    ],
+)
+def test_repair(s):
+    assert parse_json(s) == (EXPECTED, "repair")
+
+
+def test_parse_json_methods():
+    assert parse_json('{"a": [1, true, null]}') == ({"a": [1, True, None]}, "json")
+    assert parse_json("{'a': [1, True, None]}")[0] == {"a": [1, True, None]}
+    with pytest.raises(ValueError):
+        parse_json("no json here")
+    assert repair_json('{"a": "unterminated') == '{"a": "unterminated"}'
+    assert repair_json('{"a": [1, 2') == '{"a": [1, 2]}'
+    assert repair_json('{"a":') == '{"a":null}'
+    assert repair_json("Step [1]: {'ok': True}") == '{"ok": true}'
+    assert repair_json("[{'a': 1}, {'b': 2}") == '[{"a": 1}, {"b": 2}]'
+
+
+def test_incremental_parser():
+    s = json.dumps(EXPECTED) + " trailing"
+    parser = IncrementalJSONParser()
+    seen = []
+    for i in range(0, len(s), 5):
+        new = parser.feed(s[i : i + 5])
+        seen += list(new)
+        if "command" in new:
+            # available before the stream ends
+            assert i + 5 < len(s)
+    assert seen == ["thoughts", "command"]
+    assert parser.members == EXPECTED
+
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1, "b": "x,}", "c": [1, {"d": 2}]}')
+    assert parser.members == {"a": 1, "b": "x,}", "c": [1, {"d": 2}]}
+
+
+class BrokenJSONModel(DummyModel):
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        if "convert_to_json" in messages[0]["content"]:
+            return json.dumps(EXPECTED)
+        return "Here you go: " + str(EXPECTED)[:-1]
+
+
+def test_agent_json_stats():
+    agent = loopgpt.Agent(
+        model=BrokenJSONModel(), embedding_provider=DummyEmbeddingProvider()
+    )
+    assert agent._load_json(json.dumps(EXPECTED)) == EXPECTED
+    assert agent._load_json("Here you go: " + str(EXPECTED)[:-1]) == EXPECTED
+    assert agent._load_json("nothing") == EXPECTED
+    assert agent.json_parse_stats == {"json": 1, "repair": 1, "llm": 1}
+    with pytest.raises(ValueError):
+        agent._load_json("nothing", try_gpt=False)
+    assert agent.json_parse_stats["failed"] == 1
@@ -0,0 +1,228 @@
+from loopgpt.embeddings import BaseEmbeddingProvider
+from loopgpt.memory import LocalMemory
+
+import loopgpt
+import numpy as np
+import asyncio
+import json
+import os
+
+
+class AxisEmbeddingProvider(BaseEmbeddingProvider):
+    """Embeds "<i>" as the i-th basis vector scaled by i + 1."""
+
+    def get(self, text):
+        i = int(text.split()[-1])
+        emb = np.zeros(8)
+        emb[i % 8] = i + 1
+        return emb
+
+
+def test_local_memory_growth_and_topk():
+    loopgpt.embeddings.user_providers["AxisEmbeddingProvider"] = AxisEmbeddingProvider
+    memory = LocalMemory(AxisEmbeddingProvider())
+    memory.initial_capacity = 2
+    for i in range(20):
+        memory.add(f"doc {i}")
+    assert len(memory) == 20
+    assert memory.embs.shape == (20, 8)
+    assert memory.embs.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(memory.embs, axis=1), 1, rtol=1e-6)
+
+    # Scores are cosine similarities, so the scale of the query does not matter.
+    assert set(memory.get("query 3", 3)) == {"doc 3", "doc 11", "doc 19"}
+    assert len(memory.get("query 3", 100)) == 20
+
+    memory2 = LocalMemory.from_config(memory.config())
+    assert memory2.docs == memory.docs
+    np.testing.assert_allclose(memory2.embs, memory.embs)
+    memory2.add("doc 5")
+    assert memory2.get("query 5", 1) == ["doc 5"]
+
+    memory.clear()
+    assert memory.get("query 3", 3) == []
+
+
+class BatchCountingProvider(AxisEmbeddingProvider):
+    def __init__(self):
+        self.batches = []
+
+    def get_batch(self, texts):
+        self.batches.append(len(texts))
+        return super().get_batch(texts)
+
+
+def test_local_memory_add_many():
+    provider = BatchCountingProvider()
+    memory = LocalMemory(provider)
+    memory.initial_capacity = 2
+    memory.add("doc 1")
+    memory.add_many([f"doc {i}" for i in range(2, 10)])
+    memory.add_many([])
+    assert provider.batches == [8]
+    assert len(memory) == 9
+    assert memory.embs.shape == (9, 8)
+    assert memory.get("query 7", 1) == ["doc 7"]
+
+    memory.add_many(["snippet a", "snippet 5"], keys=["key 4", None])
+    assert set(memory.get("query 4", 2)) == {"doc 4", "snippet a"}
+    assert set(memory.get("query 5", 2)) == {"doc 5", "snippet 5"}
+
+
+def test_local_memory_binary_save(tmp_path):
+    memory = LocalMemory(AxisEmbeddingProvider())
+    memory.add_many([f"doc {i}" for i in range(10)] + ["ünïcode 3"])
+    path = str(tmp_path / "memory")
+    cfg = memory.save(path)
+    assert "embs" not in cfg and "docs" not in cfg
+
+    memory2 = LocalMemory.from_config(cfg)
+    assert isinstance(memory2.embs, np.memmap)
+    assert list(memory2.docs) == memory.docs
+    assert memory2.docs[-1] == "ünïcode 3"
+    assert set(memory2.get("query 3", 2)) == {"doc 3", "ünïcode 3"}
+
+    # Adding to a mapped memory and saving over the same files is safe.
+    memory2.add("doc 12")
+    memory2.save(path)
+    assert memory2.get("query 12", 2)[0] in ("doc 4", "doc 12")
+    memory3 = LocalMemory.from_config(cfg)
+    assert len(memory3) == 12
+    assert memory3.config()["docs"][-1] == "doc 12"
+
+    empty = LocalMemory(AxisEmbeddingProvider())
+    empty = LocalMemory.from_config(empty.save(str(tmp_path / "empty")))
+    assert empty.get("query 1", 3) == []
+    empty.add("doc 1")
+    assert empty.get("query 1", 3) == ["doc 1"]
+
+
+def test_agent_save_binary_memory(tmp_path):
+    from dummy_model import DummyModel
+
+    loopgpt.models.user_providers["DummyModel"] = DummyModel
+    loopgpt.embeddings.user_providers["AxisEmbeddingProvider"] = AxisEmbeddingProvider
+    agent = loopgpt.Agent(
+        model=DummyModel(), embedding_provider=AxisEmbeddingProvider()
+    )
+    agent.memory.add_many([f"doc {i}" for i in range(5)])
+    file = str(tmp_path / "agent.json")
+    agent.save(file, memory_path=str(tmp_path / "agent_memory"))
+    with open(file) as f:
+        assert "doc 3" not in f.read()
+    agent2 = loopgpt.Agent.load(file)
+    assert list(agent2.memory.docs) == agent.memory.docs
+
+
+class VectorEmbeddingProvider(BaseEmbeddingProvider):
+    VECTORS = {
+        "a": [1, 0, 0],
+        "a copy": [1, 0.02, 0],
+        "mostly a": [0.6, 0.8, 0],
+        "b": [0, 1, 0],
+        "c": [0, 0, 1],
+        "query": [1, 0.2, 0],
+    }
+
+    def get(self, text):
+        return np.array(self.VECTORS[text], dtype=np.float32)
+
+
+def test_local_memory_min_score_and_mmr():
+    loopgpt.embeddings.user_providers["VectorEmbeddingProvider"] = (
+        VectorEmbeddingProvider
+    )
+    memory = LocalMemory(VectorEmbeddingProvider())
+    memory.add_many(["a", "a copy", "mostly a", "b", "c"])
+    assert memory.get("query", 3) == ["a copy", "a", "mostly a"]
+    assert memory.get("query", 10, min_score=0.5) == ["a copy", "a", "mostly a"]
+    # The near duplicate of the top result is skipped.
+    assert memory.get("query", 2, mmr_lambda=0.5) == ["a copy", "b"]
+
+    memory.min_score = 0.1
+    memory.mmr_lambda = 0.5
+    memory = LocalMemory.from_config(memory.config())
+    assert memory.min_score == 0.1
+    assert memory.get("query", 10) == ["a copy", "b", "a", "mostly a"]
+
+
+def test_agent_relevant_memory_cutoff():
+    from dummy_model import DummyModel
+
+    class CalibratedProvider(VectorEmbeddingProvider):
+        min_score = 0.5
+
+    loopgpt.models.user_providers["DummyModel"] = DummyModel
+    loopgpt.embeddings.user_providers["CalibratedProvider"] = CalibratedProvider
+    agent = loopgpt.Agent(model=DummyModel(), embedding_provider=CalibratedProvider())
+    assert agent.memory_min_score == 0.5
+    agent.memory.add_many(["a", "a copy", "mostly a", "b", "c"])
+    agent.memory_query = "query"
+    assert agent._get_relevant_memory("", 0) == ["a copy", "a", "mostly a"]
+
+    agent.memory_min_score = 0.1
+    agent.memory_mmr_lambda = 0.5
+    agent = loopgpt.Agent.from_config(agent.config())
+    assert (agent.memory_min_score, agent.memory_mmr_lambda) == (0.1, 0.5)
+    agent.memory_query = "query"
+    assert agent._get_relevant_memory("", 0) == ["a copy", "b", "a", "mostly a"]
+
+
+def test_agent_binary_memory_relative_paths(tmp_path, monkeypatch):
+    from dummy_model import DummyModel
+
+    loopgpt.models.user_providers["DummyModel"] = DummyModel
+    loopgpt.embeddings.user_providers["AxisEmbeddingProvider"] = AxisEmbeddingProvider
+    agent = loopgpt.Agent(
+        model=DummyModel(), embedding_provider=AxisEmbeddingProvider()
+    )
+    agent.memory.add_many([f"doc {i}" for i in range(5)])
+    # config() has no side effects.
+    assert agent.config()["memory"]["docs"] == agent.memory.docs
+    monkeypatch.chdir(tmp_path)
+    agent.save(os.path.join("run", "agent.json"), memory_path="memory")
+    with open(os.path.join("run", "agent.json")) as f:
+        assert json.load(f)["memory"]["path"] == os.path.join("..", "memory")
+
+    # Loaded from another working directory, after moving both together.
+    os.rename(tmp_path, str(tmp_path) + "_moved")
+    monkeypatch.chdir("/")
+    agent2 = loopgpt.Agent.load(
+        os.path.join(str(tmp_path) + "_moved", "run", "agent.json")
+    )
+    assert list(agent2.memory.docs) == agent.memory.docs
+
+
+def test_agent_custom_memory_without_search_options():
+    from dummy_model import DummyModel
+    from dummy_embedding_provider import DummyEmbeddingProvider
+    from loopgpt.memory import BaseMemory
+
+    class ListMemory(BaseMemory):
+        def __init__(self):
+            self.docs = []
+
+        def add(self, doc, key=None):
+            self.docs.append(doc)
+
+        def get(self, query, k):
+            return self.docs[:k]
+
+    class FilteredMemory(ListMemory):
+        def get(self, query, k, min_score=None, mmr_lambda=None):
+            return [f"{d} {min_score}" for d in self.docs[:k]]
+
+    agent = loopgpt.Agent(
+        model=DummyModel(), embedding_provider=DummyEmbeddingProvider()
+    )
+    agent.memory_query = "query"
+    agent.memory = ListMemory()
+    agent.memory.add("a")
+    assert agent._get_relevant_memory("", 0) == ["a"]
+    assert asyncio.run(agent._aget_relevant_memory("", 0)) == ["a"]
+
+    agent.memory = FilteredMemory()
+    agent.memory.add("a")
+    agent.memory_min_score = 0.5
+    assert agent._get_relevant_memory("", 0) == ["a 0.5"]
+    assert asyncio.run(agent._aget_relevant_memory("", 0)) == ["a 0.5"]
@@ -0,0 +1,77 @@
+from loopgpt.models import (
+    BaseModel,
+    CachedModel,
+    register_model_type,
+    from_config as model_from_config,
+)
+
+import asyncio
+
+
+class EchoModel(BaseModel):
+    def __init__(self, prefix="echo"):
+        self.prefix = prefix
+        self.calls = 0
+
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        self.calls += 1
+        return f"{self.prefix}: {messages[-1]['content']}"
+
+    def count_tokens(self, messages):
+        return 0
+
+    def get_token_limit(self):
+        return 4000
+
+    def config(self):
+        cfg = super().config()
+        cfg["prefix"] = self.prefix
+        return cfg
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config["prefix"])
+
+
+def msgs(content):
+    return [{"role": "user", "content": content}]
+
+
+def test_model_cache():
+    model = CachedModel(EchoModel())
+    assert model.chat(msgs("a"), temperature=0) == "echo: a"
+    assert model.chat(msgs("a"), temperature=0) == "echo: a"
+    assert "".join(model.stream_chat(msgs("a"), temperature=0)) == "echo: a"
+    assert asyncio.run(model.achat(msgs("a"), temperature=0)) == "echo: a"
+    assert model.model.calls == 1
+    model.chat(msgs("a"), max_tokens=10, temperature=0)
+    model.chat(msgs("b"), temperature=0)
+    assert model.model.calls == 3
+    assert (model.hits, model.misses) == (3, 3)
+
+    # Sampled responses are not cached by default
+    model.chat(msgs("a"))
+    model.chat(msgs("a"))
+    assert model.model.calls == 5
+    model = CachedModel(EchoModel(), cache_all_temperatures=True)
+    model.chat(msgs("a"))
+    model.chat(msgs("a"))
+    assert model.model.calls == 1
+
+
+def test_model_cache_persistence(tmp_path):
+    register_model_type(EchoModel)
+    path = str(tmp_path / "responses.sqlite")
+    model = CachedModel(EchoModel(), path=path, max_entries=2)
+    for c in "abc":
+        model.chat(msgs(c), temperature=0)
+    model = model_from_config(model.config())
+    assert model.path == path
+    assert model.chat(msgs("c"), temperature=0) == "echo: c"
+    assert model.model.calls == 0
+    model.chat(msgs("a"), temperature=0)
+    assert model.model.calls == 1
+
+    # Responses are not shared between differently configured models
+    other = CachedModel(EchoModel("other"), path=path)
+    assert other.chat(msgs("c"), temperature=0) == "other: c"
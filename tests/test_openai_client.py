@@ -0,0 +1,76 @@
+from loopgpt.models import OpenAIModel
+from loopgpt.embeddings import OpenAIEmbeddingProvider
+from loopgpt.utils import openai_client
+
+import asyncio
+
+
+def test_clients_are_shared():
+    openai_client.clear_clients()
+    model = OpenAIModel("gpt-3.5-turbo", api_key="sk-a")
+    model2 = OpenAIModel.from_config(OpenAIModel("gpt-4", api_key="sk-a").config())
+    emb = OpenAIEmbeddingProvider(api_key="sk-a")
+    assert model.client is model2.client
+    # Embeddings retry on their own, through the same connection pool.
+    assert emb.client is not model.client
+    assert emb.client._client is model.client._client
+    assert OpenAIModel(api_key="sk-b").client is not model.client
+    azure = openai_client.get_client("sk-a", "https://x.openai.azure.com", "2024-02-01")
+    assert azure is not model.client
+    assert azure is openai_client.get_client(
+        "sk-a", "https://x.openai.azure.com", "2024-02-01"
+    )
+
+
+def test_configure_pool():
+    settings = dict(openai_client.pool_settings)
+    model = OpenAIModel(api_key="sk-a")
+    client = model.client
+    try:
+        openai_client.configure_pool(max_connections=7, keepalive_expiry=60)
+        assert model.client is not client
+        # Requests in flight on the old client are not cut off.
+        assert not client.is_closed()
+        pool = model.client._client._transport._pool
+        assert pool._max_connections == 7
+        assert pool._keepalive_expiry == 60
+    finally:
+        openai_client.configure_pool(**settings)
+
+
+def test_async_clients_are_per_loop():
+    model = OpenAIModel(api_key="sk-a")
+
+    async def get():
+        return model._get_async_client(), model._get_async_client()
+
+    a1, a2 = asyncio.run(get())
+    b1, _ = asyncio.run(get())
+    assert a1 is a2
+    assert a1 is not b1
+
+
+def test_assigned_client():
+    model = OpenAIModel(api_key="sk-a")
+    emb = OpenAIEmbeddingProvider(api_key="sk-a")
+    client = openai_client.get_client("sk-other")
+    model.client = client
+    emb.client = client
+    assert model.client is emb.client is client
+    assert OpenAIModel(api_key="sk-a").client is not client
+
+
+def test_only_rate_limiter_retries():
+    openai_client.clear_clients()
+    model = OpenAIModel(api_key="sk-a")
+    emb = OpenAIEmbeddingProvider(api_key="sk-a")
+    assert model.client.max_retries == 0
+    assert emb.client.max_retries == emb.max_retries == 2
+
+    async def get():
+        return model._get_async_client(), emb._get_async_client()
+
+    model_client, emb_client = asyncio.run(get())
+    assert model_client.max_retries == 0
+    assert emb_client.max_retries == 2
+    assert emb_client._client is model_client._client
@@ -0,0 +1,70 @@
+from loopgpt.embeddings import AzureOpenAIEmbeddingProvider
+from types import SimpleNamespace
+
+import loopgpt.embeddings.openai_
+import numpy as np
+
+
+class FakeEmbeddings:
+    """Embeds a text as [number of "a"s, number of "b"s] and records the inputs of each request."""
+
+    def __init__(self):
+        self.requests = []
+
+    def create(self, input, model):
+        self.requests.append(input)
+        data = [
+            SimpleNamespace(index=i, embedding=[text.count("a"), text.count("b")])
+            for i, text in enumerate(input)
+        ]
+        return SimpleNamespace(data=data[::-1])
+
+
+class FakeAzureProvider(AzureOpenAIEmbeddingProvider):
+    max_input_tokens = 4
+
+    def __init__(self):
+        super().__init__("my-embeddings-deployment", api_key="sk-a")
+        self.embeddings = FakeEmbeddings()
+
+    @property
+    def client(self):
+        return SimpleNamespace(embeddings=self.embeddings)
+
+
+class CharEncoding:
+    def encode(self, text):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def test_long_inputs_are_split(monkeypatch):
+    monkeypatch.setattr(
+        loopgpt.embeddings.openai_,
+        "get_tiktoken_encoding",
+        lambda model: CharEncoding(),
+    )
+    emb = FakeAzureProvider()
+    embs = emb.get_batch(["ab", "aaaab"])
+    assert emb.embeddings.requests == [["ab", "aaaa", "b"]]
+    assert np.allclose(embs[0], [1, 1])
+    # Average of [4, 0] and [0, 1], weighted by 4 and 1 tokens, normalized.
+    assert np.allclose(embs[1], np.array([16, 1]) / np.hypot(16, 1))
+    assert np.allclose(emb.get("aaaab"), embs[1])
+
+
+def test_deployment_without_encoding(monkeypatch):
+    def unknown_model(model):
+        raise KeyError(model)
+
+    monkeypatch.setattr(
+        loopgpt.embeddings.openai_, "get_tiktoken_encoding", unknown_model
+    )
+    emb = FakeAzureProvider()
+    emb.max_batch_tokens = 6
+    embs = emb.get_batch(["ab", "ba", "aaaaa"])
+    # Characters are counted as tokens.
+    assert emb.embeddings.requests == [["ab", "ba"], ["aaaa", "a"]]
+    assert embs.shape == (3, 2)
@@ -0,0 +1,145 @@
+from loopgpt.constants import NEXT_PROMPT, NEXT_PROMPT_MULTI_COMMAND, AgentStates
+from loopgpt.embeddings import register_embedding_provider_type
+from loopgpt.models import register_model_type
+from loopgpt.tools import BaseTool
+
+import loopgpt
+import json
+import time
+
+from dummy_model import DummyModel, JSONModel, make_agent
+from dummy_embedding_provider import DummyEmbeddingProvider
+
+
+class Wait(BaseTool):
+    """Waits and returns its argument.
+
+    Args:
+        seconds (float): Time to wait.
+    """
+
+    concurrent_safe = True
+
+    def run(self, seconds: float):
+        time.sleep(seconds)
+        return seconds
+
+
+class SlowWait(Wait):
+    timeout = 0.1
+
+
+class Visit(BaseTool):
+    """Visits a page, keeping the current page as state like a browser does.
+
+    Args:
+        page (str): Page to visit.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.page = None
+        self.running = 0
+        self.max_running = 0
+
+    def run(self, page: str):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.page = page
+        time.sleep(0.1)
+        self.running -= 1
+        return self.page
+
+
+def _agent(commands, **kwargs):
+    response = json.dumps({"thoughts": {"text": "Waiting."}, "commands": commands})
+    agent = make_agent(
+        JSONModel(response),
+        tools=[Wait, SlowWait, Visit],
+        parallel_commands=True,
+        **kwargs
+    )
+    agent.chat()
+    return agent
+
+
+def test_parallel_commands_prompt_and_config():
+    register_model_type(DummyModel)
+    register_embedding_provider_type(DummyEmbeddingProvider)
+    agent = make_agent(DummyModel())
+    assert agent.next_prompt == NEXT_PROMPT
+    agent.parallel_commands = True
+    assert agent.next_prompt == NEXT_PROMPT_MULTI_COMMAND
+    agent.command_timeout = 5
+    agent2 = loopgpt.Agent.from_config(agent.config())
+    assert agent2.parallel_commands
+    assert agent2.command_timeout == 5
+    assert agent2.next_prompt == NEXT_PROMPT_MULTI_COMMAND
+
+
+def test_commands_run_concurrently():
+    commands = [{"name": "wait", "args": {"seconds": 0.3}} for _ in range(4)]
+    agent = _agent(commands)
+    assert agent.staging_tool_names() == ["wait"] * 4
+    start = time.monotonic()
+    agent.chat(run_tool=True)
+    assert time.monotonic() - start < 1
+    assert agent.tool_response == [0.3] * 4
+    results = [
+        msg
+        for msg in agent.history
+        if msg["role"] == "system" and "returned" in msg["content"]
+    ]
+    assert len(results) == 1
+    assert results[0]["content"].count('Command "wait"') == 4
+
+
+def test_command_timeout_and_errors():
+    commands = [
+        {"name": "slow_wait", "args": {"seconds": 1}},
+        {"name": "wait", "args": {"seconds": 0}},
+        {"name": "missing", "args": {}},
+    ]
+    agent = _agent(commands)
+    agent.chat(run_tool=True)
+    timed_out, ok, missing = agent.tool_response
+    assert "timed out" in timed_out
+    assert ok == 0
+    assert "does not exist" in missing
+
+
+def test_task_complete_among_commands():
+    commands = [
+        {"name": "wait", "args": {"seconds": 0}},
+        {"name": "task_complete", "args": {}},
+    ]
+    agent = _agent(commands)
+    agent.chat(run_tool=True)
+    assert agent.state == AgentStates.STOP
+
+
+def test_commands_for_same_tool_run_one_at_a_time():
+    commands = [
+        {"name": "visit", "args": {"page": "a"}},
+        {"name": "visit", "args": {"page": "b"}},
+        {"name": "wait", "args": {"seconds": 0.1}},
+    ]
+    agent = _agent(commands, command_timeout=0.15)
+    start = time.monotonic()
+    agent.chat(run_tool=True)
+    assert time.monotonic() - start < 0.3
+    # The second visit waits for the first and still gets its own timeout.
+    assert agent.tool_response == ["a", "b", 0.1]
+    assert agent.tools["visit"].max_running == 1
+
+
+def test_command_waiting_for_timed_out_command_is_not_run():
+    commands = [
+        {"name": "visit", "args": {"page": "a"}},
+        {"name": "visit", "args": {"page": "b"}},
+    ]
+    agent = _agent(commands, command_timeout=0.01)
+    agent.chat(run_tool=True)
+    assert all("timed out" in resp for resp in agent.tool_response)
+    time.sleep(0.2)
+    assert agent.tools["visit"].page == "a"
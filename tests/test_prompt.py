@@ -0,0 +1,73 @@
+from dummy_model import DummyModel, make_agent
+
+
+class CharCountModel(DummyModel):
+    def count_tokens(self, messages):
+        return sum(len(msg["content"]) for msg in messages)
+
+    def get_token_limit(self):
+        return 1000
+
+
+def _agent(history, memory):
+    agent = make_agent(CharCountModel(), max_completion_tokens=0)
+    agent.prompt_template = "<HISTORY>\n<MEMORY: 10>\n<USER_INPUT>"
+    agent._get_compressed_history = lambda: history
+    agent._get_relevant_memory = lambda user_input, n: memory
+    return agent
+
+
+def _hist(n, size):
+    return [{"role": "system", "content": str(i) * size} for i in range(n)]
+
+
+def test_prompt_not_trimmed_when_it_fits():
+    history = _hist(5, 10)
+    msgs, ntokens = _agent(history, ["a", "b"]).get_full_prompt("hi")
+    assert msgs[:5] == history
+    assert ntokens < 1000
+
+
+def test_prompt_keeps_latest_history():
+    history = _hist(10, 300)
+    msgs, ntokens = _agent(history, []).get_full_prompt("hi")
+    assert msgs == history[-3:] + [{"role": "user", "content": "hi"}]
+    assert ntokens == 902
+
+
+def test_prompt_keeps_most_relevant_memory():
+    history = _hist(3, 600)
+    memory = ["x" * 100, "y" * 100, "z" * 100]
+    msgs, _ = _agent(history, memory).get_full_prompt()
+    assert msgs[0] == history[-1]
+    assert "x" * 100 in msgs[1]["content"]
+    assert "y" * 100 in msgs[1]["content"]
+    assert "z" not in msgs[1]["content"]
+
+
+def test_header_prompt_is_memoized():
+    agent = make_agent(DummyModel())
+    agent.goals = ["Find the answer"]
+    calls = []
+    tools_prompt = agent.tools_prompt
+    agent.tools_prompt = lambda: calls.append(1) or tools_prompt()
+
+    header = agent.header_prompt()
+    assert agent.header_prompt() is header
+    assert len(calls) == 1
+
+    agent.goals.append("Write it down")
+    agent.plan = ["- search"]
+    new_header = agent.header_prompt()
+    assert "2. Write it down" in new_header and "- search" in new_header
+    assert len(calls) == 1
+
+    agent.tools.pop(next(iter(agent.tools)))
+    assert agent.header_prompt() != new_header
+    assert len(calls) == 2
+
+    agent.goals.pop()
+    agent.plan.clear()
+    header = agent.header_prompt()
+    agent._header_cache.clear()
+    assert agent.header_prompt() == header
@@ -0,0 +1,77 @@
+from loopgpt.models import OpenAIModel
+from loopgpt.utils.rate_limiter import RateLimiter, parse_duration
+from openai import RateLimitError
+from types import SimpleNamespace
+
+import time
+
+
+def test_parse_duration():
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("1.5s") == 1.5
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("2") == 2
+    assert parse_duration("soon") is None
+
+
+def test_token_bucket_waits():
+    limiter = RateLimiter(tpm=6000)
+    start = time.monotonic()
+    limiter.acquire(6000)
+    assert time.monotonic() - start < 0.05
+    limiter.acquire(20)
+    assert 0.15 < time.monotonic() - start < 0.5
+
+
+def test_limits_from_headers():
+    limiter = RateLimiter()
+    assert limiter.requests.wait_time(1) == 0
+    limiter.update_from_headers(
+        {"x-ratelimit-limit-requests": "600", "x-ratelimit-remaining-requests": "0"}
+    )
+    assert limiter.requests.capacity == 600
+    assert 0.09 < limiter.requests.wait_time(1) <= 0.1
+
+
+def test_retry_delay():
+    limiter = RateLimiter(backoff=1, max_backoff=10)
+    assert 2 <= limiter.retry_delay(0, {"retry-after": "2"}) <= 3
+    assert 0.5 <= limiter.retry_delay(0, {"retry-after-ms": "500"}) <= 0.75
+    assert 10 <= limiter.retry_delay(0, {"x-ratelimit-reset-tokens": "6m0s"}) <= 15
+    assert 4 <= limiter.retry_delay(2) <= 6
+
+
+def test_openai_chat_retries_rate_limit():
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 3:
+            response = SimpleNamespace(
+                request=None, status_code=429, headers={"retry-after-ms": "10"}
+            )
+            raise RateLimitError("rate limited", response=response, body=None)
+        message = SimpleNamespace(content="hello")
+        resp = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        headers = {"x-ratelimit-limit-tokens": "1000"}
+        return SimpleNamespace(headers=headers, parse=lambda: resp)
+
+    raw = SimpleNamespace(create=create)
+
+    class FakeClientModel(OpenAIModel):
+        client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=raw))
+        )
+
+    model = FakeClientModel("gpt-4", api_key="sk-ratelimit-test")
+    model._estimate_tokens = lambda messages, max_tokens: 10
+    assert model.chat([{"role": "user", "content": "hi"}]) == "hello"
+    assert len(calls) == 3
+    assert model.rate_limiter.tokens.capacity == 1000
+    assert model.rate_limiter is OpenAIModel("gpt-4", "sk-ratelimit-test").rate_limiter
+
+
+def test_token_estimate_for_unknown_model():
+    model = OpenAIModel("gpt-4o", api_key="sk-a")
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert 100 <= model._estimate_tokens(messages, 50) - 50 < 120
@@ -0,0 +1,129 @@
+from loopgpt.models import LlamaCppModel
+from dummy_model import DummyModel, RESPONSE, StreamingModel, make_agent
+
+import json
+import sys
+import os
+
+
+def test_default_stream_chat():
+    assert list(DummyModel().stream_chat([])) == ["I am a dummy model."]
+
+
+def test_agent_chat_stream():
+    agent = make_agent(StreamingModel())
+    stream = agent.chat("Hello", stream=True)
+    assert agent.history == []
+    chunks = []
+    for chunk in stream:
+        chunks.append(chunk)
+        if stream.command:
+            assert stream.response is None
+    assert len(chunks) > 1
+    assert stream.command == {"name": "do_nothing", "args": {}}
+    assert "".join(chunks) == RESPONSE
+    assert stream.done
+    assert stream.response["command"]["name"] == "do_nothing"
+    assert agent.staging_tool == {"name": "do_nothing", "args": {}}
+    assert agent.history[-1] == {"role": "assistant", "content": RESPONSE}
+
+
+def test_repl_prints_stream(capsys, monkeypatch):
+    from loopgpt.loops import cli
+
+    agent = make_agent(StreamingModel())
+    agent.name = "Tester"
+    agent.description = "Tests the REPL"
+    agent.goals = ["say hi"]
+    monkeypatch.setattr("builtins.input", lambda prompt="": "exit")
+    cli(agent)
+    out = capsys.readouterr().out
+    # The raw response is printed as it streams in, then the processed response.
+    assert RESPONSE in out
+    assert out.index(RESPONSE) < out.index("NEXT_COMMAND")
+    assert agent.staging_tool == {"name": "do_nothing", "args": {}}
+
+
+def test_llama_cpp_stream_chat(tmp_path, monkeypatch):
+    # Fake llama.cpp binary: echoes the prompt file, then writes a completion.
+    exe = tmp_path / "main"
+    exe.write_text('#!/bin/sh\nprintf " "\ncat "$2"\nprintf "Hello"\nprintf " world"\n')
+    os.chmod(exe, 0o755)
+    monkeypatch.setenv("LLAMA_CPP", str(exe))
+    model = LlamaCppModel(None)
+    msgs = [{"role": "user", "content": "Say hello"}]
+    assert "".join(model.stream_chat(msgs, max_tokens=10)) == "Hello world"
+    assert model.chat(msgs, max_tokens=10) == "Hello world"
+
+
+FAKE_LLAMA_SERVER = """\
+import http.server, json, sys
+
+port = int(sys.argv[sys.argv.index("--port") + 1])
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with open(__file__ + ".log", "a") as f:
+            f.write(json.dumps(body) + "\\n")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for content, stop in (("Hello", False), (" world", False), ("", True)):
+            data = json.dumps({"content": content, "stop": stop})
+            self.wfile.write(f"data: {data}\\n\\n".encode())
+            self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+http.server.HTTPServer(("127.0.0.1", port), Handler).serve_forever()
+"""
+
+
+def test_llama_cpp_server_backend(tmp_path, monkeypatch):
+    script = tmp_path / "server.py"
+    script.write_text(FAKE_LLAMA_SERVER)
+    exe = tmp_path / "server"
+    exe.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+    os.chmod(exe, 0o755)
+    monkeypatch.setenv("LLAMA_CPP_SERVER", str(exe))
+    model = LlamaCppModel(None, backend="server")
+    msgs = [{"role": "user", "content": "Say hello"}]
+    assert list(model.stream_chat(msgs, max_tokens=10)) == ["Hello", " world"]
+    model2 = LlamaCppModel.from_config(model.config())
+    assert model2.chat(msgs, max_tokens=10, temperature=0) == "Hello world"
+    # Both models talk to the same server process.
+    assert model._get_server_url() == model2._get_server_url()
+    requests = [json.loads(l) for l in open(str(script) + ".log")]
+    assert len(requests) == 2
+    assert requests[1]["prompt"] == model.encode_messages(msgs)
+    assert requests[1]["cache_prompt"]
+    assert requests[1]["temperature"] == 0
+
+
+def test_llama_cpp_server_waits_through_timeouts(monkeypatch):
+    from loopgpt.models.llama_cpp import LlamaCppServer
+    from types import SimpleNamespace
+    import requests
+
+    responses = [requests.ConnectionError(), requests.ReadTimeout(), 503, 200]
+
+    def get(url, timeout):
+        resp = responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return SimpleNamespace(status_code=resp)
+
+    monkeypatch.setattr(requests, "get", get)
+    server = LlamaCppServer.__new__(LlamaCppServer)
+    server.url = "http://127.0.0.1:1"
+    server.process = SimpleNamespace(poll=lambda: None)
+    server._wait_ready(10)
+    assert responses == []
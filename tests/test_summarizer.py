@@ -0,0 +1,130 @@
+from loopgpt.summarizer import Summarizer
+from dummy_model import DummyModel
+from types import SimpleNamespace
+
+import loopgpt.summarizer
+import threading
+import pytest
+import time
+
+
+class EchoModel(DummyModel):
+    """Summarizes a chunk to its first line, and counts one token per character."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def chat(self, messages, max_tokens=None, temperature=0.8):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        text = messages[-1]["content"].split('"')[1]
+        return "S" + text.split("\n")[0][:20]
+
+    def count_tokens(self, messages):
+        return sum(len(msg["content"]) for msg in messages)
+
+
+class MemoryStub:
+    def __init__(self):
+        self.docs = []
+
+    def add_many(self, docs):
+        self.docs += docs
+
+
+def _summarizer(**kwargs):
+    summarizer = Summarizer(EchoModel(), **kwargs)
+    summarizer.agent = SimpleNamespace(memory=MemoryStub())
+    return summarizer
+
+
+def test_summarize_map_is_concurrent_and_ordered():
+    summarizer = _summarizer(max_workers=4)
+    text = "\n".join(f"para{i:03d}" + "x" * 100 for i in range(40))
+    summary, summaries = summarizer.summarize(text, "")
+    assert len(summaries) == 40 // 8
+    assert summaries == [f"Spara{i:03d}" + "x" * 13 for i in range(0, 40, 8)]
+    assert summarizer.agent.memory.docs == summaries
+    assert summarizer.model.max_active > 1
+    assert summary == "SSpara000" + "x" * 12
+
+
+def test_summarize_tree_reduce():
+    summarizer = _summarizer(reduce_chunk_size=100)
+    text = "\n".join(f"para{i:03d}" + "x" * 800 for i in range(30))
+    calls = []
+    summarize_chunk = summarizer.summarize_chunk
+
+    def tracked(text, query):
+        calls.append(text)
+        return summarize_chunk(text, query)
+
+    summarizer.summarize_chunk = tracked
+    summary, summaries = summarizer.summarize(text, "")
+    assert len(summaries) == 30
+    # 30 map calls, then several reduce levels, then a final call.
+    assert len(calls) > 31
+    assert all(len(call) < 900 for call in calls)
+
+
+def test_summarize_backoff(monkeypatch):
+    class FakeRateLimitError(Exception):
+        pass
+
+    monkeypatch.setattr(loopgpt.summarizer, "RateLimitError", FakeRateLimitError)
+    summarizer = _summarizer(max_retries=2, backoff=0.001)
+    failures = [1, 1]
+
+    def flaky(text, query):
+        if failures:
+            failures.pop()
+            raise FakeRateLimitError()
+        return "ok"
+
+    summarizer.summarize_chunk = flaky
+    assert summarizer.summarize("some text", "") == ("ok", ["ok"])
+
+
+def test_summarize_uses_chat_batch():
+    class BatchEchoModel(EchoModel):
+        native_batching = True
+
+        def __init__(self):
+            super().__init__()
+            self.batches = []
+
+        def chat_batch(self, messages_list, max_tokens=None, temperature=0.8):
+            self.batches.append(len(messages_list))
+            return [self.chat(messages) for messages in messages_list]
+
+    summarizer = Summarizer(BatchEchoModel())
+    summarizer.agent = SimpleNamespace(memory=MemoryStub())
+    text = "\n".join(f"para{i:03d}" + "x" * 100 for i in range(40))
+    summary, summaries = summarizer.summarize(text, "")
+    assert summaries == [f"Spara{i:03d}" + "x" * 13 for i in range(0, 40, 8)]
+    assert summarizer.model.batches == [5]
+    assert summary == "SSpara000" + "x" * 12
+
+
+def test_summarize_no_retry_by_default(monkeypatch):
+    class FakeRateLimitError(Exception):
+        pass
+
+    monkeypatch.setattr(loopgpt.summarizer, "RateLimitError", FakeRateLimitError)
+    summarizer = _summarizer()
+    calls = []
+
+    def rate_limited(text, query):
+        calls.append(text)
+        raise FakeRateLimitError()
+
+    summarizer.summarize_chunk = rate_limited
+    with pytest.raises(FakeRateLimitError):
+        summarizer.summarize("some text", "")
+    assert len(calls) == 1
@@ -0,0 +1,49 @@
+from loopgpt.models import BaseModel
+from loopgpt.utils.lru import LRUCache
+
+
+class WordCountModel(BaseModel):
+    token_count_cache_size = 2
+
+    def __init__(self):
+        self.calls = 0
+
+    def count_tokens(self, messages):
+        return sum(map(self.count_message_tokens, messages))
+
+    def _count_message_tokens(self, message):
+        self.calls += 1
+        return len(message["content"].split())
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get("b") is None
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+
+def test_count_tokens_is_memoized():
+    model = WordCountModel()
+    msgs = [
+        {"role": "system", "content": "one two three"},
+        {"role": "user", "content": "four five"},
+    ]
+    assert model.count_tokens(msgs) == 5
+    assert model.count_tokens(msgs) == 5
+    assert model.calls == 2
+
+    # Same content with a different role is counted separately.
+    model.count_tokens([{"role": "assistant", "content": "four five"}])
+    assert model.calls == 3
+
+    # Cache is bounded; the evicted message is counted again.
+    model.count_tokens(msgs[:1])
+    assert model.calls == 4
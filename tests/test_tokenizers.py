@@ -0,0 +1,21 @@
+from loopgpt.models.tokenizers import get_tokenizer, clear_tokenizers
+from concurrent.futures import ThreadPoolExecutor
+
+import time
+
+
+def test_tokenizer_loaded_once():
+    clear_tokenizers()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    with ThreadPoolExecutor(8) as pool:
+        toks = list(pool.map(lambda _: get_tokenizer("dummy", loader), range(16)))
+
+    assert len(calls) == 1
+    assert all(tok is toks[0] for tok in toks)
+    clear_tokenizers()
@@ -0,0 +1,104 @@
+from loopgpt.utils.tracing import InMemorySink, JSONLSink, OpenTelemetrySink, Tracer
+from dummy_model import RESPONSE, StreamingModel, make_agent
+
+import json
+import pytest
+
+
+def test_disabled_tracer_is_noop():
+    tracer = Tracer()
+    assert not tracer.enabled
+    with tracer.span("x") as span:
+        span.add("llm_calls")
+    assert tracer.span("y") is span
+
+
+def test_agent_chat_spans(tmp_path):
+    agent = make_agent()
+    sink = InMemorySink()
+    path = str(tmp_path / "trace.jsonl")
+    agent.tracer.add_sink(sink)
+    agent.tracer.add_sink(JSONLSink(path))
+    agent.chat("Hello")
+    agent.chat("Hello again", run_tool=True)
+
+    names = [span.name for span in sink.spans]
+    assert names.count("chat") == 2
+    assert {"memory", "prompt", "llm", "json_parse", "history_summary"} <= set(names)
+    chat = [span for span in sink.spans if span.name == "chat"][-1]
+    children = [span for span in sink.spans if span.parent is chat]
+    assert all(span.trace_id == chat.trace_id for span in children)
+    assert chat.duration >= sum(span.duration for span in children)
+    # Second turn: history summary and main call.
+    assert chat.attributes["llm_calls"] == 2
+    llm = [span for span in children if span.name == "llm"][0]
+    assert llm.attributes["completion_tokens"] == len(RESPONSE.split())
+    assert chat.attributes["prompt_tokens"] >= llm.attributes["prompt_tokens"] > 0
+    assert [s.attributes["method"] for s in sink.spans if s.name == "json_parse"] == [
+        "json",
+        "json",
+    ]
+
+    for sink in list(agent.tracer.sinks):
+        agent.tracer.remove_sink(sink)
+    lines = [json.loads(line) for line in open(path)]
+    assert len(lines) == len(names)
+    assert lines[-1]["name"] == "chat" and lines[-1]["parent_id"] is None
+
+
+def test_opentelemetry_sink():
+    sdk = pytest.importorskip("opentelemetry.sdk.trace")
+    export = pytest.importorskip("opentelemetry.sdk.trace.export")
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = sdk.TracerProvider()
+    provider.add_span_processor(export.SimpleSpanProcessor(exporter))
+    tracer = Tracer([OpenTelemetrySink(provider.get_tracer("test"))])
+    with tracer.span("outer"):
+        with tracer.span("inner") as span:
+            span.add("llm_calls", 2)
+    inner, outer = exporter.get_finished_spans()
+    assert inner.parent.span_id == outer.context.span_id
+    assert outer.attributes["llm_calls"] == 2
+
+
+def test_agent_chat_stream_spans():
+    agent = make_agent(StreamingModel())
+    sink = InMemorySink()
+    agent.tracer.add_sink(sink)
+    stream = agent.chat("Hello", stream=True)
+    chunks = []
+    for chunk in stream:
+        # The chat span is still open, but not current in the caller's code.
+        assert "chat" not in [span.name for span in sink.spans]
+        assert agent.tracer.span("outside").parent is None
+        chunks.append(chunk)
+    assert "".join(chunks) == RESPONSE
+    assert stream.response["command"]["name"] == "do_nothing"
+
+    chat = sink.spans[-1]
+    assert chat.name == "chat" and chat.attributes["stream"]
+    assert {"prompt", "llm", "json_parse"} <= {
+        span.name for span in sink.spans if span.parent is chat
+    }
+    assert "memory" in [span.name for span in sink.spans]
+    assert all(span.trace_id == chat.trace_id for span in sink.spans)
+    llm = [span for span in sink.spans if span.name == "llm"][0]
+    assert llm.duration <= chat.duration
+    assert chat.attributes["llm_calls"] == 1
+    assert llm.attributes["completion_tokens"] == len(RESPONSE.split())
+    assert chat.attributes["prompt_tokens"] == llm.attributes["prompt_tokens"] > 0
+
+
+def test_abandoned_stream_closes_chat_span():
+    agent = make_agent(StreamingModel())
+    sink = InMemorySink()
+    agent.tracer.add_sink(sink)
+    stream = iter(agent.chat("Hello", stream=True))
+    next(stream)
+    stream.close()
+    assert [span.name for span in sink.spans][-2:] == ["llm", "chat"]
+    assert "error" in sink.spans[-1].attributes